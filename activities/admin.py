@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Activite, ActiviteAnimateur, ActiviteMateriel, Inscription
+from .models import Activite, ActiviteAnimateur, ActiviteMateriel, Inscription, SerieActivite
 
 class InscriptionInline(admin.TabularInline):
     model = Inscription
@@ -60,4 +60,10 @@ class ActiviteMaterielAdmin(admin.ModelAdmin):
     list_display = ('activite', 'materiel', 'quantite_requise')
     list_filter = ('activite', 'materiel')
     search_fields = ('activite__nom', 'materiel__nom')
-    autocomplete_fields = ['activite', 'materiel']
\ No newline at end of file
+    autocomplete_fields = ['activite', 'materiel']
+
+@admin.register(SerieActivite)
+class SerieActiviteAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'date_debut', 'date_fin', 'get_jours_display', 'intervalle')
+    search_fields = ('nom',)
+    date_hierarchy = 'date_debut'
\ No newline at end of file
@@ -0,0 +1,63 @@
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import Activite, Inscription
+
+
+def apply_counter_delta(activite_id, statut, delta):
+    """Add delta to the counter of the given status on an activity"""
+    field = Inscription.COUNTER_FIELDS.get(statut)
+    if not field or not delta or activite_id is None:
+        return
+
+    if delta > 0:
+        value = F(field) + delta
+    else:
+        # Never go below zero, even if the counters drifted
+        value = Greatest(F(field) - (-delta), 0)
+
+    Activite.objects.filter(pk=activite_id).update(**{field: value})
+
+
+def compute_counters(activite_ids=None):
+    """Return {activite_id: {field: count}} computed from the inscription table"""
+    queryset = Activite.objects.all()
+    if activite_ids is not None:
+        queryset = queryset.filter(pk__in=activite_ids)
+
+    annotations = {
+        field: Count('inscriptions', filter=Q(inscriptions__statut=statut))
+        for statut, field in Inscription.COUNTER_FIELDS.items()
+    }
+    rows = queryset.order_by().values('pk').annotate(**annotations)
+
+    return {
+        row['pk']: {field: row[field] for field in Inscription.COUNTER_FIELDS.values()}
+        for row in rows
+    }
+
+
+def find_counter_mismatches(activite_ids=None):
+    """Return a list of (activite_id, stored, expected) for activities whose counters drifted"""
+    expected = compute_counters(activite_ids)
+    fields = list(Inscription.COUNTER_FIELDS.values())
+
+    stored = Activite.objects.filter(pk__in=expected.keys()).values('pk', *fields)
+
+    mismatches = []
+    for row in stored:
+        current = {field: row[field] for field in fields}
+        if current != expected[row['pk']]:
+            mismatches.append((row['pk'], current, expected[row['pk']]))
+
+    return mismatches
+
+
+def rebuild_counters(activite_ids=None):
+    """Recompute the stored counters from the inscription table, returns the number of fixed activities"""
+    mismatches = find_counter_mismatches(activite_ids)
+
+    for activite_id, _, expected in mismatches:
+        Activite.objects.filter(pk=activite_id).update(**expected)
+
+    return len(mismatches)
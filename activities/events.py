@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+ACTIVITY_COLORS = ('#4F46E5', '#4338CA')
+CANCELLED_COLORS = ('#EF4444', '#DC2626')
+SCHEDULE_COLORS = ('#F59E0B', '#D97706')
+RESERVATION_COLORS = ('#6B7280', '#4B5563')
+
+_PK_PLACEHOLDER = 987654321
+
+
+def url_template(name):
+    """Reverse a pk-based URL once and return a format string taking the pk"""
+    return reverse(name, kwargs={'pk': _PK_PLACEHOLDER}).replace(str(_PK_PLACEHOLDER), '{pk}')
+
+
+def parse_bound(value):
+    """Parse a FullCalendar start/end parameter, a date or an ISO datetime"""
+    if not value:
+        return None
+    # An unencoded '+' in the UTC offset arrives as a space
+    value = value.strip().replace(' ', '+')
+
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, datetime.min.time())
+
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_range(request):
+    """Return the (start, end) window requested by FullCalendar, None when missing.
+
+    Raises ValueError when a bound cannot be parsed or the window is empty.
+    """
+    start = parse_bound(request.GET.get('start'))
+    end = parse_bound(request.GET.get('end'))
+    if start and end and start >= end:
+        raise ValueError('empty window')
+    return start, end
+
+
+class EventBuilder:
+    """Build FullCalendar event dicts for the [start, end) window of a request.
+
+    Every source is filtered with plain range conditions on its indexed date
+    columns and read with values_list, and detail URLs come from templates
+    reversed once per builder.
+    """
+
+    def __init__(self, start=None, end=None):
+        self.start = start
+        self.end = end
+        self.tz = timezone.get_current_timezone()
+        self._activity_url = url_template('activities:detail')
+
+    def activities(self, queryset, colors=ACTIVITY_COLORS):
+        """Events for the activities of a queryset overlapping the window"""
+        if self.end is not None:
+            queryset = queryset.filter(date_debut__lt=self.end)
+        if self.start is not None:
+            queryset = queryset.filter(
+                Q(date_fin__gt=self.start) | Q(date_fin__isnull=True, date_debut__gte=self.start)
+            )
+
+        rows = queryset.order_by().values_list('pk', 'nom', 'date_debut', 'date_fin', 'annulee')
+        events = []
+        for pk, nom, date_debut, date_fin, annulee in rows:
+            background, border = CANCELLED_COLORS if annulee else colors
+            events.append({
+                'id': pk,
+                'title': nom,
+                'start': date_debut.isoformat(),
+                'end': date_fin.isoformat() if date_fin else None,
+                'url': self._activity_url.format(pk=pk),
+                'backgroundColor': background,
+                'borderColor': border,
+            })
+        return events
+
+    def schedules(self, queryset):
+        """Events for the StaffSchedule shifts of a queryset overlapping the window"""
+        # Night shifts end the next day, so start one day early
+        if self.start is not None:
+            queryset = queryset.filter(date__gte=timezone.localtime(self.start, self.tz).date() - timedelta(days=1))
+        if self.end is not None:
+            queryset = queryset.filter(date__lte=timezone.localtime(self.end, self.tz).date())
+
+        rows = queryset.order_by().values_list('pk', 'date', 'start_time', 'end_time', 'notes')
+        events = []
+        for pk, day, start_time, end_time, notes in rows:
+            shift_start = datetime.combine(day, start_time, tzinfo=self.tz)
+            shift_end = datetime.combine(day, end_time, tzinfo=self.tz)
+            if shift_end <= shift_start:
+                shift_end += timedelta(days=1)
+            if (self.start and shift_end <= self.start) or (self.end and shift_start >= self.end):
+                continue
+
+            events.append({
+                'id': f'schedule_{pk}',
+                'title': f'Horaire: {notes or "Travail"}',
+                'start': shift_start.isoformat(),
+                'end': shift_end.isoformat(),
+                'backgroundColor': SCHEDULE_COLORS[0],
+                'borderColor': SCHEDULE_COLORS[1],
+            })
+        return events
+
+    def reservations(self, queryset):
+        """Events for the infrastructure reservations of a queryset overlapping the window"""
+        if self.end is not None:
+            queryset = queryset.filter(date_debut__lt=self.end)
+        if self.start is not None:
+            queryset = queryset.filter(date_fin__gt=self.start)
+
+        rows = queryset.order_by().values_list('pk', 'date_debut', 'date_fin', 'motif')
+        return [
+            {
+                'id': f'reservation_{pk}',
+                'title': f'Réservation: {motif}',
+                'start': date_debut.isoformat(),
+                'end': date_fin.isoformat(),
+                'backgroundColor': RESERVATION_COLORS[0],
+                'borderColor': RESERVATION_COLORS[1],
+            }
+            for pk, date_debut, date_fin, motif in rows
+        ]
@@ -2,10 +2,12 @@ from django import forms
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Activite, Inscription, ActiviteAnimateur, ActiviteMateriel
+from .models import Activite, Inscription, ActiviteAnimateur, ActiviteMateriel, SerieActivite
+from .series import MAX_OCCURRENCES, occurrences, find_series_conflicts, series_slots
 from participants.models import Participant
 from staff.models import Animateur
 from infrastructure.models import Materiel
+from infrastructure.conflicts import find_conflicts, describe_conflicts
 
 
 class ActiviteForm(forms.ModelForm):
@@ -35,6 +37,25 @@ class ActiviteForm(forms.ModelForm):
             now = timezone.now()
             rounded_hour = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
             self.fields['date_debut'].initial = rounded_hour
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        infrastructure = cleaned_data.get('infrastructure')
+        start = cleaned_data.get('date_debut')
+        duree = cleaned_data.get('duree')
+        
+        # Check that the infrastructure is free, cancelled activities do not book it
+        if infrastructure and start and duree and not self.instance.annulee:
+            end = start + timedelta(minutes=duree)
+            conflicts = find_conflicts(
+                infrastructure, start, end,
+                exclude_activite=self.instance.pk
+            )
+            
+            for message in describe_conflicts(conflicts):
+                self.add_error('infrastructure', message)
+        
+        return cleaned_data
 
 
 class InscriptionForm(forms.ModelForm):
@@ -99,4 +120,117 @@ class ActiviteMaterielForm(forms.ModelForm):
             ).order_by('nom')
         
         self.fields['quantite_requise'].initial = 1
-        self.fields['quantite_requise'].widget.attrs['min'] = 1
\ No newline at end of file
+        self.fields['quantite_requise'].widget.attrs['min'] = 1
+
+class BulkInscriptionForm(forms.Form):
+    """Form for registering a group of participants to one activity"""
+    participants = forms.ModelMultipleChoiceField(
+        queryset=Participant.objects.none(),
+        widget=forms.SelectMultiple(attrs={'size': 15}),
+    )
+    statut = forms.ChoiceField(choices=Inscription.STATUT_CHOICES, initial='inscrit')
+    notes = forms.CharField(widget=forms.Textarea(attrs={'rows': 3}), required=False)
+    
+    def __init__(self, *args, participants_queryset=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        if participants_queryset is None:
+            participants_queryset = Participant.objects.all()
+        self.fields['participants'].queryset = participants_queryset.order_by('nom', 'prenom')
+        self.fields['participants'].help_text = "Maintenez Ctrl (ou Cmd) pour sélectionner plusieurs participants"
+
+class SerieActiviteForm(forms.ModelForm):
+    """Form for repeating a template activity as a series"""
+    jours = forms.TypedMultipleChoiceField(
+        choices=SerieActivite.JOURS_CHOICES,
+        coerce=int,
+        widget=forms.CheckboxSelectMultiple,
+    )
+    ignorer_conflits = forms.BooleanField(
+        required=False,
+        label="Ignorer les dates en conflit",
+        help_text="Crée les autres occurrences et saute celles où le lieu est déjà réservé",
+    )
+    
+    class Meta:
+        model = SerieActivite
+        fields = ['date_fin', 'jours', 'intervalle']
+        widgets = {
+            'date_fin': forms.DateInput(attrs={'type': 'date'}),
+        }
+    
+    def __init__(self, *args, template=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.template = template
+        
+        # The series starts on the day of the template activity
+        if template is not None and not self.instance.pk:
+            self.instance.nom = template.nom
+            self.instance.date_debut = timezone.localtime(template.date_debut).date()
+            self.fields['jours'].initial = [self.instance.date_debut.weekday()]
+        
+        self.fields['date_fin'].label = "Répéter jusqu'au"
+        self.fields['intervalle'].widget.attrs['min'] = 1
+    
+    def clean_jours(self):
+        return ','.join(str(jour) for jour in sorted(set(self.cleaned_data['jours'])))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        date_fin = cleaned_data.get('date_fin')
+        jours = cleaned_data.get('jours')
+        
+        if date_fin and self.instance.date_debut and date_fin < self.instance.date_debut:
+            self.add_error('date_fin', "La date de fin doit être postérieure à la première occurrence.")
+        elif date_fin and jours and self.template is not None:
+            serie = SerieActivite(
+                date_debut=self.instance.date_debut,
+                date_fin=date_fin,
+                jours=jours,
+                intervalle=cleaned_data.get('intervalle') or 1,
+            )
+            if len(occurrences(serie, self.template.date_debut, self.template.duree)) > MAX_OCCURRENCES:
+                self.add_error('date_fin', f"Une série ne peut pas dépasser {MAX_OCCURRENCES} occurrences.")
+        
+        return cleaned_data
+
+
+class SerieUpdateForm(forms.ModelForm):
+    """Form for editing every activity of a series at once"""
+    class Meta:
+        model = Activite
+        fields = [
+            'nom', 'description', 'duree', 'responsable',
+            'infrastructure', 'capacite_max', 'niveau_difficulte',
+            'age_minimum', 'age_maximum', 'points_cles', 'image'
+        ]
+        widgets = {
+            'description': forms.Textarea(attrs={'rows': 4}),
+            'points_cles': forms.Textarea(attrs={'rows': 4}),
+        }
+    
+    def __init__(self, *args, serie=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.serie = serie
+        self.fields['duree'].help_text = "Durée en minutes"
+        self.fields['capacite_max'].help_text = "Nombre maximum de participants (laisser vide si illimité)"
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        infrastructure = cleaned_data.get('infrastructure')
+        duree = cleaned_data.get('duree')
+        
+        # Check every occurrence against the venue calendar in one batch
+        changed = {'infrastructure', 'duree'} & set(self.changed_data)
+        if self.serie is not None and infrastructure and duree and changed:
+            conflicts = find_series_conflicts(
+                infrastructure.pk,
+                series_slots(self.serie, duree),
+                exclude_activites=self.serie.activites.values('pk'),
+            )
+            for start, end, bookings in conflicts[:5]:
+                self.add_error('infrastructure', f"{timezone.localtime(start):%d/%m/%Y %H:%M}: {' '.join(describe_conflicts(bookings))}")
+            if len(conflicts) > 5:
+                self.add_error('infrastructure', f"... et {len(conflicts) - 5} autre(s) occurrence(s) en conflit.")
+        
+        return cleaned_data
\ No newline at end of file
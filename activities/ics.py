@@ -0,0 +1,185 @@
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.db.models import Count, IntegerField, Max, Value
+from django.db.models.functions import Greatest
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from infrastructure.models import Infrastructure, InfrastructureReservation
+from participants.models import Participant
+from staff.models import Animateur, Responsable
+from .events import url_template
+from .models import Activite, ActiviteAnimateur, Inscription
+
+
+# Past events older than this are left out of the feeds
+FEED_HISTORY = timedelta(days=90)
+
+CHUNK_SIZE = 500
+
+_signer = signing.Signer(salt='activities.calendar-feed')
+
+
+def _activity_rows(kind, pk):
+    """Queryset of the activities of a feed and the prefix of the Activite fields in it"""
+    if kind == 'participant':
+        return Inscription.objects.filter(participant_id=pk).exclude(statut='annule'), 'activite__'
+    if kind == 'animateur':
+        return ActiviteAnimateur.objects.filter(animateur_id=pk), 'activite__'
+    if kind == 'responsable':
+        return Activite.objects.filter(responsable_id=pk), ''
+    return Activite.objects.filter(infrastructure_id=pk), ''
+
+
+def _fingerprint_sources(kind, pk):
+    """(queryset, updated_at fields) whose changes invalidate a feed"""
+    if kind == 'participant':
+        # All statuses, so a cancellation changes the fingerprint
+        return [(Inscription.objects.filter(participant_id=pk), ['updated_at', 'activite__updated_at'])]
+    if kind == 'animateur':
+        return [(ActiviteAnimateur.objects.filter(animateur_id=pk), ['updated_at', 'activite__updated_at'])]
+    if kind == 'responsable':
+        return [(Activite.objects.filter(responsable_id=pk), ['updated_at'])]
+    return [
+        (Activite.objects.filter(infrastructure_id=pk), ['updated_at']),
+        (InfrastructureReservation.objects.filter(infrastructure_id=pk), ['updated_at']),
+    ]
+
+
+FEED_MODELS = {
+    'participant': Participant,
+    'animateur': Animateur,
+    'responsable': Responsable,
+    'infrastructure': Infrastructure,
+}
+
+
+def feed_token(kind, pk):
+    """Secret token giving read access to one calendar feed"""
+    return _signer.signature(f'{kind}:{pk}')
+
+
+def check_feed_token(kind, pk, token):
+    return kind in FEED_MODELS and constant_time_compare(token, feed_token(kind, pk))
+
+
+def feed_url(kind, pk):
+    return reverse('activities:calendar_feed', kwargs={'kind': kind, 'pk': pk, 'token': feed_token(kind, pk)})
+
+
+def feed_etag(kind, pk):
+    """ETag of a feed from the latest updated_at and row count of its sources, in one query"""
+    parts = []
+    for queryset, fields in _fingerprint_sources(kind, pk):
+        latest = [Max(field) for field in fields]
+        parts.append(
+            queryset.order_by().annotate(
+                feed=Value(1, output_field=IntegerField())
+            ).values('feed').annotate(
+                latest=Greatest(*latest) if len(latest) > 1 else latest[0],
+                total=Count('pk'),
+            ).values_list('latest', 'total')
+        )
+
+    query = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    fingerprint = repr([(latest.isoformat() if latest else None, total) for latest, total in query])
+    return hashlib.md5(f'{kind}:{pk}:{fingerprint}'.encode()).hexdigest()
+
+
+def _escape(value):
+    return (
+        str(value or '').replace('\\', '\\\\').replace(';', '\\;')
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _format(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _fold(line):
+    """Fold a content line at 75 octets as required by RFC 5545"""
+    data = line.encode()
+    if len(data) <= 75:
+        return line + '\r\n'
+
+    chunks, current = [], b''
+    for char in line:
+        encoded = char.encode()
+        if len(current) + len(encoded) > (75 if not chunks else 74):
+            chunks.append(current.decode())
+            current = b''
+        current += encoded
+    chunks.append(current.decode())
+    return '\r\n '.join(chunks) + '\r\n'
+
+
+def _event(uid, start, end, summary, updated_at, location=None, url=None, cancelled=False):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{_format(updated_at)}',
+        f'DTSTART:{_format(start)}',
+        f'DTEND:{_format(end)}',
+        f'SUMMARY:{_escape(summary)}',
+    ]
+    if location:
+        lines.append(f'LOCATION:{_escape(location)}')
+    if url:
+        lines.append(f'URL:{url}')
+    if cancelled:
+        lines.append('STATUS:CANCELLED')
+    lines.append('END:VEVENT')
+    return ''.join(_fold(line) for line in lines)
+
+
+def iter_calendar(kind, pk, name, base_url='', host='camp'):
+    """Yield an iCalendar document for a feed, streaming its rows from the database"""
+    yield ''.join(_fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Camp de Vacances//Calendrier//FR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(name)}',
+    ])
+
+    since = timezone.now() - FEED_HISTORY
+    queryset, prefix = _activity_rows(kind, pk)
+    fields = ['id', 'nom', 'date_debut', 'date_fin', 'duree', 'annulee', 'updated_at', 'infrastructure__nom']
+    rows = queryset.filter(
+        **{f'{prefix}date_debut__gte': since}
+    ).order_by(
+        f'{prefix}date_debut'
+    ).values_list(
+        *[prefix + field for field in fields]
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+    url = base_url + url_template('activities:detail')
+    for activite_id, nom, date_debut, date_fin, duree, annulee, updated_at, lieu in rows:
+        yield _event(
+            f'activite-{activite_id}@{host}',
+            date_debut,
+            date_fin or date_debut + timedelta(minutes=duree or 0),
+            nom,
+            updated_at,
+            location=lieu,
+            url=url.format(pk=activite_id),
+            cancelled=annulee,
+        )
+
+    if kind == 'infrastructure':
+        reservations = InfrastructureReservation.objects.filter(
+            infrastructure_id=pk,
+            date_fin__gte=since,
+        ).order_by('date_debut').values_list(
+            'id', 'motif', 'date_debut', 'date_fin', 'updated_at'
+        ).iterator(chunk_size=CHUNK_SIZE)
+
+        for reservation_id, motif, date_debut, date_fin, updated_at in reservations:
+            yield _event(f'reservation-{reservation_id}@{host}', date_debut, date_fin, f'Réservation: {motif}', updated_at)
+
+    yield 'END:VCALENDAR\r\n'
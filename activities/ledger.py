@@ -0,0 +1,113 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Q
+
+from .models import ActiviteMateriel
+
+
+class MaterielLedger:
+    """Time-ordered demand of materials booked by activities.
+
+    For each material, the start (+quantity) and end (-quantity) events of the
+    ActiviteMateriel rows are sorted once and turned into a prefix sum, so the
+    demand at any instant is a bisection and the peak over a window is a scan
+    of the events inside that window only.
+    """
+
+    def __init__(self, rows=()):
+        events = defaultdict(list)
+        for materiel_id, start, end, quantite in rows:
+            if quantite and end > start:
+                events[materiel_id].append((start, quantite))
+                events[materiel_id].append((end, -quantite))
+
+        self._times = {}
+        self._levels = {}
+        for materiel_id, items in events.items():
+            # Releases sort before bookings at the same instant: [start, end) windows
+            items.sort()
+            times, levels, level = [], [], 0
+            for time, delta in items:
+                level += delta
+                if times and times[-1] == time:
+                    levels[-1] = level
+                else:
+                    times.append(time)
+                    levels.append(level)
+            self._times[materiel_id] = times
+            self._levels[materiel_id] = levels
+
+    @classmethod
+    def load(cls, materiel_ids, start, end, exclude_activite=None):
+        """Load the bookings of the given materials overlapping [start, end) with one query"""
+        queryset = ActiviteMateriel.objects.filter(
+            Q(activite__date_fin__gt=start) | Q(activite__date_fin__isnull=True),
+            materiel_id__in=list(materiel_ids),
+            activite__date_debut__lt=end,
+            activite__annulee=False,
+        )
+        if exclude_activite is not None:
+            queryset = queryset.exclude(activite_id=getattr(exclude_activite, 'pk', exclude_activite))
+
+        rows = queryset.values_list(
+            'materiel_id', 'activite__date_debut', 'activite__date_fin',
+            'activite__duree', 'quantite_requise',
+        )
+        return cls(
+            (materiel_id, activity_start, activity_end or activity_start + timedelta(minutes=duree or 0), quantite)
+            for materiel_id, activity_start, activity_end, duree, quantite in rows
+        )
+
+    def demand_at(self, materiel_id, instant):
+        """Quantity of a material in use at an instant"""
+        times = self._times.get(materiel_id)
+        if not times:
+            return 0
+        position = bisect_right(times, instant)
+        return self._levels[materiel_id][position - 1] if position else 0
+
+    def peak(self, materiel_id, start, end):
+        """Highest concurrent demand of a material over [start, end)"""
+        times = self._times.get(materiel_id)
+        if not times:
+            return 0
+        levels = self._levels[materiel_id]
+        first = bisect_right(times, start)
+        last = bisect_left(times, end)
+        return max([self.demand_at(materiel_id, start)] + levels[first:last])
+
+    def bucketed_peaks(self, materiel_id, start, end, bucket=timedelta(hours=1)):
+        """Return [(bucket_start, peak)] for consecutive buckets covering [start, end)"""
+        times = self._times.get(materiel_id, [])
+        levels = self._levels.get(materiel_id, [])
+
+        buckets = []
+        position = bisect_right(times, start)
+        level = levels[position - 1] if position else 0
+        bucket_start = start
+
+        while bucket_start < end:
+            bucket_end = min(bucket_start + bucket, end)
+            while position < len(times) and times[position] <= bucket_start:
+                level = levels[position]
+                position += 1
+            peak = level
+            while position < len(times) and times[position] < bucket_end:
+                level = levels[position]
+                peak = max(peak, level)
+                position += 1
+            buckets.append((bucket_start, peak))
+            bucket_start = bucket_end
+
+        return buckets
+
+
+def available_quantity(materiel, activite):
+    """Return how many units of a material are still free during an activity"""
+    start = activite.date_debut
+    end = activite.date_fin or start + timedelta(minutes=activite.duree or 0)
+
+    ledger = MaterielLedger.load([materiel.pk], start, end, exclude_activite=activite)
+    return materiel.quantite_disponible - ledger.peak(materiel.pk, start, end)
@@ -0,0 +1,57 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.utils import overlapping_pairs
+from activities.models import Inscription
+
+
+class Command(BaseCommand):
+    help = "Recherche les participants inscrits à des activités qui se chevauchent"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help="Nombre de lignes lues par aller-retour avec la base",
+        )
+        parser.add_argument(
+            '--fail', action='store_true',
+            help="Termine avec un code d'erreur si des chevauchements sont trouvés",
+        )
+
+    def _describe(self, row):
+        start, end = timezone.localtime(row[1]), timezone.localtime(row[2])
+        return f"{row[4]} (#{row[3]}, {start:%d/%m/%Y %H:%M}-{end:%H:%M})"
+
+    def handle(self, *args, **options):
+        # One ordered scan of the table, then a sweep line per participant
+        rows = Inscription.objects.filter(
+            activite__annulee=False,
+            activite__date_fin__isnull=False,
+        ).exclude(
+            statut='annule'
+        ).order_by(
+            'participant_id', 'activite__date_debut'
+        ).values_list(
+            'participant_id', 'activite__date_debut', 'activite__date_fin',
+            'activite_id', 'activite__nom', 'participant__prenom', 'participant__nom',
+        ).iterator(chunk_size=options['chunk_size'])
+
+        found = 0
+        for participant_id, inscriptions in groupby(rows, key=lambda row: row[0]):
+            items = [(row[1], row[2], row) for row in inscriptions]
+            for first, second in overlapping_pairs(items):
+                first, second = first[2], second[2]
+                found += 1
+                self.stdout.write(
+                    f"{first[5]} {first[6]} (#{participant_id}): {self._describe(first)} / {self._describe(second)}"
+                )
+
+        if found:
+            message = f"{found} chevauchement(s) trouvé(s)."
+            if options['fail']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("Aucun chevauchement trouvé."))
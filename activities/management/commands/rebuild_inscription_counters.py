@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from activities.counters import find_counter_mismatches, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'inscriptions stockés sur les activités"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Vérifie uniquement les compteurs sans les corriger (code de sortie non nul en cas d'écart)",
+        )
+        parser.add_argument(
+            '--activite', type=int, action='append', dest='activite_ids',
+            help="Limite le traitement à cette activité (option répétable)",
+        )
+
+    def handle(self, *args, **options):
+        activite_ids = options['activite_ids']
+
+        if options['check']:
+            mismatches = find_counter_mismatches(activite_ids)
+            for activite_id, stored, expected in mismatches:
+                self.stdout.write(f"Activité {activite_id}: stocké {stored}, attendu {expected}")
+
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} activité(s) avec des compteurs incorrects.")
+
+            self.stdout.write(self.style.SUCCESS("Tous les compteurs sont corrects."))
+            return
+
+        with transaction.atomic():
+            fixed = rebuild_counters(activite_ids)
+
+        self.stdout.write(self.style.SUCCESS(f"{fixed} activité(s) corrigée(s)."))
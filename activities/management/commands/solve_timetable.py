@@ -0,0 +1,87 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from activities.timetable import TimetableSolver, apply_solution, load_week, synthetic_week
+
+
+class Command(BaseCommand):
+    help = "Place les activités sans lieu d'une semaine sur les infrastructures et les créneaux libres"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semaine', type=date.fromisoformat,
+            help="Un jour de la semaine à planifier (AAAA-MM-JJ, par défaut la semaine en cours)",
+        )
+        parser.add_argument(
+            '--apply', action='store_true',
+            help="Enregistre le planning trouvé (sinon simple simulation)",
+        )
+        parser.add_argument(
+            '--budget', type=float, default=10.0,
+            help="Temps de calcul maximum en secondes",
+        )
+        parser.add_argument(
+            '--pas', type=int, default=30,
+            help="Pas de la grille horaire en minutes",
+        )
+        parser.add_argument(
+            '--sans-planning', action='store_true',
+            help="Ne vérifie pas que les animateurs sont de service (StaffSchedule)",
+        )
+        parser.add_argument(
+            '--benchmark', type=int, metavar='N',
+            help="Résout une semaine synthétique de N activités, sans base de données",
+        )
+        parser.add_argument(
+            '--lieux', type=int, default=25,
+            help="Nombre d'infrastructures de la semaine synthétique",
+        )
+        parser.add_argument('--seed', type=int, help="Graine de la semaine synthétique")
+
+    def handle(self, *args, **options):
+        solver_options = {
+            'time_budget': options['budget'],
+            'step': options['pas'],
+            'require_shift': not options['sans_planning'],
+        }
+
+        if options['benchmark']:
+            tasks, venues = synthetic_week(options['benchmark'], venues=options['lieux'], seed=options['seed'])
+            solution = TimetableSolver(tasks, venues, **solver_options).solve()
+            self.report(solution, len(tasks))
+            return
+
+        solver = load_week(options['semaine'] or timezone.localdate(), **solver_options)
+        labels = {task.pk: task.label for task in solver.tasks}
+        solution = solver.solve()
+
+        for pk, (infrastructure_id, start, end) in sorted(solution.assignments.items(), key=lambda item: item[1][1]):
+            self.stdout.write(
+                f"{labels[pk]} (#{pk}): {timezone.localtime(start):%d/%m/%Y %H:%M}-"
+                f"{timezone.localtime(end):%H:%M}, infrastructure #{infrastructure_id}"
+            )
+        for pk in solution.unplaced:
+            self.stdout.write(self.style.WARNING(f"{labels[pk]} (#{pk}): aucun créneau possible"))
+
+        self.report(solution, len(solver.tasks))
+
+        if options['apply']:
+            saved = apply_solution(solution)
+            self.stdout.write(self.style.SUCCESS(f"{saved} activité(s) planifiée(s)."))
+        elif solution.assignments:
+            self.stdout.write("Simulation uniquement, relancez avec --apply pour enregistrer.")
+
+    def report(self, solution, total):
+        message = (
+            f"{len(solution.assignments)}/{total} activité(s) placée(s) en {solution.elapsed:.2f}s, "
+            f"{solution.backtracks} retour(s) arrière"
+        )
+        if solution.timed_out:
+            message += ", budget de temps atteint"
+
+        if solution.complete:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.WARNING(message))
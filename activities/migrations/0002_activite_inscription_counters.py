@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Activite = apps.get_model('activities', 'Activite')
+    counters = {
+        'nb_inscrits': Count('inscriptions', filter=Q(inscriptions__statut='inscrit')),
+        'nb_en_attente': Count('inscriptions', filter=Q(inscriptions__statut='en_attente')),
+        'nb_annules': Count('inscriptions', filter=Q(inscriptions__statut='annule')),
+    }
+    rows = Activite.objects.order_by().values('pk').annotate(**counters)
+    for row in rows.iterator():
+        pk = row.pop('pk')
+        if any(row.values()):
+            Activite.objects.filter(pk=pk).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activite',
+            name='nb_annules',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='activite',
+            name='nb_en_attente',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='activite',
+            name='nb_inscrits',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
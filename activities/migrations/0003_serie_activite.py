@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0002_activite_inscription_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieActivite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('nom', models.CharField(max_length=100)),
+                ('date_debut', models.DateField()),
+                ('date_fin', models.DateField()),
+                ('jours', models.CharField(help_text='Jours de la semaine (0 = lundi), séparés par des virgules', max_length=20)),
+                ('intervalle', models.PositiveSmallIntegerField(default=1, help_text='Répéter toutes les N semaines')),
+            ],
+            options={
+                'verbose_name': "Série d'activités",
+                'verbose_name_plural': "Séries d'activités",
+                'db_table': 'serie_activite',
+                'ordering': ['date_debut'],
+            },
+        ),
+        migrations.AddField(
+            model_name='activite',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activites', to='activities.serieactivite'),
+        ),
+    ]
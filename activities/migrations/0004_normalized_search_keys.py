@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_search_keys(apps, schema_editor):
+    from core.utils import fold
+
+    model = apps.get_model('activities', 'Activite')
+    batch = []
+    for row in model.objects.only('id', 'nom').iterator(chunk_size=BATCH_SIZE):
+        row.nom_normalise = fold(row.nom)
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_update(batch, ['nom_normalise'])
+            batch = []
+    model.objects.bulk_update(batch, ['nom_normalise'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0003_serie_activite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activite',
+            name='nom_normalise',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_search_keys, migrations.RunPython.noop),
+    ]
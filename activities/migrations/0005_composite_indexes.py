@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0004_normalized_search_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activite',
+            index=models.Index(fields=['date_debut', 'annulee'], name='activite_debut_annulee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activite',
+            index=models.Index(fields=['infrastructure', 'date_debut', 'date_fin'], name='activite_infra_periode_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['activite', 'statut'], name='inscription_act_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['date_inscription'], name='inscription_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inscription',
+            index=models.Index(fields=['statut', 'date_inscription'], name='inscription_statut_date_idx'),
+        ),
+    ]
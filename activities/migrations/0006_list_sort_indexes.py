@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0005_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activite',
+            index=models.Index(fields=['date_debut'], name='activite_debut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activite',
+            index=models.Index(fields=['nom'], name='activite_nom_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activite',
+            index=models.Index(fields=['nb_inscrits'], name='activite_nb_inscrits_idx'),
+        ),
+    ]
@@ -1,10 +1,43 @@
-from django.db import models
-from core.models import TimestampMixin
+from django.db import models, transaction
+from core.models import NormalizedFieldsMixin, TimestampMixin
 from staff.models import Responsable, Animateur
 from infrastructure.models import Infrastructure, Materiel
 from participants.models import Participant
 
-class Activite(TimestampMixin):
+class SerieActivite(TimestampMixin):
+    """Recurrence rule repeating a template activity on given weekdays"""
+    JOURS_CHOICES = (
+        (0, 'Lundi'),
+        (1, 'Mardi'),
+        (2, 'Mercredi'),
+        (3, 'Jeudi'),
+        (4, 'Vendredi'),
+        (5, 'Samedi'),
+        (6, 'Dimanche'),
+    )
+    nom = models.CharField(max_length=100)
+    date_debut = models.DateField()
+    date_fin = models.DateField()
+    jours = models.CharField(max_length=20, help_text="Jours de la semaine (0 = lundi), séparés par des virgules")
+    intervalle = models.PositiveSmallIntegerField(default=1, help_text="Répéter toutes les N semaines")
+    
+    class Meta:
+        db_table = 'serie_activite'
+        verbose_name = 'Série d\'activités'
+        verbose_name_plural = 'Séries d\'activités'
+        ordering = ['date_debut']
+    
+    def __str__(self):
+        return f"{self.nom} ({self.date_debut.strftime('%d/%m/%Y')} - {self.date_fin.strftime('%d/%m/%Y')})"
+    
+    def get_jours(self):
+        return sorted({int(jour) for jour in self.jours.split(',') if jour.strip()})
+    
+    def get_jours_display(self):
+        labels = dict(self.JOURS_CHOICES)
+        return ", ".join(labels[jour] for jour in self.get_jours())
+
+class Activite(NormalizedFieldsMixin, TimestampMixin):
     """Model representing camp activities"""
     nom = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
@@ -24,12 +57,31 @@ class Activite(TimestampMixin):
     points_cles = models.TextField(blank=True, null=True)
    # image = models.ImageField(upload_to='activite_images/', blank=True, null=True)
     image = models.CharField(max_length=255, blank=True, null=True)
+    serie = models.ForeignKey(SerieActivite, on_delete=models.CASCADE, null=True, blank=True, related_name='activites')
+    
+    # Denormalized inscription counters, maintained by activities.signals
+    nb_inscrits = models.IntegerField(default=0, editable=False)
+    nb_en_attente = models.IntegerField(default=0, editable=False)
+    nb_annules = models.IntegerField(default=0, editable=False)
+    
+    # Search key maintained by NormalizedFieldsMixin
+    nom_normalise = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    
+    NORMALIZED_FIELDS = {'nom_normalise': ('nom', 'text')}
     
     class Meta:
         db_table = 'activite'
         verbose_name = 'Activité'
         verbose_name_plural = 'Activités'
         ordering = ['date_debut']
+        indexes = [
+            models.Index(fields=['date_debut', 'annulee'], name='activite_debut_annulee_idx'),
+            models.Index(fields=['infrastructure', 'date_debut', 'date_fin'], name='activite_infra_periode_idx'),
+            # Sorts of the activity list, the primary key completes them
+            models.Index(fields=['date_debut'], name='activite_debut_idx'),
+            models.Index(fields=['nom'], name='activite_nom_idx'),
+            models.Index(fields=['nb_inscrits'], name='activite_nb_inscrits_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nom} - {self.date_debut.strftime('%d/%m/%Y %H:%M')}"
@@ -42,16 +94,16 @@ class Activite(TimestampMixin):
         super().save(*args, **kwargs)
     
     def get_participants_count(self):
-        return self.inscriptions.count()
+        return self.nb_inscrits
     
     def get_available_spots(self):
         if self.capacite_max:
-            return max(0, self.capacite_max - self.get_participants_count())
+            return max(0, self.capacite_max - self.nb_inscrits)
         return None
     
     def is_full(self):
         if self.capacite_max:
-            return self.get_participants_count() >= self.capacite_max
+            return self.nb_inscrits >= self.capacite_max
         return False
 
 class ActiviteAnimateur(TimestampMixin):
@@ -82,6 +134,47 @@ class ActiviteMateriel(TimestampMixin):
     def __str__(self):
         return f"{self.materiel} (x{self.quantite_requise}) - {self.activite}"
 
+class InscriptionQuerySet(models.QuerySet):
+    """Inscriptions whose bulk writes keep the activity counters in sync.
+
+    The counters are moved by the save and delete signals, which update() and
+    bulk_update() skip. When those change the status or the activity, the
+    counters of every activity involved are recomputed in the same transaction.
+    bulk_create() and raw SQL are not covered: move the counters with
+    counters.apply_counter_delta, or run rebuild_inscription_counters.
+    """
+    COUNTED_FIELDS = {'statut', 'activite', 'activite_id'}
+
+    def _recount(self, activite_ids):
+        from .counters import rebuild_counters
+        rebuild_counters({activite_id for activite_id in activite_ids if activite_id is not None})
+
+    def update(self, **kwargs):
+        if not self.COUNTED_FIELDS & set(kwargs):
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            activite_ids = set(self.values_list('activite_id', flat=True))
+            rows = super().update(**kwargs)
+            target = kwargs.get('activite', kwargs.get('activite_id'))
+            target = getattr(target, 'pk', target)
+            if isinstance(target, int):
+                activite_ids.add(target)
+            self._recount(activite_ids)
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if not self.COUNTED_FIELDS & set(fields):
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            activite_ids = set(self.filter(pk__in=[obj.pk for obj in objs]).values_list('activite_id', flat=True))
+            rows = super().bulk_update(objs, fields, batch_size=batch_size)
+            self._recount(activite_ids | {obj.activite_id for obj in objs})
+        return rows
+
+
 class Inscription(TimestampMixin):
     """Model representing participant registrations for activities"""
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='inscriptions')
@@ -96,11 +189,30 @@ class Inscription(TimestampMixin):
     notes = models.TextField(blank=True, null=True)
     a_participe = models.BooleanField(default=False)
     
+    objects = InscriptionQuerySet.as_manager()
+    
     class Meta:
         db_table = 'inscription'
         verbose_name = 'Inscription'
         verbose_name_plural = 'Inscriptions'
         unique_together = ('participant', 'activite')
+        indexes = [
+            models.Index(fields=['activite', 'statut'], name='inscription_act_statut_idx'),
+            models.Index(fields=['date_inscription'], name='inscription_date_idx'),
+            models.Index(fields=['statut', 'date_inscription'], name='inscription_statut_date_idx'),
+        ]
+    
+    # Activite counter field holding the number of inscriptions in each status
+    COUNTER_FIELDS = {
+        'inscrit': 'nb_inscrits',
+        'en_attente': 'nb_en_attente',
+        'annule': 'nb_annules',
+    }
     
     def __str__(self):
-        return f"{self.participant} - {self.activite}"
\ No newline at end of file
+        return f"{self.participant} - {self.activite}"
+    
+    def save(self, *args, **kwargs):
+        # Keep the row and the activity counters updated by the signals in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,232 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from core.pagination import invalidate_counts_on_commit
+from dashboard.chart_cache import invalidate_on_commit
+from dashboard.rollup import inscription_day, record_inscription
+from dashboard.stats import on_commit_refresh
+from participants.models import Participant
+from .models import Activite, Inscription
+from .counters import apply_counter_delta
+
+
+class RegistrationResult:
+    """Outcome of a registration attempt"""
+    OK = 'ok'
+    FULL = 'full'
+    DUPLICATE = 'duplicate'
+    AGE = 'age'
+    CONFLICT = 'conflict'
+    NOT_FOUND = 'not_found'
+
+    MESSAGES = {
+        OK: 'Inscription enregistrée.',
+        FULL: 'Cette activité est complète.',
+        DUPLICATE: 'Ce participant est déjà inscrit à cette activité.',
+        AGE: "L'âge du participant ne correspond pas à cette activité.",
+        CONFLICT: 'Ce participant est déjà inscrit à une autre activité sur ce créneau.',
+        NOT_FOUND: 'Participant introuvable.',
+    }
+
+    def __init__(self, status, inscription=None, participant_id=None):
+        self.status = status
+        self.inscription = inscription
+        self.participant_id = participant_id
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return f"<RegistrationResult {self.status}>"
+
+    @property
+    def ok(self):
+        return self.status == self.OK
+
+    @property
+    def message(self):
+        return self.MESSAGES[self.status]
+
+
+def lock_activite(activite_id):
+    """Take the write lock on an activity row and return its current state.
+
+    Concurrent registrations on the same activity are serialized until the
+    surrounding transaction ends. SELECT ... FOR UPDATE is a no-op on SQLite,
+    so there a write setting the counter to itself takes the database lock
+    first; no column actually changes, updated_at included.
+    Must be called inside transaction.atomic().
+    """
+    if not connection.features.has_select_for_update:
+        Activite.objects.filter(pk=activite_id).update(nb_inscrits=F('nb_inscrits'))
+    return Activite.objects.select_for_update().get(pk=activite_id)
+
+
+def save_inscription(inscription):
+    """Create or update an inscription without ever exceeding the activity capacity.
+
+    The activity row is locked before the duplicate and capacity checks, so the
+    check and the write happen atomically even under concurrent requests.
+    """
+    with transaction.atomic():
+        activite = lock_activite(inscription.activite_id)
+
+        previous = None
+        if inscription.pk:
+            previous = Inscription.objects.filter(pk=inscription.pk).values_list(
+                'participant_id', 'activite_id', 'statut'
+            ).first()
+
+        pair_changed = previous is None or previous[:2] != (inscription.participant_id, inscription.activite_id)
+        if pair_changed:
+            duplicate = Inscription.objects.filter(
+                participant_id=inscription.participant_id,
+                activite_id=inscription.activite_id,
+            ).exclude(pk=inscription.pk).exists()
+            if duplicate:
+                return RegistrationResult(RegistrationResult.DUPLICATE, inscription)
+
+        # Only enrolled inscriptions take a seat; moving within the activity keeps it
+        needs_seat = inscription.statut == 'inscrit' and (
+            previous is None
+            or previous[1] != inscription.activite_id
+            or previous[2] != 'inscrit'
+        )
+        if needs_seat and activite.is_full():
+            return RegistrationResult(RegistrationResult.FULL, inscription)
+
+        # A child cannot attend two overlapping activities
+        needs_slot = inscription.statut != 'annule' and (pair_changed or previous[2] == 'annule')
+        if needs_slot and overlapping_participant_ids(activite, [inscription.participant_id], exclude=inscription.pk):
+            return RegistrationResult(RegistrationResult.CONFLICT, inscription)
+
+        try:
+            with transaction.atomic():
+                inscription.save()
+        except IntegrityError:
+            return RegistrationResult(RegistrationResult.DUPLICATE, inscription)
+
+    return RegistrationResult(RegistrationResult.OK, inscription)
+
+
+def register(participant, activite, statut='inscrit', notes=None):
+    """Register a participant to an activity, see save_inscription"""
+    inscription = Inscription(
+        participant=participant,
+        activite=activite,
+        statut=statut,
+        notes=notes,
+    )
+    return save_inscription(inscription)
+
+
+def activity_window(activite):
+    """Return the [start, end) window of an activity"""
+    end = activite.date_fin or activite.date_debut + timedelta(minutes=activite.duree or 0)
+    return activite.date_debut, end
+
+
+def overlapping_participant_ids(activite, participant_ids, exclude=None):
+    """Return the participants already attending another activity overlapping this one.
+
+    Uses the (participant, activite) index of the inscription table, so the
+    cost depends on the inscriptions of these participants only.
+    """
+    start, end = activity_window(activite)
+
+    queryset = Inscription.objects.filter(
+        participant_id__in=participant_ids,
+        activite__date_debut__lt=end,
+        activite__date_fin__gt=start,
+        activite__annulee=False,
+    ).exclude(
+        statut='annule'
+    ).exclude(
+        activite_id=activite.pk
+    )
+    if exclude:
+        queryset = queryset.exclude(pk=exclude)
+
+    return set(queryset.values_list('participant_id', flat=True))
+
+
+def register_group(activite, participant_ids, statut='inscrit', notes=None):
+    """Register a whole group of participants to one activity.
+
+    Capacity, duplicates, age limits and overlapping activities are checked for
+    the whole group with a fixed number of queries, then every accepted
+    inscription is written with a single bulk_create inside one transaction.
+    Seats are granted in the order of participant_ids.
+
+    Returns a list of RegistrationResult, one per distinct participant id.
+    """
+    participant_ids = list(dict.fromkeys(int(pk) for pk in participant_ids))
+    results = []
+
+    with transaction.atomic():
+        activite = lock_activite(activite.pk)
+
+        participants = Participant.objects.filter(pk__in=participant_ids).only('id', 'date_naissance').in_bulk()
+        already_registered = set(
+            Inscription.objects.filter(
+                activite=activite,
+                participant_id__in=participant_ids,
+            ).values_list('participant_id', flat=True)
+        )
+
+        remaining = None
+        if statut == 'inscrit' and activite.capacite_max:
+            remaining = max(0, activite.capacite_max - activite.nb_inscrits)
+
+        busy = set()
+        if statut != 'annule':
+            busy = overlapping_participant_ids(activite, participant_ids)
+
+        activity_day = activite.date_debut.date()
+        to_create = []
+
+        for participant_id in participant_ids:
+            participant = participants.get(participant_id)
+
+            if participant is None:
+                status = RegistrationResult.NOT_FOUND
+            elif participant_id in already_registered:
+                status = RegistrationResult.DUPLICATE
+            elif not _age_allowed(activite, participant.get_age(on=activity_day)):
+                status = RegistrationResult.AGE
+            elif participant_id in busy:
+                status = RegistrationResult.CONFLICT
+            elif remaining == 0:
+                status = RegistrationResult.FULL
+            else:
+                status = RegistrationResult.OK
+                if remaining is not None:
+                    remaining -= 1
+
+            inscription = None
+            if status == RegistrationResult.OK:
+                inscription = Inscription(participant_id=participant_id, activite=activite, statut=statut, notes=notes)
+                to_create.append(inscription)
+
+            results.append(RegistrationResult(status, inscription, participant_id))
+
+        # bulk_create skips the model signals, so move the counter and the rollup explicitly
+        Inscription.objects.bulk_create(to_create)
+        apply_counter_delta(activite.pk, statut, len(to_create))
+        if to_create:
+            record_inscription(inscription_day(to_create[0]), activite.pk, statut, False, 1, count=len(to_create))
+            on_commit_refresh('registrations', 'activities')
+            invalidate_on_commit('inscription')
+            invalidate_counts_on_commit(Inscription)
+
+    return results
+
+
+def _age_allowed(activite, age):
+    if activite.age_minimum is not None and age < activite.age_minimum:
+        return False
+    if activite.age_maximum is not None and age > activite.age_maximum:
+        return False
+    return True
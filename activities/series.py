@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.pagination import invalidate_counts_on_commit
+from core.utils import fold
+from dashboard.chart_cache import invalidate_on_commit
+from dashboard.search import reindex
+from dashboard.stats import on_commit_refresh
+from infrastructure.conflicts import check_bookings
+from .models import Activite, ActiviteAnimateur, ActiviteMateriel
+
+
+# Activite fields copied from the template to every occurrence
+SERIES_FIELDS = [
+    'nom', 'description', 'duree', 'responsable_id', 'infrastructure_id',
+    'capacite_max', 'niveau_difficulte', 'age_minimum', 'age_maximum',
+    'points_cles', 'image',
+]
+
+# Upper bound on the occurrences of one series
+MAX_OCCURRENCES = 500
+
+
+def occurrences(serie, first_start, duree):
+    """Return the (start, end) of every occurrence of a series.
+
+    Occurrences keep the local time of first_start on each selected weekday,
+    so they do not drift across daylight saving changes.
+    """
+    tz = timezone.get_current_timezone()
+    start_time = timezone.localtime(first_start, tz).time()
+    length = timedelta(minutes=duree)
+    jours = set(serie.get_jours())
+    # Weeks are counted from the monday of the first week of the series
+    first_monday = serie.date_debut - timedelta(days=serie.date_debut.weekday())
+    intervalle = serie.intervalle or 1
+
+    slots = []
+    day = serie.date_debut
+    while day <= serie.date_fin:
+        if day.weekday() in jours and ((day - first_monday).days // 7) % intervalle == 0:
+            start = timezone.make_aware(datetime.combine(day, start_time), tz)
+            slots.append((start, start + length))
+        day += timedelta(days=1)
+
+    return slots
+
+
+def find_series_conflicts(infrastructure_id, slots, exclude_activites=()):
+    """Check every (start, end) slot against the venue calendar in one batch.
+
+    Returns a list of (start, end, bookings) for the slots that conflict.
+    """
+    if not infrastructure_id or not slots:
+        return []
+
+    proposals = [(infrastructure_id, start, end) for start, end in slots]
+    conflicts = check_bookings(proposals, exclude_activites=exclude_activites)
+    return [
+        (start, end, bookings)
+        for (start, end), bookings in zip(slots, conflicts)
+        if bookings
+    ]
+
+
+def create_series(serie, template, skip_conflicts=False):
+    """Save a series and create its occurrences from a template activity.
+
+    The template becomes the first occurrence, the other ones are inserted with
+    bulk_create together with copies of the template animateurs and materials.
+    Returns (created, conflicts): if some slots conflict with the venue
+    calendar and skip_conflicts is not set, nothing is created.
+    """
+    slots = [
+        (start, end)
+        for start, end in occurrences(serie, template.date_debut, template.duree)
+        if start != template.date_debut
+    ]
+
+    conflicts = find_series_conflicts(template.infrastructure_id, slots)
+    if conflicts:
+        if not skip_conflicts:
+            return 0, conflicts
+        conflicting = {start for start, end, bookings in conflicts}
+        slots = [(start, end) for start, end in slots if start not in conflicting]
+
+    values = {field: getattr(template, field) for field in SERIES_FIELDS}
+
+    with transaction.atomic():
+        serie.save()
+        Activite.objects.filter(pk=template.pk).update(serie=serie)
+        template.serie = serie
+
+        new_activities = [Activite(serie=serie, date_debut=start, date_fin=end, **values) for start, end in slots]
+        # bulk_create does not call save(), which fills the search keys
+        for activite in new_activities:
+            activite.refresh_normalized_fields()
+        Activite.objects.bulk_create(new_activities, batch_size=500)
+
+        # bulk_create does not return primary keys on MySQL, read them back
+        activite_ids = list(
+            serie.activites.exclude(pk=template.pk).values_list('pk', flat=True)
+        )
+
+        animateurs = list(template.animateurs_relation.values_list('animateur_id', 'role', 'notes'))
+        ActiviteAnimateur.objects.bulk_create(
+            [
+                ActiviteAnimateur(activite_id=activite_id, animateur_id=animateur_id, role=role, notes=notes)
+                for activite_id in activite_ids
+                for animateur_id, role, notes in animateurs
+            ],
+            batch_size=500,
+        )
+
+        materiels = list(template.materiels_relation.values_list('materiel_id', 'quantite_requise', 'notes'))
+        ActiviteMateriel.objects.bulk_create(
+            [
+                ActiviteMateriel(activite_id=activite_id, materiel_id=materiel_id, quantite_requise=quantite, notes=notes)
+                for activite_id in activite_ids
+                for materiel_id, quantite, notes in materiels
+            ],
+            batch_size=500,
+        )
+
+        # bulk_create skips the signals maintaining the search documents and the dashboard
+        reindex('activite', activite_ids)
+        on_commit_refresh('activities')
+        invalidate_on_commit('activite')
+        invalidate_counts_on_commit(Activite)
+
+    return len(activite_ids), conflicts
+
+
+def update_series(serie, values):
+    """Apply field values to every activity of a series.
+
+    date_fin is recomputed in the database from each date_debut when the
+    duration is part of the values. Returns the number of updated activities.
+    """
+    values = dict(values, updated_at=timezone.now())
+    if 'nom' in values:
+        values['nom_normalise'] = fold(values['nom'])
+    if values.get('duree'):
+        values['date_fin'] = F('date_debut') + timedelta(minutes=values['duree'])
+
+    with transaction.atomic():
+        updated = serie.activites.update(**values)
+        reindex('activite', serie.activites.values_list('pk', flat=True))
+        on_commit_refresh('activities')
+        invalidate_on_commit('activite')
+        invalidate_counts_on_commit(Activite)
+    return updated
+
+
+def series_slots(serie, duree=None):
+    """Return the (start, end) of the active occurrences of a series, for a given duration"""
+    rows = serie.activites.filter(annulee=False).values_list('date_debut', 'duree')
+    return [
+        (start, start + timedelta(minutes=duree or current or 0))
+        for start, current in rows
+    ]
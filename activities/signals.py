@@ -0,0 +1,47 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Inscription
+from .counters import apply_counter_delta
+
+
+@receiver(pre_save, sender=Inscription)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    """Store the persisted activity, status and attendance so post_save can move the counters"""
+    instance._previous_state = None
+    instance._previous_a_participe = None
+    if raw or not instance.pk:
+        return
+
+    row = (
+        Inscription.objects.select_for_update()
+        .filter(pk=instance.pk)
+        .values_list('activite_id', 'statut', 'a_participe')
+        .first()
+    )
+    if row:
+        instance._previous_state = row[:2]
+        instance._previous_a_participe = row[2]
+
+
+@receiver(post_save, sender=Inscription)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    """Keep Activite counters in sync when an inscription is created or modified"""
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_state', None)
+    current = (instance.activite_id, instance.statut)
+
+    if previous == current:
+        return
+
+    if previous:
+        apply_counter_delta(previous[0], previous[1], -1)
+    apply_counter_delta(current[0], current[1], 1)
+
+
+@receiver(post_delete, sender=Inscription)
+def update_counters_on_delete(sender, instance, **kwargs):
+    """Release the counter of a deleted inscription"""
+    apply_counter_delta(instance.activite_id, instance.statut, -1)
@@ -1,3 +1,725 @@
-from django.test import TestCase
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from dashboard.models import SearchDocument
+from infrastructure.models import Infrastructure, InfrastructureReservation, Materiel
+from participants.models import Participant
+from staff.availability import AnimateurAvailability
+from staff.models import Animateur, Responsable, StaffSchedule
+from .ics import feed_token
+from .ledger import MaterielLedger, available_quantity
+from .models import Activite, ActiviteAnimateur, ActiviteMateriel, Inscription, SerieActivite
+from .registration import RegistrationResult, register, register_group, save_inscription
+from .series import MAX_OCCURRENCES, create_series
+from .timetable import Task, TimetableSolver, Venue
+from .views import ActiviteAnimateurCreateView
+
+
+class ConcurrentRegistrationTest(TransactionTestCase):
+    """Parallel registrations must never oversell an activity"""
+    capacity = 5
+    workers = 8
+    attempts = 40
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Les connexions concurrentes nécessitent une base de test sur disque.")
+
+        self.activite = Activite.objects.create(
+            nom='Canoë',
+            duree=60,
+            date_debut=timezone.now() + datetime.timedelta(days=1),
+            capacite_max=self.capacity,
+        )
+        self.participants = Participant.objects.bulk_create([
+            Participant(nom=f'Nom{i}', prenom='Test', date_naissance=datetime.date(2014, 1, 1))
+            for i in range(self.attempts)
+        ])
+        self.participants = list(Participant.objects.order_by('pk'))
+
+    def _register(self, participant):
+        try:
+            return register(participant, self.activite).status
+        finally:
+            connection.close()
+
+    def _run_in_parallel(self, participants):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(self._register, participants))
+
+    def test_capacity_is_never_exceeded(self):
+        statuses = self._run_in_parallel(self.participants)
+
+        self.assertEqual(statuses.count(RegistrationResult.OK), self.capacity)
+        self.assertEqual(statuses.count(RegistrationResult.FULL), self.attempts - self.capacity)
+
+        self.activite.refresh_from_db()
+        self.assertEqual(self.activite.nb_inscrits, self.capacity)
+        self.assertEqual(Inscription.objects.filter(activite=self.activite).count(), self.capacity)
+
+    def test_same_participant_is_registered_once(self):
+        statuses = self._run_in_parallel([self.participants[0]] * self.workers)
+
+        self.assertEqual(statuses.count(RegistrationResult.OK), 1)
+        self.assertEqual(statuses.count(RegistrationResult.DUPLICATE), self.workers - 1)
+
+        self.activite.refresh_from_db()
+        self.assertEqual(self.activite.nb_inscrits, 1)
+
+
+class InscriptionCounterTest(TestCase):
+    """nb_inscrits, nb_en_attente and nb_annules follow every write on the inscriptions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now() + datetime.timedelta(days=1)
+        cls.activite = Activite.objects.create(nom='Judo', duree=60, date_debut=start)
+        cls.other = Activite.objects.create(nom='Karaté', duree=60, date_debut=start + datetime.timedelta(days=1))
+        cls.participants = [
+            Participant.objects.create(nom=f'Nom{number}', prenom='Test', date_naissance=datetime.date(2015, 1, 1))
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        self.inscriptions = [
+            Inscription.objects.create(participant=participant, activite=self.activite, statut=statut)
+            for participant, statut in zip(self.participants, ['inscrit', 'inscrit', 'en_attente', 'annule'])
+        ]
+
+    def assertCounters(self, activite, expected):
+        activite.refresh_from_db()
+        self.assertEqual((activite.nb_inscrits, activite.nb_en_attente, activite.nb_annules), expected)
+        call_command('rebuild_inscription_counters', '--check', stdout=StringIO())
+
+    def test_create(self):
+        self.assertCounters(self.activite, (2, 1, 1))
+
+    def test_status_transitions(self):
+        inscription = self.inscriptions[0]
+        for statut, expected in (('en_attente', (1, 2, 1)), ('annule', (1, 1, 2)), ('inscrit', (2, 1, 1))):
+            with self.subTest(statut=statut):
+                inscription.statut = statut
+                inscription.save()
+                self.assertCounters(self.activite, expected)
+
+        # Saving without a change keeps the counters
+        inscription.save()
+        self.assertCounters(self.activite, (2, 1, 1))
+
+    def test_move_to_another_activity(self):
+        inscription = self.inscriptions[2]
+        inscription.activite = self.other
+        inscription.statut = 'inscrit'
+        inscription.save()
+
+        self.assertCounters(self.activite, (2, 0, 1))
+        self.assertCounters(self.other, (1, 0, 0))
+
+    def test_delete(self):
+        self.inscriptions[0].delete()
+        self.assertCounters(self.activite, (1, 1, 1))
+
+        Inscription.objects.filter(statut__in=['en_attente', 'annule']).delete()
+        self.assertCounters(self.activite, (1, 0, 0))
+
+    def test_queryset_update(self):
+        Inscription.objects.filter(statut='inscrit').update(statut='annule')
+        self.assertCounters(self.activite, (0, 1, 3))
+
+        Inscription.objects.filter(statut='en_attente').update(activite=self.other, statut='inscrit')
+        self.assertCounters(self.activite, (0, 0, 3))
+        self.assertCounters(self.other, (1, 0, 0))
+
+        # Other fields leave the counters alone
+        Inscription.objects.update(notes='Groupe B')
+        self.assertCounters(self.activite, (0, 0, 3))
+
+    def test_bulk_update(self):
+        for inscription in self.inscriptions[:3]:
+            inscription.statut = 'annule'
+        self.inscriptions[3].activite = self.other
+
+        Inscription.objects.bulk_update(self.inscriptions, ['statut', 'activite'])
+
+        self.assertCounters(self.activite, (0, 0, 3))
+        self.assertCounters(self.other, (0, 0, 1))
+
+
+class RegisterGroupTest(TestCase):
+    """register_group checks the whole group then writes the accepted inscriptions at once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + datetime.timedelta(days=2)
+        cls.day = start.date()
+        cls.activite = Activite.objects.create(
+            nom='Escalade', duree=60, date_debut=start, capacite_max=3, age_minimum=8, age_maximum=12,
+        )
+        cls.other = Activite.objects.create(nom='Piscine', duree=60, date_debut=start + datetime.timedelta(minutes=30))
+        cls.registered, cls.busy, cls.young, cls.old, *cls.eligible = [
+            Participant.objects.create(nom=f'Nom{age}-{i}', prenom='Test', date_naissance=cls.born(age))
+            for i, age in enumerate([10, 10, 7, 13, 8, 12, 10, 10])
+        ]
+        register(cls.registered, cls.activite)
+        register(cls.busy, cls.other)
+
+    @classmethod
+    def born(cls, age):
+        # Turns age on the day of the activity
+        return datetime.date(cls.day.year - age, cls.day.month, 1)
+
+    def assertCountersMatch(self):
+        # Raises CommandError when a stored counter differs from the inscription table
+        call_command('rebuild_inscription_counters', '--check', stdout=StringIO())
+
+    def test_group_is_checked_per_participant(self):
+        group = [self.registered, self.busy, self.young, self.old, *self.eligible]
+
+        results = register_group(self.activite, [participant.pk for participant in group] + [0])
+
+        self.assertEqual([result.participant_id for result in results], [participant.pk for participant in group] + [0])
+        self.assertEqual([result.status for result in results], [
+            RegistrationResult.DUPLICATE,
+            RegistrationResult.CONFLICT,
+            RegistrationResult.AGE,
+            RegistrationResult.AGE,
+            # Two seats were left, granted in the order of the group
+            RegistrationResult.OK,
+            RegistrationResult.OK,
+            RegistrationResult.FULL,
+            RegistrationResult.FULL,
+            RegistrationResult.NOT_FOUND,
+        ])
+        self.assertEqual(
+            set(Inscription.objects.filter(activite=self.activite).values_list('participant_id', flat=True)),
+            {self.registered.pk, *(participant.pk for participant in self.eligible[:2])},
+        )
+        self.activite.refresh_from_db()
+        self.assertEqual((self.activite.nb_inscrits, self.activite.nb_en_attente), (3, 0))
+        self.assertCountersMatch()
+
+    def test_repeated_ids_are_registered_once(self):
+        participant = self.eligible[0]
+
+        results = register_group(self.activite, [participant.pk, str(participant.pk), participant.pk])
+
+        self.assertEqual([result.status for result in results], [RegistrationResult.OK])
+        self.assertEqual(Inscription.objects.filter(activite=self.activite, participant=participant).count(), 1)
+        self.assertCountersMatch()
+
+    def test_waiting_list_ignores_capacity(self):
+        register_group(self.activite, [participant.pk for participant in self.eligible[:2]])
+
+        results = register_group(self.activite, [participant.pk for participant in self.eligible[2:]], statut='en_attente')
+
+        self.assertEqual([result.status for result in results], [RegistrationResult.OK] * 2)
+        self.activite.refresh_from_db()
+        self.assertEqual((self.activite.nb_inscrits, self.activite.nb_en_attente), (3, 2))
+        self.assertCountersMatch()
+
+    def test_registrations_keep_the_activity_modification_time(self):
+        # The ICS feeds and "modifié le" rely on updated_at
+        updated_at = Activite.objects.values_list('updated_at', flat=True).get(pk=self.activite.pk)
+
+        register(self.eligible[0], self.activite)
+        register_group(self.activite, [participant.pk for participant in self.eligible[1:]])
+
+        self.assertEqual(Activite.objects.values_list('updated_at', flat=True).get(pk=self.activite.pk), updated_at)
+
+    def test_cancelled_inscriptions_do_not_block_the_slot(self):
+        Inscription.objects.filter(participant=self.busy).update(statut='annule')
+
+        results = register_group(self.activite, [self.busy.pk])
+
+        self.assertEqual([result.status for result in results], [RegistrationResult.OK])
+
+
+class ParticipantOverlapTest(TestCase):
+    """A participant cannot attend two overlapping activities"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # 10:00-11:00 and 10:30-11:30 in Paris, summer time
+        start = datetime.datetime(2030, 7, 1, 8, tzinfo=datetime.timezone.utc)
+        cls.morning = Activite.objects.create(nom='Canoë', duree=60, date_debut=start)
+        cls.overlapping = Activite.objects.create(nom='Tir à l\'arc', duree=60, date_debut=start + datetime.timedelta(minutes=30))
+        cls.next = Activite.objects.create(nom='Poney', duree=60, date_debut=start + datetime.timedelta(hours=1))
+        cls.participant = Participant.objects.create(nom='Martin', prenom='Léa', date_naissance=datetime.date(2018, 5, 1))
+
+    def _overlaps(self, *args):
+        stdout = StringIO()
+        with self.settings(TIME_ZONE='Europe/Paris'):
+            call_command('audit_participant_overlaps', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_overlapping_registration_is_refused(self):
+        self.assertTrue(register(self.participant, self.morning))
+
+        result = register(self.participant, self.overlapping)
+
+        self.assertEqual(result.status, RegistrationResult.CONFLICT)
+        self.assertFalse(Inscription.objects.filter(activite=self.overlapping).exists())
+        self.overlapping.refresh_from_db()
+        self.assertEqual(self.overlapping.nb_inscrits, 0)
+
+    def test_back_to_back_registration_is_accepted(self):
+        register(self.participant, self.morning)
+
+        self.assertEqual(register(self.participant, self.next).status, RegistrationResult.OK)
+
+    def test_cancellations_free_the_slot(self):
+        inscription = register(self.participant, self.morning).inscription
+        inscription.statut = 'annule'
+        inscription.save()
+        self.assertEqual(register(self.participant, self.overlapping).status, RegistrationResult.OK)
+
+        # Enrolling again the cancelled inscription now collides
+        inscription.statut = 'inscrit'
+        self.assertEqual(save_inscription(inscription).status, RegistrationResult.CONFLICT)
+
+        Activite.objects.filter(pk=self.overlapping.pk).update(annulee=True)
+        self.assertEqual(save_inscription(inscription).status, RegistrationResult.OK)
+
+    def test_updating_an_inscription_does_not_conflict_with_itself(self):
+        inscription = register(self.participant, self.morning).inscription
+        inscription.notes = 'Allergie au pollen'
+
+        self.assertEqual(save_inscription(inscription).status, RegistrationResult.OK)
+
+    def test_audit_reports_overlaps_in_local_time(self):
+        # Created directly, as rows imported before the check existed
+        Inscription.objects.create(participant=self.participant, activite=self.morning)
+        Inscription.objects.create(participant=self.participant, activite=self.overlapping)
+
+        output = self._overlaps()
+
+        self.assertIn(
+            f"Léa Martin (#{self.participant.pk}): Canoë (#{self.morning.pk}, 01/07/2030 10:00-11:00) / "
+            f"Tir à l'arc (#{self.overlapping.pk}, 01/07/2030 10:30-11:30)",
+            output,
+        )
+        self.assertIn("1 chevauchement(s) trouvé(s).", output)
+        with self.assertRaisesMessage(CommandError, "1 chevauchement(s) trouvé(s)."):
+            self._overlaps('--fail')
+
+    def test_audit_ignores_back_to_back_and_cancelled(self):
+        Inscription.objects.create(participant=self.participant, activite=self.morning)
+        Inscription.objects.create(participant=self.participant, activite=self.next)
+        Inscription.objects.create(participant=self.participant, activite=self.overlapping, statut='annule')
+
+        self.assertIn("Aucun chevauchement trouvé.", self._overlaps('--fail'))
+
+
+class CreateSeriesTest(TestCase):
+    """create_series inserts the occurrences of a template activity"""
+
+    def setUp(self):
+        today = timezone.localdate()
+        self.monday = today + datetime.timedelta(days=7 - today.weekday())
+        start = timezone.make_aware(datetime.datetime.combine(self.monday, datetime.time(10)))
+        self.template = Activite.objects.create(nom='Équitation', duree=60, date_debut=start, capacite_max=12)
+
+    def test_occurrences_are_created_and_indexed(self):
+        # Mondays and Wednesdays of two weeks, the template being the first monday
+        serie = SerieActivite(
+            nom='Équitation', date_debut=self.monday, date_fin=self.monday + datetime.timedelta(days=13), jours='0,2',
+        )
+        created, conflicts = create_series(serie, self.template)
+
+        self.assertEqual((created, conflicts), (3, []))
+        activites = Activite.objects.filter(serie=serie)
+        self.assertEqual(activites.count(), 4)
+        self.assertEqual(set(activites.values_list('nom_normalise', flat=True)), {'equitation'})
+        self.assertEqual(
+            set(SearchDocument.objects.filter(kind='activite').values_list('object_id', flat=True)),
+            set(activites.values_list('pk', flat=True)),
+        )
+
+
+class SerieViewsTest(TestCase):
+    """Creating and editing a series through its views"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('animateur', 'animateur@example.org', 'motdepasse'))
+        today = timezone.localdate()
+        self.monday = today + datetime.timedelta(days=7 - today.weekday())
+        self.gymnase = Infrastructure.objects.create(nom='Gymnase', type='salle', capacite=30)
+        self.template = Activite.objects.create(
+            nom='Judo', duree=60, capacite_max=15, infrastructure=self.gymnase,
+            date_debut=timezone.make_aware(datetime.datetime.combine(self.monday, datetime.time(10))),
+        )
+
+    def _create(self, weeks=3, **data):
+        data = {'date_fin': self.monday + datetime.timedelta(weeks=weeks, days=-1), 'jours': [0], 'intervalle': 1, **data}
+        return self.client.post(reverse('activities:serie_add', kwargs={'pk': self.template.pk}), data)
+
+    def _book_second_monday(self):
+        start = self.template.date_debut + datetime.timedelta(weeks=1)
+        InfrastructureReservation.objects.create(
+            infrastructure=self.gymnase, date_debut=start, date_fin=start + datetime.timedelta(hours=1),
+            motif='Réunion', responsable='Claire Durand',
+        )
+
+    def test_occurrences_are_created(self):
+        response = self._create()
+
+        self.assertRedirects(response, reverse('activities:detail', kwargs={'pk': self.template.pk}), fetch_redirect_response=False)
+        self.template.refresh_from_db()
+        self.assertEqual(
+            sorted(self.template.serie.activites.values_list('date_debut', flat=True)),
+            [self.template.date_debut + datetime.timedelta(weeks=week) for week in range(3)],
+        )
+
+    def test_conflicting_series_is_rejected(self):
+        self._book_second_monday()
+
+        response = self._create()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.assertFalse(SerieActivite.objects.exists())
+        self.assertEqual(Activite.objects.count(), 1)
+
+    def test_conflicting_occurrences_can_be_skipped(self):
+        self._book_second_monday()
+
+        self._create(ignorer_conflits='on')
+
+        self.template.refresh_from_db()
+        self.assertEqual(
+            sorted(self.template.serie.activites.values_list('date_debut', flat=True)),
+            [self.template.date_debut, self.template.date_debut + datetime.timedelta(weeks=2)],
+        )
+
+    def test_too_many_occurrences_are_rejected(self):
+        response = self._create(weeks=MAX_OCCURRENCES // 7 + 2, jours=list(range(7)))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('date_fin', response.context['form'].errors)
+        self.assertFalse(SerieActivite.objects.exists())
+
+    def test_update_applies_to_every_occurrence(self):
+        self._create()
+        self.template.refresh_from_db()
+        serie = self.template.serie
+        responsable = Responsable.objects.create(nom='Durand', prenom='Claire', email='claire.durand@example.org')
+
+        response = self.client.post(
+            reverse('activities:serie_update', kwargs={'pk': serie.pk}),
+            {'nom': 'Judo avancé', 'duree': 90, 'capacite_max': 10, 'infrastructure': self.gymnase.pk, 'responsable': responsable.pk},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        serie.refresh_from_db()
+        self.assertEqual(serie.nom, 'Judo avancé')
+        for activite in serie.activites.all():
+            self.assertEqual((activite.nom, activite.nom_normalise, activite.duree, activite.capacite_max), ('Judo avancé', 'judo avance', 90, 10))
+            self.assertEqual(activite.date_fin, activite.date_debut + datetime.timedelta(minutes=90))
+
+
+class TimetableSolverTest(SimpleTestCase):
+    """Venues and time slots chosen by the timetable solver"""
+
+    def setUp(self):
+        self.day = datetime.date(2030, 7, 1)
+
+    def _at(self, hour, minute=0):
+        return timezone.make_aware(datetime.datetime.combine(self.day, datetime.time(hour, minute)))
+
+    def _solve(self, tasks, venues, shifts=None, **options):
+        availability = AnimateurAvailability({}, shifts) if shifts is not None else None
+        solver = TimetableSolver(tasks, venues, availability=availability, time_budget=2.0, **options)
+        return solver, solver.solve()
+
+    def _assert_no_collision(self, tasks, solution):
+        animateurs = {task.pk: task.animateur_ids for task in tasks}
+        placed = list(solution.assignments.items())
+        for index, (pk, (venue, start, end)) in enumerate(placed):
+            for other, (other_venue, other_start, other_end) in placed[index + 1:]:
+                if start < other_end and other_start < end:
+                    self.assertNotEqual(venue, other_venue)
+                    self.assertFalse(set(animateurs[pk]) & set(animateurs[other]))
+
+    def test_feasible_week_is_fully_placed(self):
+        tasks = [
+            Task(pk, self._at(10) + datetime.timedelta(days=pk % 3), 90, 10, [pk % 2], f'Activité {pk}')
+            for pk in range(1, 13)
+        ]
+        _, solution = self._solve(tasks, [Venue(1, 20, 'Salle'), Venue(2, 20, 'Gymnase')])
+
+        self.assertTrue(solution.complete)
+        self._assert_no_collision(tasks, solution)
+        for task in tasks:
+            _, start, end = solution.assignments[task.pk]
+            # Same day, on the grid between 8:00 and 20:00
+            self.assertEqual(start.date(), task.preferred_start.date())
+            self.assertEqual(end - start, datetime.timedelta(minutes=90))
+            self.assertGreaterEqual(start, self._at(8) + (start.date() - self.day))
+            self.assertLessEqual(end, self._at(20) + (start.date() - self.day))
+            self.assertIn(start.minute, (0, 30))
+
+    def test_preferred_time_is_kept_when_free(self):
+        _, solution = self._solve([Task(1, self._at(14, 30), 60, None, [], 'Poterie')], [Venue(1, 20, 'Atelier')])
+
+        self.assertEqual(solution.assignments[1], (1, self._at(14, 30), self._at(15, 30)))
+
+    def test_venue_capacity(self):
+        tasks = [Task(pk, self._at(10), 60, 25, [], f'Grand groupe {pk}') for pk in (1, 2)]
+        _, solution = self._solve(tasks, [Venue(1, 20, 'Salle'), Venue(2, 30, 'Gymnase')])
+
+        self.assertTrue(solution.complete)
+        self.assertEqual({venue for venue, _, _ in solution.assignments.values()}, {2})
+        self._assert_no_collision(tasks, solution)
+
+    def test_animateurs_stay_within_their_shift(self):
+        task = Task(1, self._at(9), 60, None, [7], 'Escalade')
+        shifts = {7: [(self._at(14), self._at(18))]}
+
+        _, solution = self._solve([task], [Venue(1, 20, 'Mur')], shifts=shifts)
+        _, start, end = solution.assignments[1]
+        self.assertEqual((start, end), (self._at(14), self._at(15)))
+
+        _, solution = self._solve([task], [Venue(1, 20, 'Mur')], shifts=shifts, require_shift=False)
+        self.assertEqual(solution.assignments[1][1], self._at(9))
+
+    def test_unassignable_tasks_are_left_unplaced(self):
+        tasks = [
+            Task(1, self._at(10), 60, 100, [], 'Trop grand'),
+            Task(2, self._at(10), 60, None, [8], 'Sans animateur de service'),
+            Task(3, self._at(10), 60, None, [], 'Possible'),
+        ]
+        _, solution = self._solve(tasks, [Venue(1, 20, 'Salle')], shifts={})
+
+        self.assertEqual(sorted(solution.unplaced), [1, 2])
+        self.assertEqual(list(solution.assignments), [3])
+
+    def test_invalid_assignments(self):
+        tasks = [Task(pk, self._at(10), 60, None, [], f'Activité {pk}') for pk in (1, 2)]
+        solver, solution = self._solve(tasks, [Venue(1, 20, 'Salle')])
+
+        self.assertEqual(solver.invalid_assignments(solution.assignments), [])
+        colliding = {pk: (1, self._at(10), self._at(11)) for pk in (1, 2)}
+        self.assertEqual(len(solver.invalid_assignments(colliding)), 1)
+        self.assertEqual(solver.invalid_assignments({3: (1, self._at(10), self._at(11))}), [3])
+
+
+class MaterielLedgerTest(SimpleTestCase):
+    """Demand of a material over time from overlapping bookings"""
+    start = datetime.datetime(2026, 7, 6, tzinfo=datetime.timezone.utc)
+
+    def at(self, hour):
+        return self.start + datetime.timedelta(hours=hour)
+
+    def setUp(self):
+        # Material 1 is used 2 from 9h, 5 from 10h, 6 from 11h, 4 from 12h and 5 from 13h to 14h
+        self.rows = [
+            (1, self.at(9), self.at(12), 2),
+            (1, self.at(10), self.at(11), 3),
+            (1, self.at(11), self.at(13), 4),
+            (1, self.at(13), self.at(14), 5),
+            (2, self.at(9), self.at(14), 7),
+            # Empty bookings are ignored
+            (1, self.at(9), self.at(14), 0),
+            (1, self.at(12), self.at(12), 9),
+        ]
+        self.ledger = MaterielLedger(self.rows)
+
+    def _brute_force_peak(self, materiel_id, start, end):
+        instants = [start] + [row[1] for row in self.rows if start < row[1] < end]
+        return max(
+            sum(quantite for pk, row_start, row_end, quantite in self.rows if pk == materiel_id and row_start <= instant < row_end)
+            for instant in instants
+        )
+
+    def test_demand_at(self):
+        self.assertEqual([self.ledger.demand_at(1, self.at(hour)) for hour in range(8, 16)], [0, 2, 5, 6, 4, 5, 0, 0])
+        self.assertEqual(self.ledger.demand_at(1, self.at(10.5)), 5)
+        self.assertEqual(self.ledger.demand_at(3, self.at(10)), 0)
+
+    def test_peak(self):
+        self.assertEqual(self.ledger.peak(1, self.at(9), self.at(14)), 6)
+        self.assertEqual(self.ledger.peak(1, self.at(10), self.at(11)), 5)
+        # Bookings ending when the window starts or starting when it ends are not counted
+        self.assertEqual(self.ledger.peak(1, self.at(12), self.at(13)), 4)
+        self.assertEqual(self.ledger.peak(1, self.at(14), self.at(15)), 0)
+        self.assertEqual(self.ledger.peak(2, self.at(8), self.at(10)), 7)
+        for start in range(8, 15):
+            for end in range(start + 1, 16):
+                with self.subTest(start=start, end=end):
+                    self.assertEqual(
+                        self.ledger.peak(1, self.at(start), self.at(end)),
+                        self._brute_force_peak(1, self.at(start), self.at(end)),
+                    )
+
+    def test_bucketed_peaks(self):
+        buckets = self.ledger.bucketed_peaks(1, self.at(8), self.at(15))
+
+        self.assertEqual(buckets, [(self.at(hour), peak) for hour, peak in zip(range(8, 15), [0, 2, 5, 6, 4, 5, 0])])
+        self.assertEqual(self.ledger.bucketed_peaks(1, self.at(9), self.at(14), bucket=datetime.timedelta(hours=2)), [
+            (self.at(9), 5), (self.at(11), 6), (self.at(13), 5),
+        ])
+
+
+class MaterielAvailabilityTest(TestCase):
+    """Units of a material left for an activity, given the overlapping bookings"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.org', 'motdepasse')
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=3)
+        cls.materiel = Materiel.objects.create(nom='Kayak', quantite_disponible=10)
+
+        def book(hour, duree, quantite, **fields):
+            activite = Activite.objects.create(
+                nom=f'Sortie {hour}h', duree=duree, date_debut=start + datetime.timedelta(hours=hour), **fields
+            )
+            ActiviteMateriel.objects.create(activite=activite, materiel=cls.materiel, quantite_requise=quantite)
+            return activite
+
+        book(10, 120, 4)
+        book(11, 120, 3)
+        book(11, 60, 5, annulee=True)
+        # Ends when the activity below starts
+        book(9, 150, 2)
+        cls.activite = Activite.objects.create(nom='Rivière', duree=60, date_debut=start + datetime.timedelta(hours=11, minutes=30))
+
+    def test_overlapping_bookings_reduce_the_stock(self):
+        self.assertEqual(available_quantity(self.materiel, self.activite), 3)
+
+    def test_stock_exactly_at_the_limit_is_accepted(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse('activities:add_materiel', kwargs={'pk': self.activite.pk}),
+            {'materiel': self.materiel.pk, 'quantite_requise': 3},
+        )
+
+        self.assertRedirects(response, reverse('activities:detail', kwargs={'pk': self.activite.pk}), fetch_redirect_response=False)
+        self.assertTrue(ActiviteMateriel.objects.filter(activite=self.activite, quantite_requise=3).exists())
+        # Its own booking does not count against the activity, the other ones now have nothing left
+        self.assertEqual(available_quantity(self.materiel, self.activite), 3)
+        other = Activite.objects.create(nom='Lac', duree=30, date_debut=self.activite.date_debut)
+        self.assertEqual(available_quantity(self.materiel, other), 0)
+
+
+class ActiviteAnimateurCreateViewTest(TestCase):
+    """Only animateurs on shift and free during the activity can be added to it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('admin', 'admin@example.org', 'motdepasse')
+        day = timezone.localdate() + datetime.timedelta(days=3)
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time(10)))
+        cls.activite = Activite.objects.create(nom='Voile', duree=60, date_debut=start)
+        tennis = Activite.objects.create(nom='Tennis', duree=60, date_debut=start + datetime.timedelta(minutes=30))
+        cancelled = Activite.objects.create(nom='Golf', duree=60, date_debut=start, annulee=True)
+
+        cls.free, cls.busy, cls.off_shift, cls.assigned, cls.cancelled_only = [
+            Animateur.objects.create(nom=nom, prenom='Test', telephone='0600000000', email=f'{nom}@example.org')
+            for nom in ('Libre', 'Occupe', 'Repos', 'Affecte', 'Golf')
+        ]
+        for animateur in (cls.free, cls.busy, cls.assigned, cls.cancelled_only):
+            StaffSchedule.objects.create(animateur=animateur, date=day, start_time=datetime.time(9), end_time=datetime.time(17))
+        ActiviteAnimateur.objects.create(activite=tennis, animateur=cls.busy)
+        ActiviteAnimateur.objects.create(activite=cls.activite, animateur=cls.assigned)
+        ActiviteAnimateur.objects.create(activite=cancelled, animateur=cls.cancelled_only)
+
+    def _form(self, data=None):
+        factory = RequestFactory()
+        request = factory.post('/', data) if data is not None else factory.get('/')
+        request.user = self.user
+        view = ActiviteAnimateurCreateView()
+        view.setup(request, pk=self.activite.pk)
+        return view.get_form()
+
+    def test_choices_are_the_available_animateurs(self):
+        choices = set(self._form().fields['animateur'].queryset)
+
+        self.assertEqual(choices, {self.free, self.cancelled_only})
+
+    def test_unavailable_animateur_is_rejected(self):
+        for animateur in (self.busy, self.off_shift, self.assigned):
+            with self.subTest(animateur=animateur.nom):
+                form = self._form({'animateur': animateur.pk})
+                self.assertFalse(form.is_valid())
+                self.assertIn('animateur', form.errors)
+
+    def test_available_animateur_is_added(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse('activities:add_animateur', kwargs={'pk': self.activite.pk}), {'animateur': self.free.pk},
+        )
+
+        self.assertRedirects(response, reverse('activities:detail', kwargs={'pk': self.activite.pk}), fetch_redirect_response=False)
+        self.assertTrue(ActiviteAnimateur.objects.filter(activite=self.activite, animateur=self.free).exists())
+
+
+class CalendarFeedTest(TestCase):
+    """Token check and conditional requests of the iCalendar feeds"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.participant = Participant.objects.create(nom='Martin', prenom='Léa', date_naissance=datetime.date(2015, 5, 1))
+        cls.other = Participant.objects.create(nom='Petit', prenom='Hugo', date_naissance=datetime.date(2014, 2, 1))
+        start = timezone.now() + datetime.timedelta(days=2)
+        cls.canoe = Activite.objects.create(nom='Canoë', duree=60, date_debut=start)
+        cls.poterie = Activite.objects.create(nom='Poterie', duree=60, date_debut=start + datetime.timedelta(days=1))
+        cls.inscription = Inscription.objects.create(participant=cls.participant, activite=cls.canoe, statut='inscrit')
+
+    def _url(self, kind='participant', pk=None, token=None):
+        pk = pk or self.participant.pk
+        return reverse('activities:calendar_feed', kwargs={'kind': kind, 'pk': pk, 'token': token or feed_token(kind, pk)})
+
+    def test_feed(self):
+        response = self.client.get(self._url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('SUMMARY:Canoë', body)
+        self.assertNotIn('Poterie', body)
+
+    def test_bad_token_is_not_found(self):
+        urls = {
+            'autre participant': self._url(token=feed_token('participant', self.other.pk)),
+            'autre type': self._url(token=feed_token('animateur', self.participant.pk)),
+            'jeton inventé': self._url(token='0' * len(feed_token('participant', self.participant.pk))),
+            'type inconnu': self._url(kind='user'),
+            'participant inexistant': self._url(pk=self.other.pk + 1000),
+        }
+        for label, url in urls.items():
+            with self.subTest(label):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unchanged_feed_is_not_sent_again(self):
+        etag = self.client.get(self._url())['ETag']
+
+        response = self.client.get(self._url(), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        # The token is checked before the ETag is compared
+        self.assertEqual(self.client.get(self._url(token='x'), HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_etag_follows_the_inscriptions(self):
+        etags = [self.client.get(self._url())['ETag']]
+
+        Inscription.objects.create(participant=self.participant, activite=self.poterie, statut='inscrit')
+        etags.append(self.client.get(self._url())['ETag'])
+        self.inscription.statut = 'annule'
+        self.inscription.save()
+        etags.append(self.client.get(self._url())['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(self.client.get(self._url(), HTTP_IF_NONE_MATCH=etags[0]).status_code, 200)
+        # Inscriptions of other participants leave the feed alone
+        Inscription.objects.create(participant=self.other, activite=self.canoe, statut='inscrit')
+        self.assertEqual(self.client.get(self._url())['ETag'], etags[-1])
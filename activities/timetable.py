@@ -0,0 +1,361 @@
+import random
+import time as clock
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.pagination import invalidate_counts_on_commit
+from dashboard.chart_cache import invalidate_on_commit
+from dashboard.search import reindex
+from dashboard.stats import on_commit_refresh
+from infrastructure.conflicts import BookingCalendar
+from infrastructure.models import Infrastructure
+from staff.availability import AnimateurAvailability
+from .models import Activite, ActiviteAnimateur
+
+
+# Signed previews of a week plan, applied as shown as long as they still fit
+PLAN_SALT = 'activities.timetable-plan'
+PLAN_MAX_AGE = 60 * 60
+
+# An activity to place: its current date_debut gives the day and preferred time
+Task = namedtuple('Task', ['pk', 'preferred_start', 'duree', 'capacite', 'animateur_ids', 'label'])
+Venue = namedtuple('Venue', ['pk', 'capacite', 'label'])
+
+
+class _Timeline:
+    """Non-overlapping [start, end) intervals kept sorted by start"""
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def overlaps(self, start, end):
+        # Intervals never overlap, so the last one starting before end has the latest end
+        position = bisect_left(self._starts, end)
+        return position > 0 and self._ends[position - 1] > start
+
+    def add(self, start, end):
+        position = bisect_left(self._starts, start)
+        self._starts.insert(position, start)
+        self._ends.insert(position, end)
+
+    def remove(self, start, end):
+        position = bisect_left(self._starts, start)
+        del self._starts[position]
+        del self._ends[position]
+
+
+class Solution:
+    """Result of a solver run"""
+
+    def __init__(self, assignments, unplaced, elapsed, backtracks, timed_out):
+        # activite_id -> (infrastructure_id, start, end)
+        self.assignments = assignments
+        self.unplaced = unplaced
+        self.elapsed = elapsed
+        self.backtracks = backtracks
+        self.timed_out = timed_out
+
+    @property
+    def complete(self):
+        return not self.unplaced
+
+
+class TimetableSolver:
+    """Place activities on venues and time slots without conflicts.
+
+    Each task stays on the day of its preferred start and gets a venue and a
+    start time on a grid of step minutes between day_start and day_end. A
+    candidate is valid when the venue is large enough, free in the booking
+    calendar, and every animateur of the activity is on shift and not leading
+    another activity. Candidates are checked against fixed bookings once, then
+    tasks are placed most constrained first with backtracking on dead ends.
+    A task that still has no room after max_retries backtracks, or once the
+    time budget is spent, is left unplaced and the search moves on.
+    """
+
+    def __init__(self, tasks, venues, calendar=None, availability=None,
+                 day_start=time(8), day_end=time(20), step=30, require_shift=True,
+                 time_budget=10.0, max_retries=25):
+        self.tasks = list(tasks)
+        self.venues = sorted(venues, key=lambda venue: (venue.capacite or 0, venue.pk))
+        self.calendar = calendar or BookingCalendar()
+        self.availability = availability
+        self.day_start = day_start
+        self.day_end = day_end
+        self.step = timedelta(minutes=step)
+        self.require_shift = require_shift
+        self.time_budget = time_budget
+        self.max_retries = max_retries
+        self._task_ids = {task.pk for task in self.tasks}
+
+    def _slots(self, task):
+        """Start times available for a task on its day, closest to the preferred time first"""
+        tz = timezone.get_current_timezone()
+        preferred = timezone.localtime(task.preferred_start, tz)
+        length = timedelta(minutes=task.duree)
+
+        slot = timezone.make_aware(datetime.combine(preferred.date(), self.day_start), tz)
+        last = timezone.make_aware(datetime.combine(preferred.date(), self.day_end), tz) - length
+
+        slots = []
+        while slot <= last:
+            slots.append(slot)
+            slot += self.step
+        slots.sort(key=lambda start: abs(start - task.preferred_start))
+        return [(start, start + length) for start in slots]
+
+    def _staff_free(self, task, start, end):
+        if self.availability is None:
+            return True
+        for animateur_id in task.animateur_ids:
+            if self.availability.is_busy(animateur_id, start, end, exclude=self._task_ids):
+                return False
+            if self.require_shift and not self.availability.is_on_shift(animateur_id, start, end):
+                return False
+        return True
+
+    def candidates(self, task):
+        """Return the (infrastructure_id, start, end) a task could take, ignoring the other tasks"""
+        venues = [
+            venue for venue in self.venues
+            if not task.capacite or not venue.capacite or venue.capacite >= task.capacite
+        ]
+
+        candidates = []
+        for start, end in self._slots(task):
+            if not self._staff_free(task, start, end):
+                continue
+            # Smallest suitable venue first keeps the large ones for large groups
+            for venue in venues:
+                if not self.calendar.overlapping(venue.pk, start, end):
+                    candidates.append((venue.pk, start, end))
+        return candidates
+
+    def solve(self):
+        started = clock.monotonic()
+        deadline = started + self.time_budget
+
+        domains = {task.pk: self.candidates(task) for task in self.tasks}
+        order = sorted(self.tasks, key=lambda task: (len(domains[task.pk]), -task.duree, task.pk))
+
+        venue_lines = defaultdict(_Timeline)
+        staff_lines = defaultdict(_Timeline)
+
+        def fits(task, candidate):
+            venue_id, start, end = candidate
+            if venue_lines[venue_id].overlaps(start, end):
+                return False
+            return not any(staff_lines[animateur_id].overlaps(start, end) for animateur_id in task.animateur_ids)
+
+        def place(task, candidate, sign):
+            venue_id, start, end = candidate
+            lines = [venue_lines[venue_id]] + [staff_lines[animateur_id] for animateur_id in task.animateur_ids]
+            for line in lines:
+                if sign > 0:
+                    line.add(start, end)
+                else:
+                    line.remove(start, end)
+
+        chosen = [None] * len(order)
+        cursors = [0] * len(order)
+        retries = [0] * len(order)
+        backtracks = 0
+        timed_out = False
+        position = 0
+
+        while position < len(order):
+            if not timed_out and clock.monotonic() > deadline:
+                timed_out = True
+
+            task = order[position]
+            domain = domains[task.pk]
+            cursor = cursors[position]
+            while cursor < len(domain) and not fits(task, domain[cursor]):
+                cursor += 1
+
+            if cursor < len(domain):
+                chosen[position] = domain[cursor]
+                place(task, domain[cursor], 1)
+                cursors[position] = cursor + 1
+                position += 1
+                continue
+
+            # Dead end: revisit the previous choice, unless out of budget or the
+            # previous task is itself unplaced, then leave this one unplaced
+            give_up = timed_out or retries[position] >= self.max_retries
+            if give_up or position == 0 or chosen[position - 1] is None:
+                chosen[position] = None
+                cursors[position] = len(domain)
+                position += 1
+                continue
+
+            cursors[position] = 0
+            retries[position] += 1
+            position -= 1
+            backtracks += 1
+            place(order[position], chosen[position], -1)
+            chosen[position] = None
+
+        assignments = {}
+        unplaced = []
+        for task, candidate in zip(order, chosen):
+            if candidate is None:
+                unplaced.append(task.pk)
+            else:
+                assignments[task.pk] = candidate
+
+        return Solution(assignments, unplaced, clock.monotonic() - started, backtracks, timed_out)
+
+    def invalid_assignments(self, assignments):
+        """Activity ids of assignments that are no longer valid candidates or that collide"""
+        tasks = {task.pk: task for task in self.tasks}
+        venue_lines = defaultdict(_Timeline)
+        staff_lines = defaultdict(_Timeline)
+        invalid = []
+        for pk, candidate in sorted(assignments.items(), key=lambda item: item[1][1]):
+            task = tasks.get(pk)
+            if task is None or candidate not in self.candidates(task):
+                invalid.append(pk)
+                continue
+            venue_id, start, end = candidate
+            lines = [venue_lines[venue_id]] + [staff_lines[animateur_id] for animateur_id in task.animateur_ids]
+            if any(line.overlaps(start, end) for line in lines):
+                invalid.append(pk)
+                continue
+            for line in lines:
+                line.add(start, end)
+        return invalid
+
+
+def week_bounds(day):
+    """Return the aware [monday 00:00, next monday 00:00) window of the week containing day"""
+    monday = day - timedelta(days=day.weekday())
+    start = timezone.make_aware(datetime.combine(monday, time.min))
+    return start, start + timedelta(days=7)
+
+
+def sign_plan(day, solution, require_shift=True):
+    """Signed value of a previewed solution for a week, see load_plan"""
+    return signing.dumps(
+        {
+            'w': week_bounds(day)[0].date().isoformat(),
+            's': require_shift,
+            'a': [[pk, venue_id, start.isoformat(), end.isoformat()] for pk, (venue_id, start, end) in solution.assignments.items()],
+            'u': list(solution.unplaced),
+        },
+        salt=PLAN_SALT,
+        compress=True,
+    )
+
+
+def load_plan(value, day):
+    """(solution, require_shift) of a signed plan of the week of day, None when invalid or expired"""
+    try:
+        plan = signing.loads(value or '', salt=PLAN_SALT, max_age=PLAN_MAX_AGE)
+        if plan['w'] != week_bounds(day)[0].date().isoformat():
+            return None
+        assignments = {
+            int(pk): (int(venue_id), parse_datetime(start), parse_datetime(end))
+            for pk, venue_id, start, end in plan['a']
+        }
+        unplaced = [int(pk) for pk in plan['u']]
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+    if any(start is None or end is None for _, start, end in assignments.values()):
+        return None
+    return Solution(assignments, unplaced, 0.0, 0, False), bool(plan.get('s', True))
+
+
+def week_activities(day):
+    """Activities of the week of day that have no venue yet"""
+    start, end = week_bounds(day)
+    return Activite.objects.filter(
+        date_debut__gte=start,
+        date_debut__lt=end,
+        annulee=False,
+        infrastructure__isnull=True,
+    )
+
+
+def load_week(day, **options):
+    """Build a solver for the activities of a week that have no venue yet"""
+    start, end = week_bounds(day)
+
+    rows = list(week_activities(day).values_list('pk', 'date_debut', 'duree', 'capacite_max', 'nom'))
+
+    animateurs = defaultdict(list)
+    relations = ActiviteAnimateur.objects.filter(
+        activite_id__in=[row[0] for row in rows]
+    ).values_list('activite_id', 'animateur_id')
+    for activite_id, animateur_id in relations:
+        animateurs[activite_id].append(animateur_id)
+
+    tasks = [
+        Task(pk, date_debut, duree or 0, capacite, animateurs[pk], nom)
+        for pk, date_debut, duree, capacite, nom in rows
+    ]
+
+    venues = [
+        Venue(pk, capacite, nom)
+        for pk, capacite, nom in Infrastructure.objects.filter(disponible=True).values_list('pk', 'capacite', 'nom')
+    ]
+
+    calendar = BookingCalendar.load([venue.pk for venue in venues], start, end)
+    availability = AnimateurAvailability.load(start, end)
+
+    return TimetableSolver(tasks, venues, calendar=calendar, availability=availability, **options)
+
+
+def apply_solution(solution):
+    """Save the venue, start and end of every placed activity"""
+    activities = Activite.objects.in_bulk(list(solution.assignments))
+    now = timezone.now()
+
+    for pk, (infrastructure_id, start, end) in solution.assignments.items():
+        activite = activities[pk]
+        activite.infrastructure_id = infrastructure_id
+        activite.date_debut = start
+        activite.date_fin = end
+        activite.updated_at = now
+
+    with transaction.atomic():
+        Activite.objects.bulk_update(
+            activities.values(),
+            ['infrastructure', 'date_debut', 'date_fin', 'updated_at'],
+            batch_size=500,
+        )
+        reindex('activite', activities)
+        # bulk_update skips the signals refreshing the dashboard
+        on_commit_refresh('activities')
+        invalidate_on_commit('activite')
+        invalidate_counts_on_commit(Activite)
+
+    return len(activities)
+
+
+def synthetic_week(activities=500, venues=25, animateurs=60, seed=None):
+    """Random tasks and venues for benchmarking the solver without a database"""
+    rng = random.Random(seed)
+    monday = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=timezone.localdate().weekday()), time.min))
+
+    venue_list = [Venue(pk, rng.choice([12, 20, 30, 60]), f"Lieu {pk}") for pk in range(1, venues + 1)]
+    tasks = []
+    for pk in range(1, activities + 1):
+        preferred = monday + timedelta(days=rng.randrange(7), hours=rng.randrange(8, 18), minutes=rng.choice([0, 30]))
+        tasks.append(Task(
+            pk,
+            preferred,
+            rng.choice([45, 60, 90, 120]),
+            rng.choice([None, 10, 15, 20, 30]),
+            rng.sample(range(1, animateurs + 1), rng.randint(1, 2)),
+            f"Activité {pk}",
+        ))
+
+    return tasks, venue_list
@@ -17,6 +17,11 @@ urlpatterns = [
     path('animateur/<int:pk>/delete/', views.ActiviteAnimateurDeleteView.as_view(), name='delete_animateur'),
     path('materiel/<int:pk>/delete/', views.ActiviteMaterielDeleteView.as_view(), name='delete_materiel'),
     
+    # Series
+    path('<int:pk>/series/add/', views.SerieCreateView.as_view(), name='serie_add'),
+    path('series/<int:pk>/update/', views.SerieUpdateView.as_view(), name='serie_update'),
+    path('series/<int:pk>/delete/', views.SerieDeleteView.as_view(), name='serie_delete'),
+    
     # Inscriptions
     path('inscriptions/', views.InscriptionListView.as_view(), name='inscription_list'),
     path('inscriptions/add/', views.InscriptionCreateView.as_view(), name='inscription_add'),
@@ -27,10 +32,15 @@ urlpatterns = [
     path('quick-inscription/', views.QuickInscriptionView.as_view(), name='quick_inscription'),
     path('quick-inscription/participant/<int:participant_id>/', views.QuickInscriptionView.as_view(), name='quick_inscription_participant'),
     path('quick-inscription/activity/<int:activity_id>/', views.QuickInscriptionView.as_view(), name='quick_inscription_activity'),
+    path('<int:pk>/bulk-inscription/', views.BulkInscriptionView.as_view(), name='bulk_inscription'),
     
     # Participant activities
     path('participant/<int:pk>/activities/', views.ParticipantActivitiesView.as_view(), name='participant_activities'),
     
     # API
     path('check-capacity/<int:pk>/', views.check_activity_capacity, name='check_capacity'),
+    path('<int:pk>/bulk-inscription/api/', views.bulk_inscription_api, name='bulk_inscription_api'),
+    
+    # Calendar subscriptions
+    path('feeds/<str:kind>/<int:pk>/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
 ]
\ No newline at end of file
@@ -1,29 +1,45 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.views.generic.edit import FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
-from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.db.models import Q
+from django.http import JsonResponse, HttpResponseRedirect, StreamingHttpResponse, Http404
 from django.utils import timezone
-
-from .models import Activite, ActiviteAnimateur, ActiviteMateriel, Inscription
-from .forms import ActiviteForm, InscriptionForm, ActiviteAnimateurForm, ActiviteMaterielForm
+from django.utils.functional import cached_property
+from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST, condition
+
+from .models import Activite, ActiviteAnimateur, ActiviteMateriel, Inscription, SerieActivite
+from .forms import ActiviteForm, InscriptionForm, ActiviteAnimateurForm, ActiviteMaterielForm, BulkInscriptionForm
+from .forms import SerieActiviteForm, SerieUpdateForm
+from .registration import RegistrationResult, save_inscription, register_group
+from .ledger import available_quantity
+from .series import create_series, update_series
+from .ics import FEED_MODELS, check_feed_token, feed_etag, iter_calendar
+from infrastructure.conflicts import describe_conflicts
 from participants.models import Participant
 from staff.models import Responsable, Animateur
+from staff.availability import available_animateurs_for
 from infrastructure.models import Infrastructure, Materiel
+from core.mixins import KeysetPaginationMixin
+from core.utils import prefix_filter
 
 
-class ActiviteListView(LoginRequiredMixin, ListView):
+class ActiviteListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """View for listing activities with filters"""
     model = Activite
     template_name = 'activities/list.html'
     context_object_name = 'activities'
     paginate_by = 10
+    # The search also matches the name of the responsable
+    count_models = [Activite, Responsable]
     
     def get_queryset(self):
-        queryset = Activite.objects.all()
+        queryset = Activite.objects.select_related('responsable')
         
         # Search query
         query = self.request.GET.get('q')
@@ -68,22 +84,13 @@ class ActiviteListView(LoginRequiredMixin, ListView):
         elif sort == 'date':
             queryset = queryset.order_by('date_debut')
         elif sort == 'participants':
-            queryset = queryset.annotate(participants_count=Count('inscriptions')).order_by('-participants_count')
+            queryset = queryset.order_by('-nb_inscrits')
         
         return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['responsables'] = Responsable.objects.all()
-        
-        # Add query parameters for pagination
-        query_params = {}
-        for key in ['q', 'date_filter', 'responsable', 'sort']:
-            if self.request.GET.get(key):
-                query_params[key] = self.request.GET.get(key)
-        
-        context['query_params'] = query_params
-        
         return context
 
 
@@ -95,7 +102,7 @@ class ActiviteDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        activity = self.get_object()
+        activity = self.object
         
         # Get animateurs for this activity
         context['animateurs'] = ActiviteAnimateur.objects.filter(activite=activity).select_related('animateur')
@@ -163,12 +170,133 @@ class ActiviteDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
-class InscriptionListView(LoginRequiredMixin, ListView):
+class SerieCreateView(LoginRequiredMixin, CreateView):
+    """View for repeating an activity as a series"""
+    model = SerieActivite
+    form_class = SerieActiviteForm
+    template_name = 'activities/serie_form.html'
+    
+    def dispatch(self, request, *args, **kwargs):
+        self.template = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        if self.template.serie_id:
+            messages.warning(request, 'Cette activité fait déjà partie d\'une série.')
+            return redirect('activities:detail', pk=self.template.pk)
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['template'] = self.template
+        return kwargs
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['activity'] = self.template
+        context['title'] = f'Répéter l\'activité - {self.template.nom}'
+        context['button_text'] = 'Créer la série'
+        return context
+    
+    def form_valid(self, form):
+        created, conflicts = create_series(
+            form.instance, self.template,
+            skip_conflicts=form.cleaned_data['ignorer_conflits'],
+        )
+        
+        if conflicts and not form.instance.pk:
+            for start, end, bookings in conflicts[:5]:
+                form.add_error(None, f"{timezone.localtime(start):%d/%m/%Y %H:%M}: {' '.join(describe_conflicts(bookings))}")
+            if len(conflicts) > 5:
+                form.add_error(None, f"... et {len(conflicts) - 5} autre(s) occurrence(s) en conflit.")
+            return self.form_invalid(form)
+        
+        self.object = form.instance
+        messages.success(self.request, f'Série créée avec succès: {created} activité(s) ajoutée(s).')
+        if conflicts:
+            messages.warning(self.request, f'{len(conflicts)} occurrence(s) ignorée(s) car le lieu est déjà réservé.')
+        return HttpResponseRedirect(self.get_success_url())
+    
+    def get_success_url(self):
+        return reverse('activities:detail', kwargs={'pk': self.template.pk})
+
+
+class SerieUpdateView(LoginRequiredMixin, UpdateView):
+    """View for editing every activity of a series"""
+    model = SerieActivite
+    form_class = SerieUpdateForm
+    template_name = 'activities/serie_form.html'
+    context_object_name = 'serie'
+    
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        # The form edits activity fields, initialised from the first occurrence
+        kwargs['instance'] = self.object.activites.order_by('date_debut').first()
+        kwargs['serie'] = self.object
+        return kwargs
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['activity'] = context['form'].instance
+        context['title'] = f'Modifier la série - {self.object.nom}'
+        context['button_text'] = 'Mettre à jour la série'
+        return context
+    
+    def form_valid(self, form):
+        values = {field: form.cleaned_data[field] for field in form.Meta.fields}
+        updated = update_series(self.object, values)
+        
+        SerieActivite.objects.filter(pk=self.object.pk).update(nom=values['nom'])
+        messages.success(self.request, f'Série mise à jour avec succès: {updated} activité(s) modifiée(s).')
+        return HttpResponseRedirect(self.get_success_url())
+    
+    def get_success_url(self):
+        activity = self.object.activites.order_by('date_debut').first()
+        if activity is None:
+            return reverse('activities:list')
+        return reverse('activities:detail', kwargs={'pk': activity.pk})
+
+
+class SerieDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+    """View for deleting a series and all its activities"""
+    model = SerieActivite
+    template_name = 'activities/serie_confirm_delete.html'
+    success_url = reverse_lazy('activities:list')
+    context_object_name = 'serie'
+    
+    def test_func(self):
+        # Only admin users can delete activities
+        return self.request.user.is_staff
+    
+    def form_valid(self, form):
+        messages.success(self.request, 'Série supprimée avec succès.')
+        return super().form_valid(form)
+
+
+class RegistrationFormMixin:
+    """Save an inscription form through the registration service"""
+    
+    def register_from_form(self, form):
+        inscription = form.save(commit=False)
+        result = save_inscription(inscription)
+        
+        if not result.ok:
+            field = 'activite' if result.status == RegistrationResult.FULL else None
+            form.add_error(field, result.message)
+        
+        return result
+
+
+class InscriptionListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """View for listing all inscriptions"""
     model = Inscription
     template_name = 'activities/inscription_list.html'
     context_object_name = 'inscriptions'
     paginate_by = 20
+    count_models = [Inscription, Participant, Activite]
+    
+    # Orderings offered by the sort parameter
+    SORTS = [
+        '-date_inscription', 'date_inscription', 'statut', '-statut',
+        'participant__nom', '-participant__nom', 'activite__nom', '-activite__nom',
+    ]
     
     def get_queryset(self):
         queryset = Inscription.objects.select_related('participant', 'activite')
@@ -176,11 +304,10 @@ class InscriptionListView(LoginRequiredMixin, ListView):
         # Search query
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(
-                Q(participant__nom__icontains=query) |
-                Q(participant__prenom__icontains=query) |
-                Q(activite__nom__icontains=query)
-            )
+            queryset = queryset.filter(prefix_filter(
+                query,
+                ['participant__nom_normalise', 'participant__prenom_normalise', 'activite__nom_normalise'],
+            ))
         
         # Status filter
         status = self.request.GET.get('status')
@@ -194,6 +321,8 @@ class InscriptionListView(LoginRequiredMixin, ListView):
         
         # Sort
         sort = self.request.GET.get('sort', '-date_inscription')
+        if sort not in self.SORTS:
+            sort = '-date_inscription'
         queryset = queryset.order_by(sort)
         
         return queryset
@@ -201,19 +330,10 @@ class InscriptionListView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['activities'] = Activite.objects.all()
-        
-        # Add query parameters for pagination
-        query_params = {}
-        for key in ['q', 'status', 'activity', 'sort']:
-            if self.request.GET.get(key):
-                query_params[key] = self.request.GET.get(key)
-        
-        context['query_params'] = query_params
-        
         return context
 
 
-class InscriptionCreateView(LoginRequiredMixin, CreateView):
+class InscriptionCreateView(LoginRequiredMixin, RegistrationFormMixin, CreateView):
     """View for creating a new inscription"""
     model = Inscription
     form_class = InscriptionForm
@@ -231,17 +351,17 @@ class InscriptionCreateView(LoginRequiredMixin, CreateView):
         return kwargs
     
     def form_valid(self, form):
-        # Check if activity is full
-        activite = form.cleaned_data['activite']
-        if activite.is_full():
-            form.add_error('activite', 'Cette activité est complète.')
+        # Claims the seat atomically, the activity may have filled up since the form was displayed
+        result = self.register_from_form(form)
+        if not result.ok:
             return self.form_invalid(form)
         
+        self.object = result.inscription
         messages.success(self.request, 'Inscription créée avec succès.')
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
 
-class InscriptionUpdateView(LoginRequiredMixin, UpdateView):
+class InscriptionUpdateView(LoginRequiredMixin, RegistrationFormMixin, UpdateView):
     """View for updating an inscription"""
     model = Inscription
     form_class = InscriptionForm
@@ -259,15 +379,13 @@ class InscriptionUpdateView(LoginRequiredMixin, UpdateView):
         return kwargs
     
     def form_valid(self, form):
-        if form.cleaned_data['activite'] != self.object.activite:
-            # Activity changed, check if new activity is full
-            activite = form.cleaned_data['activite']
-            if activite.is_full():
-                form.add_error('activite', 'Cette activité est complète.')
-                return self.form_invalid(form)
+        # A seat is claimed when the activity changes or the status becomes 'inscrit'
+        result = self.register_from_form(form)
+        if not result.ok:
+            return self.form_invalid(form)
         
         messages.success(self.request, 'Inscription mise à jour avec succès.')
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
 
 class InscriptionDeleteView(LoginRequiredMixin, DeleteView):
@@ -282,7 +400,15 @@ class InscriptionDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
-class ActiviteAnimateurCreateView(LoginRequiredMixin, CreateView):
+class ActiviteFromUrlMixin:
+    """Activity of the pk URL argument, fetched once per request"""
+
+    @cached_property
+    def activite(self):
+        return get_object_or_404(Activite, pk=self.kwargs['pk'])
+
+
+class ActiviteAnimateurCreateView(LoginRequiredMixin, ActiviteFromUrlMixin, CreateView):
     """View for adding an animator to an activity"""
     model = ActiviteAnimateur
     form_class = ActiviteAnimateurForm
@@ -290,31 +416,25 @@ class ActiviteAnimateurCreateView(LoginRequiredMixin, CreateView):
     
     def get_initial(self):
         initial = super().get_initial()
-        initial['activite'] = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        initial['activite'] = self.activite
         return initial
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        # Filter out animators already assigned to this activity
-        activite = get_object_or_404(Activite, pk=self.kwargs['pk'])
-        existing_animateurs = ActiviteAnimateur.objects.filter(
-            activite=activite
-        ).values_list('animateur_id', flat=True)
-        
-        kwargs['animateurs_queryset'] = Animateur.objects.exclude(
-            id__in=existing_animateurs
-        )
+        # Only animators on shift and not leading another activity at that time
+        activite = self.activite
+        kwargs['animateurs_queryset'] = available_animateurs_for(activite)
         return kwargs
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        activite = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        activite = self.activite
         context['activite'] = activite
         context['title'] = f'Ajouter un animateur à {activite.nom}'
         return context
     
     def form_valid(self, form):
-        form.instance.activite = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        form.instance.activite = self.activite
         messages.success(self.request, 'Animateur ajouté avec succès.')
         return super().form_valid(form)
     
@@ -322,7 +442,7 @@ class ActiviteAnimateurCreateView(LoginRequiredMixin, CreateView):
         return reverse('activities:detail', kwargs={'pk': self.kwargs['pk']})
 
 
-class ActiviteMaterielCreateView(LoginRequiredMixin, CreateView):
+class ActiviteMaterielCreateView(LoginRequiredMixin, ActiviteFromUrlMixin, CreateView):
     """View for adding material to an activity"""
     model = ActiviteMateriel
     form_class = ActiviteMaterielForm
@@ -330,13 +450,13 @@ class ActiviteMaterielCreateView(LoginRequiredMixin, CreateView):
     
     def get_initial(self):
         initial = super().get_initial()
-        initial['activite'] = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        initial['activite'] = self.activite
         return initial
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         # Filter out materials already assigned to this activity
-        activite = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        activite = self.activite
         existing_materiels = ActiviteMateriel.objects.filter(
             activite=activite
         ).values_list('materiel_id', flat=True)
@@ -348,7 +468,7 @@ class ActiviteMaterielCreateView(LoginRequiredMixin, CreateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        activite = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        activite = self.activite
         context['activite'] = activite
         context['title'] = f'Ajouter du matériel à {activite.nom}'
         return context
@@ -358,12 +478,16 @@ class ActiviteMaterielCreateView(LoginRequiredMixin, CreateView):
         materiel = form.cleaned_data['materiel']
         quantite_requise = form.cleaned_data['quantite_requise']
         
-        if materiel.quantite_disponible < quantite_requise:
+        # Units already booked by overlapping activities are not available
+        activite = self.activite
+        disponible = available_quantity(materiel, activite)
+        
+        if disponible < quantite_requise:
             form.add_error('quantite_requise', 
-                           f'Quantité insuffisante. Disponible: {materiel.quantite_disponible}')
+                           f'Quantité insuffisante sur ce créneau. Disponible: {max(0, disponible)}')
             return self.form_invalid(form)
         
-        form.instance.activite = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        form.instance.activite = activite
         messages.success(self.request, 'Matériel ajouté avec succès.')
         return super().form_valid(form)
     
@@ -429,21 +553,29 @@ class ParticipantActivitiesView(LoginRequiredMixin, ListView):
         return context
 
 
-class QuickInscriptionView(LoginRequiredMixin, FormView):
+class QuickInscriptionView(LoginRequiredMixin, RegistrationFormMixin, FormView):
     """View for quickly registering a participant to an activity"""
     template_name = 'activities/quick_inscription.html'
     form_class = InscriptionForm
     
-    def get_initial(self):
-        initial = super().get_initial()
+    @cached_property
+    def participant(self):
         participant_id = self.kwargs.get('participant_id')
+        return get_object_or_404(Participant, pk=participant_id) if participant_id else None
+    
+    @cached_property
+    def activity(self):
         activity_id = self.kwargs.get('activity_id')
+        return get_object_or_404(Activite, pk=activity_id) if activity_id else None
+    
+    def get_initial(self):
+        initial = super().get_initial()
         
-        if participant_id:
-            initial['participant'] = get_object_or_404(Participant, pk=participant_id)
+        if self.participant:
+            initial['participant'] = self.participant
         
-        if activity_id:
-            initial['activite'] = get_object_or_404(Activite, pk=activity_id)
+        if self.activity:
+            initial['activite'] = self.activity
         
         return initial
     
@@ -452,11 +584,9 @@ class QuickInscriptionView(LoginRequiredMixin, FormView):
         now = timezone.now()
         
         # When participant is preselected, only show future activities where they're not registered
-        participant_id = self.kwargs.get('participant_id')
-        if participant_id:
-            participant = get_object_or_404(Participant, pk=participant_id)
+        if self.participant:
             existing_activities = Inscription.objects.filter(
-                participant=participant
+                participant=self.participant
             ).values_list('activite_id', flat=True)
             
             kwargs['activities_queryset'] = Activite.objects.filter(
@@ -473,11 +603,9 @@ class QuickInscriptionView(LoginRequiredMixin, FormView):
             ).order_by('date_debut')
         
         # When activity is preselected, only show participants not already registered
-        activity_id = self.kwargs.get('activity_id')
-        if activity_id:
-            activity = get_object_or_404(Activite, pk=activity_id)
+        if self.activity:
             existing_participants = Inscription.objects.filter(
-                activite=activity
+                activite=self.activity
             ).values_list('participant_id', flat=True)
             
             kwargs['participants_queryset'] = Participant.objects.exclude(
@@ -489,37 +617,20 @@ class QuickInscriptionView(LoginRequiredMixin, FormView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        participant_id = self.kwargs.get('participant_id')
-        activity_id = self.kwargs.get('activity_id')
-        
-        if participant_id:
-            context['participant'] = get_object_or_404(Participant, pk=participant_id)
+        if self.participant:
+            context['participant'] = self.participant
         
-        if activity_id:
-            context['activity'] = get_object_or_404(Activite, pk=activity_id)
+        if self.activity:
+            context['activity'] = self.activity
         
         return context
     
     def form_valid(self, form):
-        # Check if activity is full
-        activite = form.cleaned_data['activite']
-        if activite.is_full():
-            form.add_error('activite', 'Cette activité est complète.')
+        # Capacity and duplicate checks happen under the activity lock
+        result = self.register_from_form(form)
+        if not result.ok:
             return self.form_invalid(form)
         
-        # Check if inscription already exists
-        participant = form.cleaned_data['participant']
-        existing = Inscription.objects.filter(
-            participant=participant,
-            activite=activite
-        ).exists()
-        
-        if existing:
-            form.add_error(None, 'Ce participant est déjà inscrit à cette activité.')
-            return self.form_invalid(form)
-        
-        # Create inscription
-        inscription = form.save()
         messages.success(self.request, 'Inscription créée avec succès.')
         
         # Determine redirect URL
@@ -538,6 +649,109 @@ class QuickInscriptionView(LoginRequiredMixin, FormView):
         return super().form_invalid(form)
 
 
+class BulkInscriptionView(LoginRequiredMixin, FormView):
+    """View for registering a group of participants to an activity at once"""
+    template_name = 'activities/bulk_inscription.html'
+    form_class = BulkInscriptionForm
+    
+    def dispatch(self, request, *args, **kwargs):
+        self.activite = get_object_or_404(Activite, pk=self.kwargs['pk'])
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        # Only show participants not already registered
+        kwargs['participants_queryset'] = Participant.objects.exclude(
+            inscriptions__activite=self.activite
+        )
+        return kwargs
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['activity'] = self.activite
+        context['title'] = f'Inscription de groupe - {self.activite.nom}'
+        return context
+    
+    def form_valid(self, form):
+        participants = form.cleaned_data['participants']
+        results = register_group(
+            self.activite,
+            [participant.pk for participant in participants],
+            statut=form.cleaned_data['statut'],
+            notes=form.cleaned_data['notes'] or None,
+        )
+        
+        created = sum(1 for result in results if result.ok)
+        if created:
+            messages.success(self.request, f'{created} inscription(s) créée(s) avec succès.')
+        if created < len(results):
+            messages.warning(self.request, f'{len(results) - created} participant(s) n\'ont pas pu être inscrits.')
+        
+        names = {participant.pk: participant for participant in participants}
+        rows = [(names.get(result.participant_id), result) for result in results]
+        
+        return self.render_to_response(self.get_context_data(form=form, results=rows))
+
+
+@login_required
+@require_POST
+def bulk_inscription_api(request, pk):
+    """AJAX view to register a list of participant ids to an activity"""
+    activity = get_object_or_404(Activite, pk=pk)
+    
+    try:
+        payload = json.loads(request.body or '{}')
+        participant_ids = [int(participant_id) for participant_id in payload.get('participant_ids', [])]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid payload'
+        }, status=400)
+    
+    statut = payload.get('statut', 'inscrit')
+    if statut not in dict(Inscription.STATUT_CHOICES):
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid status'
+        }, status=400)
+    
+    results = register_group(activity, participant_ids, statut=statut, notes=payload.get('notes'))
+    
+    return JsonResponse({
+        'success': True,
+        'created': sum(1 for result in results if result.ok),
+        'results': [
+            {
+                'participant_id': result.participant_id,
+                'status': result.status,
+                'message': result.message,
+            }
+            for result in results
+        ]
+    })
+
+
+def _calendar_feed_etag(request, kind, pk, token):
+    if not check_feed_token(kind, pk, token):
+        return None
+    return feed_etag(kind, pk)
+
+
+@condition(etag_func=_calendar_feed_etag)
+def calendar_feed(request, kind, pk, token):
+    """iCalendar subscription feed of a participant, staff member or infrastructure"""
+    if not check_feed_token(kind, pk, token):
+        raise Http404
+    
+    owner = get_object_or_404(FEED_MODELS[kind], pk=pk)
+    response = StreamingHttpResponse(
+        iter_calendar(kind, pk, str(owner), base_url=request.build_absolute_uri('/')[:-1], host=request.get_host()),
+        content_type='text/calendar; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'inline; filename="{kind}-{pk}.ics"'
+    return response
+
+
 def check_activity_capacity(request, pk):
     """AJAX view to check if an activity has available capacity"""
     try:
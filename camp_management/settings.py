@@ -47,6 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First to time the whole request, inactive unless REQUEST_PROFILING is set
+    'core.middleware.ProfilingMiddleware',
+    # Development check for queries run once per row, inactive unless DETECT_REPEATED_QUERIES is set
+    'core.middleware.RepeatedQueriesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,6 +99,16 @@ DATABASES = {
     }
 }
 
+# Cache shared by every worker: the dashboard charts and the list counts are
+# invalidated by bumping versions stored here, see core.checks
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'KEY_PREFIX': 'camp_management',
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -154,6 +168,24 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 LOGIN_URL = '/accounts/login/'
 
+# Maximum age in seconds of the dashboard statistics snapshot
+DASHBOARD_STATS_MAX_AGE = 15 * 60
+
+# Seconds a cached dashboard chart is served before being recomputed
+DASHBOARD_CHART_CACHE_TTL = 5 * 60
+
+# Request profiling: Server-Timing header and core.profiling log line of each request,
+# with the cProfile stats of a fraction of them written to REQUEST_PROFILING_DIR
+REQUEST_PROFILING = False
+REQUEST_PROFILING_SAMPLE_RATE = 0.0
+REQUEST_PROFILING_DIR = BASE_DIR / 'profiles'
+
+# Log the queries a request runs at least REPEATED_QUERIES_THRESHOLD times (N+1),
+# or fail the request with REPEATED_QUERIES_RAISE
+DETECT_REPEATED_QUERIES = False
+REPEATED_QUERIES_THRESHOLD = 3
+REPEATED_QUERIES_RAISE = False
+
 # AllAuth settings
 ACCOUNT_LOGIN_METHODS = {'email'}
 ACCOUNT_SIGNUP_FIELDS = ['email*', 'password1*', 'password2*']
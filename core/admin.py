@@ -14,6 +14,7 @@ class UserProfileInline(admin.StackedInline):
 class UserAdmin(DefaultUserAdmin):
     inlines = (UserProfileInline,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'get_role')
+    list_select_related = ('profile',)
    # list_filter = DefaultUserAdmin.list_filter + ('userprofile__role',)
     list_filter = DefaultUserAdmin.list_filter
     search_fields = ('username', 'email', 'first_name', 'last_name', 'userprofile__telephone')
@@ -0,0 +1,149 @@
+import re
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+
+from activities.models import Activite
+from infrastructure.models import Infrastructure, Materiel
+from participants.models import Participant
+from staff.models import Animateur, Responsable
+
+
+# (url name, model whose first object fills pk, url kwargs, query parameters) of the replayed views.
+# Parameters may use {pk}, {start} and {end}, a one week calendar window.
+AUDITED_VIEWS = [
+    ('dashboard:index', None, {}, {}),
+    ('dashboard:search', None, {}, {'q': 'mar'}),
+    ('dashboard:autocomplete', None, {}, {'q': 'mar'}),
+    ('dashboard:participants_chart', None, {}, {'period': 'month'}),
+    ('dashboard:inscriptions_chart', None, {}, {'period': 'month'}),
+    ('dashboard:activities_chart', None, {}, {}),
+    ('dashboard:materials_chart', None, {}, {}),
+    ('participants:list', None, {}, {}),
+    ('participants:list', None, {}, {'q': 'mar', 'sort': 'age'}),
+    ('participants:detail', Participant, {}, {}),
+    ('participants:activities_json', Participant, {}, {'start': '{start}', 'end': '{end}'}),
+    ('activities:list', None, {}, {}),
+    ('activities:list', None, {}, {'date_filter': 'week'}),
+    ('activities:detail', Activite, {}, {}),
+    ('activities:inscription_list', None, {}, {}),
+    ('activities:inscription_list', None, {}, {'status': 'inscrit'}),
+    ('activities:participant_activities', Participant, {}, {}),
+    ('activities:check_capacity', Activite, {}, {}),
+    ('infrastructure:list', None, {}, {}),
+    ('infrastructure:detail', Infrastructure, {}, {}),
+    ('infrastructure:events_json', Infrastructure, {}, {'start': '{start}', 'end': '{end}'}),
+    ('infrastructure:check_availability', Infrastructure, {}, {'infrastructure': '{pk}', 'start': '{start}', 'end': '{end}'}),
+    ('infrastructure:materiel_list', None, {}, {}),
+    ('infrastructure:materiel_detail', Materiel, {}, {}),
+    ('staff:list', None, {}, {}),
+    ('staff:dashboard', None, {}, {}),
+    ('staff:responsable_detail', Responsable, {}, {}),
+    ('staff:animateur_detail', Animateur, {}, {}),
+    ('staff:activities_json', Animateur, {'staff_type': 'animateur'}, {'start': '{start}', 'end': '{end}'}),
+    ('staff:available_animateurs', None, {}, {'start': '{start}', 'end': '{end}'}),
+    ('staff:timetable', None, {}, {}),
+    ('staff:timetable', None, {}, {'apercu': '1'}),
+]
+
+# Literals replaced to group the queries differing only by their values
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def audited_urls():
+    """[(label, url)] of AUDITED_VIEWS, skipping the detail views of empty tables"""
+    start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    start -= timedelta(days=start.weekday())
+    window = {'start': start.isoformat(), 'end': (start + timedelta(days=7)).isoformat()}
+
+    urls = []
+    for name, model, kwargs, params in AUDITED_VIEWS:
+        pk = None
+        if model is not None:
+            pk = model._default_manager.order_by('pk').values_list('pk', flat=True).first()
+            if pk is None:
+                continue
+        try:
+            url = reverse(name, kwargs={**kwargs, 'pk': pk}) if pk is not None else reverse(name, kwargs=kwargs)
+        except NoReverseMatch:
+            url = reverse(name, kwargs=kwargs)
+
+        query = urlencode({key: value.format(pk=pk, **window) for key, value in params.items()})
+        urls.append((f"{name}{'?' + query if query else ''}", f"{url}{'?' + query if query else ''}"))
+    return urls
+
+
+def replay(client, url, using='default'):
+    """(status code, captured queries) of a GET on url"""
+    with CaptureQueriesContext(connections[using]) as queries:
+        response = client.get(url)
+    return response.status_code, queries.captured_queries
+
+
+def query_shape(sql):
+    return _LITERALS.sub('?', sql)
+
+
+def explain(sql, using='default'):
+    """(plan lines, problems) of a SELECT, problems being full scans and sorts without an index"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [column[0].lower() for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        elif connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql)
+            rows = [row[0] for row in cursor.fetchall()]
+        else:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            rows = [row[-1] for row in cursor.fetchall()]
+
+    problems = []
+    if connection.vendor == 'mysql':
+        lines = []
+        for row in rows:
+            table, extra = row.get('table'), row.get('extra') or ''
+            lines.append(f"{table}: {row.get('type')} clé={row.get('key')} lignes={row.get('rows')} {extra}".rstrip())
+            if row.get('type') == 'ALL':
+                problems.append(f"parcours complet de {table} ({row.get('rows')} lignes)")
+            elif row.get('type') == 'index':
+                problems.append(f"parcours complet de l'index {row.get('key')} de {table}")
+            if 'Using filesort' in extra:
+                problems.append(f"tri sans index (filesort) sur {table}")
+            if 'Using temporary' in extra:
+                problems.append(f"table temporaire pour {table}")
+        return lines, problems
+
+    for line in rows:
+        if connection.vendor == 'postgresql':
+            scan = re.search(r'Seq Scan on (\w+)', line)
+            if scan:
+                problems.append(f"parcours complet de {scan.group(1)}")
+            if re.match(r'\s*(->\s*)?Sort\b', line):
+                problems.append("tri sans index")
+        else:
+            scan = re.match(r'SCAN (\w+)', line)
+            if scan and 'USING' not in line and scan.group(1) != 'CONSTANT':
+                problems.append(f"parcours complet de {scan.group(1)}")
+            if 'USE TEMP B-TREE' in line:
+                problems.append(f"tri sans index ({line.split('FOR ')[-1]})")
+    return rows, problems
+
+
+def time_query(sql, repetitions=5, using='default'):
+    """Median duration in milliseconds of running sql"""
+    durations = []
+    with connections[using].cursor() as cursor:
+        for _ in range(repetitions):
+            started = time.perf_counter()
+            cursor.execute(sql)
+            cursor.fetchall()
+            durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return durations[len(durations) // 2]
@@ -0,0 +1,125 @@
+import math
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.db import connections, reset_queries
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from activities.models import Activite
+
+
+def _busiest_activity():
+    return Activite.objects.order_by('-nb_inscrits', 'pk').values_list('pk', flat=True).first()
+
+
+# (label, url name, function giving the pk of the url or None, query parameters) of the benchmarked views
+BENCHMARKED_VIEWS = [
+    ('dashboard', 'dashboard:index', None, {}),
+    ('activites', 'activities:list', None, {}),
+    ('activites-semaine', 'activities:list', None, {'date_filter': 'week'}),
+    ('recherche', 'dashboard:search', None, {'q': 'martin'}),
+    ('graphique-participants', 'dashboard:participants_chart', None, {'period': 'month'}),
+    ('graphique-inscriptions', 'dashboard:inscriptions_chart', None, {'period': 'month'}),
+    ('graphique-activites', 'dashboard:activities_chart', None, {}),
+    ('graphique-materiel', 'dashboard:materials_chart', None, {}),
+    ('capacite', 'activities:check_capacity', _busiest_activity, {}),
+]
+
+# Extra latency tolerated below which a slower p95 is taken as noise
+MIN_LATENCY_DELTA_MS = 2.0
+
+
+def percentile(values, percent):
+    """Percentile of values, interpolated between the two closest ranks"""
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * percent / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def benchmark_view(client, url, params, repetitions, using='default'):
+    """Latency, query count and peak memory of GETs on url.
+
+    The first request runs with a cleared cache and is reported on its own,
+    the percentiles are those of the repetitions that follow it. Peak memory
+    is traced on one more request, tracemalloc slowing down the others.
+    """
+    cache.clear()
+    # A full query log, as after seeding with DEBUG on, would capture nothing
+    reset_queries()
+    with CaptureQueriesContext(connections[using]) as queries:
+        started = time.perf_counter()
+        response = client.get(url, params)
+        cold_ms = (time.perf_counter() - started) * 1000
+
+    durations = []
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        client.get(url, params)
+        durations.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        client.get(url, params)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'queries': len(queries.captured_queries),
+        'cold_ms': round(cold_ms, 3),
+        'p50_ms': round(percentile(durations, 50), 3),
+        'p90_ms': round(percentile(durations, 90), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'p99_ms': round(percentile(durations, 99), 3),
+        'max_ms': round(max(durations), 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def benchmark_views(client, repetitions):
+    """{label: measures} of BENCHMARKED_VIEWS on the current database"""
+    results = {}
+    for label, name, pk, params in BENCHMARKED_VIEWS:
+        kwargs = None
+        if pk is not None:
+            kwargs = {'pk': pk()}
+            if kwargs['pk'] is None:
+                continue
+        results[label] = benchmark_view(client, reverse(name, kwargs=kwargs), params, repetitions)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Regressions of results against a baseline run, as (size, view, message).
+
+    Both are result files of the benchmark command, sizes being matched by
+    scale. A view regresses when it runs more queries, when its p95 latency
+    or its peak memory grow by more than tolerance, or when it now fails.
+    """
+    regressions = []
+    reference = {run['scale']: run['views'] for run in baseline.get('runs', [])}
+    for run in results['runs']:
+        views = reference.get(run['scale'])
+        if views is None:
+            continue
+        for label, measures in run['views'].items():
+            before = views.get(label)
+            if before is None:
+                continue
+            size = run['scale']
+            if measures['status'] >= 400 > before['status']:
+                regressions.append((size, label, f"statut {before['status']} → {measures['status']}"))
+            if measures['queries'] > before['queries']:
+                regressions.append((size, label, f"{before['queries']} → {measures['queries']} requêtes"))
+            limit = before['p95_ms'] * (1 + tolerance)
+            if measures['p95_ms'] > limit and measures['p95_ms'] - before['p95_ms'] > MIN_LATENCY_DELTA_MS:
+                regressions.append((size, label, f"p95 {before['p95_ms']:.1f} → {measures['p95_ms']:.1f} ms"))
+            if measures['peak_kib'] > before['peak_kib'] * (1 + tolerance):
+                regressions.append((size, label, f"mémoire {before['peak_kib']:.0f} → {measures['peak_kib']:.0f} Kio"))
+    return regressions
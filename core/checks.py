@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+# Backends whose entries only exist in the process that wrote them
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """The chart cache and the list counts are invalidated by bumping versions in the default cache.
+
+    With a cache private to each process, a write only invalidates the entries
+    of the worker that handled it and the others serve stale data until the
+    timeout.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        "Le cache par défaut est propre à chaque processus : les graphiques du tableau de bord et les "
+        "totaux des listes ne sont invalidés que dans le processus qui a enregistré la modification.",
+        hint="Configurez un cache partagé (Redis, Memcached ou base de données) dans CACHES, "
+             "ou servez l'application avec un seul processus.",
+        id='core.W001',
+    )]
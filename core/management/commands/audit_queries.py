@@ -0,0 +1,85 @@
+import logging
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.audit import audited_urls, explain, query_shape, replay, time_query
+
+
+class Command(BaseCommand):
+    help = (
+        "Rejoue les requêtes des vues de liste, de détail et JSON sur la base courante "
+        "et signale les parcours complets et les tris sans index relevés par EXPLAIN"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--utilisateur', help="Compte utilisé pour les vues (par défaut le premier super-utilisateur)")
+        parser.add_argument('--repetitions', type=int, default=5, help="Exécutions de chaque requête pour la mesurer (défaut : 5)")
+        parser.add_argument('--tout', action='store_true', help="Affiche aussi les requêtes sans problème")
+        parser.add_argument(
+            '--strict', action='store_true',
+            help="Code de sortie non nul si une requête fait un parcours complet ou un tri sans index",
+        )
+
+    def _user(self, username):
+        users = get_user_model()._default_manager.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError("Aucun utilisateur pour rejouer les vues, précisez --utilisateur.")
+        return user
+
+    def handle(self, *args, **options):
+        client = Client(raise_request_exception=False)
+        client.force_login(self._user(options['utilisateur']))
+        repetitions = max(1, options['repetitions'])
+
+        # The test environment accepts the testserver host of the client
+        setup_test_environment()
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            replays = [(label, *replay(client, url)) for label, url in audited_urls()]
+        finally:
+            request_logger.setLevel(level)
+            teardown_test_environment()
+
+        total_ms = 0.0
+        explained = {}
+        for label, status, queries in replays:
+            shapes = OrderedDict()
+            for query in queries:
+                if query['sql'].lstrip().upper().startswith('SELECT'):
+                    shapes.setdefault(query_shape(query['sql']), []).append(query['sql'])
+
+            lines = []
+            view_ms = 0.0
+            for shape, executed in shapes.items():
+                if shape not in explained:
+                    plan, problems = explain(executed[0])
+                    explained[shape] = (plan, problems, time_query(executed[0], repetitions))
+                plan, problems, duration = explained[shape]
+                view_ms += duration * len(executed)
+                if problems or options['tout']:
+                    repeated = f" ×{len(executed)}" if len(executed) > 1 else ''
+                    lines.append(f"  {duration:7.2f} ms{repeated}  {executed[0][:160]}")
+                    lines.extend(f"      ! {problem}" for problem in problems)
+                    if options['verbosity'] > 1:
+                        lines.extend(f"        {line}" for line in plan)
+
+            total_ms += view_ms
+            style = self.style.SUCCESS if status < 400 else self.style.ERROR
+            self.stdout.write(style(f"{label} [{status}] {len(queries)} requête(s), {view_ms:.2f} ms"))
+            for line in lines:
+                self.stdout.write(line)
+
+        flagged = sum(1 for _, problems, _ in explained.values() if problems)
+        self.stdout.write(
+            f"\n{len(replays)} vue(s), {len(explained)} requête(s) distincte(s), "
+            f"{total_ms:.2f} ms de SQL, {flagged} requête(s) signalée(s)."
+        )
+        if flagged and options['strict']:
+            raise CommandError(f"{flagged} requête(s) sans index adapté.")
@@ -0,0 +1,112 @@
+import json
+import logging
+import platform
+from pathlib import Path
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from core.benchmark import benchmark_views, compare
+from core.seeding import VOLUMES, CampGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les vues principales (tableau de bord, activités, recherche, graphiques, capacité) sur des camps "
+        "générés de tailles croissantes, dans une base de test, enregistre les latences, le nombre de requêtes et "
+        "la mémoire dans un fichier JSON et signale les régressions par rapport à une référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--echelles', default='0.01,0.03,0.1',
+            help="Échelles des camps générés, séparées par des virgules, 1 valant les volumes de seed_camp (défaut : 0.01,0.03,0.1)",
+        )
+        parser.add_argument('--repetitions', type=int, default=20, help="Requêtes mesurées par vue (défaut : 20)")
+        parser.add_argument('--graine', type=int, default=0, help="Graine des camps générés (défaut : 0)")
+        parser.add_argument('--sortie', default='benchmark_results.json', help="Fichier JSON des résultats (défaut : benchmark_results.json)")
+        parser.add_argument('--reference', help="Résultats d'une exécution précédente auxquels comparer")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Hausse tolérée de la latence p95 et de la mémoire (défaut : 0.2)")
+        parser.add_argument('--strict', action='store_true', help="Code de sortie non nul en cas de régression")
+
+    def _scales(self, value):
+        try:
+            scales = sorted({float(scale) for scale in value.split(',') if scale.strip()})
+        except ValueError:
+            raise CommandError("Échelles invalides, exemple : --echelles 0.01,0.1")
+        if not scales or scales[0] <= 0:
+            raise CommandError("Les échelles doivent être positives.")
+        return scales
+
+    def _load_baseline(self, path):
+        if not path:
+            return None
+        try:
+            return json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Référence illisible ({path}) : {error}")
+
+    def _run(self, scale, options):
+        """Seed a camp of the given scale on an empty database and benchmark it"""
+        call_command('flush', interactive=False, verbosity=0)
+        user = get_user_model().objects.create_superuser('benchmark', 'benchmark@example.org', None)
+        volumes = {name: round(volume * scale) for name, volume in VOLUMES.items()}
+        rows = CampGenerator(volumes, seed=options['graine']).run()
+        self.stdout.write(f"Échelle {scale} : {rows['inscriptions']} inscriptions, {rows['activites']} activités, {rows['participants']} participants")
+
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        views = benchmark_views(client, max(1, options['repetitions']))
+        for label, measures in views.items():
+            style = self.style.SUCCESS if measures['status'] < 400 else self.style.ERROR
+            self.stdout.write(style(
+                f"  {label:24} [{measures['status']}] {measures['queries']:3} requête(s)  p50 {measures['p50_ms']:8.2f} ms  "
+                f"p95 {measures['p95_ms']:8.2f} ms  froid {measures['cold_ms']:8.2f} ms  {measures['peak_kib']:9.0f} Kio"
+            ))
+        return {'scale': scale, 'rows': rows, 'views': views}
+
+    def handle(self, *args, **options):
+        scales = self._scales(options['echelles'])
+        baseline = self._load_baseline(options['reference'])
+
+        # Camps are generated in the test database, the real one is left untouched
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            runs = [self._run(scale, options) for scale in scales]
+        finally:
+            request_logger.setLevel(level)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        results = {
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repetitions': options['repetitions'],
+            'seed': options['graine'],
+            'runs': runs,
+        }
+        Path(options['sortie']).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(f"Résultats enregistrés dans {options['sortie']}.")
+
+        if baseline is None:
+            return
+        regressions = compare(results, baseline, options['tolerance'])
+        for scale, label, message in regressions:
+            self.stdout.write(self.style.ERROR(f"Régression à l'échelle {scale}, {label} : {message}"))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence."))
+        elif options['strict']:
+            raise CommandError(f"{len(regressions)} régression(s) par rapport à {options['reference']}.")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.seeding import VOLUMES, CampGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un camp synthétique de grande taille (participants, activités, inscriptions, personnel, horaires, "
+        "infrastructures, matériel) pour les mesures de performance. Le résultat ne dépend que de la graine, de la date "
+        "de début et des volumes."
+    )
+
+    def add_arguments(self, parser):
+        for name, default in VOLUMES.items():
+            parser.add_argument(f'--{name}', type=int, metavar='N', help=f"Nombre de lignes (défaut : {default} × échelle)")
+        parser.add_argument('--echelle', type=float, default=1.0, help="Multiplie tous les volumes par défaut (défaut : 1)")
+        parser.add_argument('--graine', type=int, default=0, help="Graine du générateur aléatoire (défaut : 0)")
+        parser.add_argument('--debut', metavar='AAAA-MM-JJ', help="Premier jour de la saison (par défaut il y a six mois)")
+        parser.add_argument('--jours', type=int, default=365, help="Durée de la saison en jours (défaut : 365)")
+
+    def handle(self, *args, **options):
+        if options['echelle'] <= 0 or options['jours'] < 1:
+            raise CommandError("L'échelle et la durée de la saison doivent être positives.")
+
+        debut = None
+        if options['debut']:
+            try:
+                debut = parse_date(options['debut'])
+            except ValueError:
+                # Well formatted but impossible, like 2026-13-01
+                debut = None
+            if debut is None:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ.")
+
+        volumes = {}
+        for name, default in VOLUMES.items():
+            volume = options[name] if options[name] is not None else round(default * options['echelle'])
+            if volume < 0:
+                raise CommandError(f"Le nombre de {name} ne peut pas être négatif.")
+            volumes[name] = volume
+
+        generator = CampGenerator(volumes, seed=options['graine'], debut=debut, jours=options['jours'], log=self.stdout.write)
+        created = generator.run()
+        self.stdout.write(self.style.SUCCESS(f"{sum(created.values())} ligne(s) créée(s)."))
@@ -0,0 +1,100 @@
+import cProfile
+import logging
+import random
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import RepeatedQueriesError, instrument_templates, profile_request, record_queries
+
+
+logger = logging.getLogger('core.profiling')
+queries_logger = logging.getLogger('core.queries')
+
+
+class ProfilingMiddleware:
+    """Opt-in breakdown of each request into SQL, template and Python time.
+
+    Enabled by the REQUEST_PROFILING setting. The breakdown is sent back in
+    a Server-Timing header and logged on the core.profiling logger; a
+    REQUEST_PROFILING_SAMPLE_RATE fraction of the requests is also run under
+    cProfile, the stats being dumped to REQUEST_PROFILING_DIR.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0.0)
+        self.directory = Path(getattr(settings, 'REQUEST_PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+        instrument_templates()
+
+    def __call__(self, request):
+        profiler = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            profiler = cProfile.Profile()
+
+        with profile_request() as profile:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+
+        response['Server-Timing'] = profile.server_timing()
+        measures = profile.as_dict()
+        logger.info(
+            "%s %s %s total=%.1fms db=%.1fms queries=%d template=%.1fms python=%.1fms",
+            request.method, request.path, response.status_code, measures['total_ms'], measures['db_ms'],
+            measures['queries'], measures['template_ms'], measures['python_ms'],
+            extra={'profile': {'method': request.method, 'path': request.path, 'status': response.status_code, **measures}},
+        )
+        if profiler is not None:
+            self._dump(profiler, request, measures['total_ms'])
+        return response
+
+    def _dump(self, profiler, request, total_ms):
+        slug = re.sub(r'[^\w-]+', '-', request.path).strip('-') or 'index'
+        path = self.directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{slug[:80]}-{total_ms:.0f}ms.prof"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(path)
+        except OSError:
+            logger.exception("Impossible d'écrire le profil %s", path)
+
+
+class RepeatedQueriesMiddleware:
+    """Development check reporting the queries a request runs over and over.
+
+    Enabled by the DETECT_REPEATED_QUERIES setting. Queries are grouped by
+    fingerprint, the SQL without its values, and every fingerprint run at
+    least REPEATED_QUERIES_THRESHOLD times, the mark of a query per row of a
+    loop, is logged on the core.queries logger with the template line and
+    the project code that issued it. With REPEATED_QUERIES_RAISE the request
+    fails with a RepeatedQueriesError instead, which tests rely on.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DETECT_REPEATED_QUERIES', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'REPEATED_QUERIES_THRESHOLD', 3)
+        self.raise_error = getattr(settings, 'REPEATED_QUERIES_RAISE', False)
+
+    def __call__(self, request):
+        with record_queries() as log:
+            response = self.get_response(request)
+
+        report = log.report(self.threshold)
+        if report:
+            message = f"Requêtes répétées par {request.method} {request.path} :\n{report}"
+            if self.raise_error:
+                raise RepeatedQueriesError(message)
+            queries_logger.warning(message)
+        return response
@@ -0,0 +1,170 @@
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .pagination import CachedCountPaginator, KeysetPage, KeysetPaginator
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, date):
+        return ['d', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['dec', str(value)]
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, list):
+        kind, raw = value
+        return {'dt': parse_datetime, 'd': parse_date, 'dec': Decimal}[kind](raw)
+    return value
+
+
+def _value_of(obj, field):
+    """Value of an ordering field on an object, following select_related relations"""
+    for name in field.split('__'):
+        obj = obj.pk if name == 'pk' else getattr(obj, name)
+    return obj
+
+
+class CachedCountMixin:
+    """ListView mixin paginating with a CachedCountPaginator.
+
+    Counts are keyed by the filter parameters of the request, in any order
+    and without the empty ones nor those in count_ignored_params, and are
+    recounted after a write on one of count_models (the listed model by
+    default). The count_param parameter asks for an exact count.
+    """
+    paginator_class = CachedCountPaginator
+    count_models = None
+    count_param = 'total'
+    count_ignored_params = ('page', 'cursor', 'sort', 'total')
+
+    def get_count_params(self):
+        params = []
+        for key in sorted(self.request.GET):
+            if key in self.count_ignored_params:
+                continue
+            params.extend((key, value) for value in sorted(self.request.GET.getlist(key)) if value)
+        return params
+
+    def get_count_options(self, queryset):
+        return {
+            'scope': f'{type(self).__module__}.{type(self).__qualname__}',
+            'params': self.get_count_params(),
+            'models': self.count_models or [queryset.model],
+            'exact': bool(self.request.GET.get(self.count_param)),
+        }
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return super().get_paginator(
+            queryset, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+            **self.get_count_options(queryset), **kwargs,
+        )
+
+
+class KeysetPaginationMixin(CachedCountMixin):
+    """ListView mixin paginating on the last seen sort key instead of an OFFSET.
+
+    The ordering of the queryset, completed with the primary key in the
+    direction of its first field to make it unique, is read back from the
+    first or last row of a page and signed into an opaque cursor. The next
+    page is the rows sorting after it, so every page costs one indexed range
+    query whatever its depth. Ordering fields must not be NULL.
+
+    The total comes from count_rows, see CachedCountMixin.
+    """
+    cursor_param = 'cursor'
+    cursor_salt = 'core.keyset-cursor'
+
+    def get_keyset_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        if any(not isinstance(field, str) for field in ordering):
+            raise ImproperlyConfigured(f"{type(self).__name__} can only paginate on field name orderings.")
+        if not any(field.lstrip('-') in ('pk', queryset.model._meta.pk.name) for field in ordering):
+            # Same direction as the leading field, so an index can be read in one direction
+            ordering.append('-pk' if ordering and ordering[0].startswith('-') else 'pk')
+        return ordering
+
+    def _after(self, ordering, values):
+        """Q selecting the rows sorting strictly after values in ordering"""
+        condition = Q()
+        for position, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f"{field.lstrip('-')}__{lookup}": values[position]})
+            for previous, value in zip(ordering[:position], values):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    def _encode_cursor(self, direction, ordering, obj):
+        values = [_dump_value(_value_of(obj, field.lstrip('-'))) for field in ordering]
+        return signing.dumps({'d': direction, 'o': ordering, 'v': values}, salt=self.cursor_salt, compress=True)
+
+    def _decode_cursor(self, ordering):
+        """(direction, values) of the request cursor, None for the first page or a stale cursor"""
+        raw = self.request.GET.get(self.cursor_param)
+        if not raw:
+            return None
+        try:
+            cursor = signing.loads(raw, salt=self.cursor_salt)
+            values = [_load_value(value) for value in cursor['v']]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+        # A cursor made for another sort order starts over
+        if cursor.get('o') != ordering or cursor.get('d') not in ('next', 'previous') or len(values) != len(ordering):
+            return None
+        return cursor['d'], values
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_keyset_ordering(queryset)
+        queryset = queryset.order_by(*ordering)
+        cursor = self._decode_cursor(ordering)
+
+        page_rows = queryset
+        backwards = False
+        if cursor is not None:
+            direction, values = cursor
+            backwards = direction == 'previous'
+            if backwards:
+                reverse = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+                page_rows = queryset.filter(self._after(reverse, values)).order_by(*reverse)
+            else:
+                page_rows = queryset.filter(self._after(ordering, values))
+
+        rows = list(page_rows[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, cursor is not None
+
+        page = KeysetPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self._encode_cursor('next', ordering, rows[-1]) if has_next and rows else None,
+            previous_cursor=self._encode_cursor('previous', ordering, rows[0]) if has_previous and rows else None,
+        )
+        paginator = KeysetPaginator(queryset, page_size, **self.get_count_options(queryset))
+        return paginator, page, rows, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = [
+            (key, value) for key, value in self.request.GET.items()
+            if key not in (self.cursor_param, self.count_param)
+        ]
+        # Query string of the current filters, for the links of the pagination partial
+        context['pagination_query'] = urlencode(params)
+        context['show_total'] = bool(self.request.GET.get(self.count_param))
+        return context
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .utils import digits, fold
+
 class TimestampMixin(models.Model):
     """Mixin for adding timestamp fields to models"""
     created_at = models.DateTimeField(auto_now_add=True)
@@ -9,6 +11,32 @@ class TimestampMixin(models.Model):
     class Meta:
         abstract = True
 
+class NormalizedFieldsMixin(models.Model):
+    """Mixin keeping search keys derived from other fields up to date on save.
+
+    NORMALIZED_FIELDS maps each key field to its source field and to the
+    normalization applied, 'text' (accent-free lowercase) or 'phone' (digits).
+    """
+    NORMALIZED_FIELDS = {}
+    NORMALIZERS = {'text': fold, 'phone': digits}
+
+    class Meta:
+        abstract = True
+
+    def refresh_normalized_fields(self):
+        for field, (source, kind) in self.NORMALIZED_FIELDS.items():
+            setattr(self, field, self.NORMALIZERS[kind](getattr(self, source)))
+
+    def save(self, *args, **kwargs):
+        self.refresh_normalized_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            kwargs['update_fields'] = update_fields | {
+                field for field, (source, kind) in self.NORMALIZED_FIELDS.items() if source in update_fields
+            }
+        super().save(*args, **kwargs)
+
 class UserProfile(TimestampMixin):
     """Extended user profile with additional fields"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -0,0 +1,198 @@
+import hashlib
+from functools import cached_property
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections, transaction
+from django.utils import timezone
+
+
+KEY_PREFIX = 'core:list-count'
+
+# Seconds a count is kept when no write invalidates it first
+COUNT_TIMEOUT = 10 * 60
+
+# Below this many rows an unfiltered list is counted exactly, the estimate being too coarse
+ESTIMATE_THRESHOLD = 10000
+
+
+def _version_key(model):
+    return f'{KEY_PREFIX}:version:{model._meta.label_lower}'
+
+
+def get_count_version(model):
+    version = cache.get(_version_key(model))
+    if version is None:
+        cache.add(_version_key(model), 1, timeout=None)
+        version = cache.get(_version_key(model), 1)
+    return version
+
+
+def invalidate_counts(model):
+    """Mark every cached count of lists over a model as outdated.
+
+    The version is read back by every worker only when CACHES is shared, see core.checks.
+    """
+    key = _version_key(model)
+    if not cache.add(key, 2, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, timeout=None)
+
+
+def invalidate_counts_on_commit(model):
+    transaction.on_commit(lambda: invalidate_counts(model))
+
+
+def estimate_rows(model, using='default'):
+    """Row count of a model's table from the database statistics, None when unavailable"""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def count_rows(queryset, scope, params=(), models=None, exact=False):
+    """(count, approximate) of a list queryset.
+
+    Without any filter the table statistics are used for large tables. Other
+    counts are cached under the list scope, its filter params and the write
+    version of models, so any save or delete on one of them recounts.
+    """
+    queryset = queryset.order_by()
+    if not exact and not queryset.query.where:
+        estimate = estimate_rows(queryset.model, queryset.db)
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate, True
+
+    versions = '.'.join(str(get_count_version(model)) for model in models or [queryset.model])
+    # Relative date filters (today, this week, an age) move with the day
+    digest = hashlib.md5(f'{timezone.localdate()}?{urlencode(params)}'.encode()).hexdigest()
+    key = f'{KEY_PREFIX}:{scope}:{versions}:{digest}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count, False
+
+
+class CountMixin:
+    """Count of a paginator taken from count_rows"""
+
+    def _setup_count(self, scope, params=(), models=None, exact=False):
+        self._count_options = {'scope': scope, 'params': params, 'models': models, 'exact': exact}
+
+    @cached_property
+    def _counted(self):
+        return count_rows(self.object_list, **self._count_options)
+
+    @property
+    def count(self):
+        return self._counted[0]
+
+    @property
+    def is_approximate(self):
+        return self._counted[1]
+
+
+class ApproximatePage(Page):
+    """Page of a paginator whose total is an estimate: whether more rows follow was read, not computed"""
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self._has_more = has_more
+
+    def has_next(self):
+        return self._has_more
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class CachedCountPaginator(CountMixin, Paginator):
+    """Paginator counting with count_rows.
+
+    With an estimated total, the last pages may lie past num_pages: page
+    numbers are not bounded by it and each page reads one extra row to know
+    whether another one follows.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 scope='', params=(), models=None, exact=False):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self._setup_count(scope, params, models, exact)
+
+    def validate_number(self, number):
+        if not self.is_approximate:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.is_approximate:
+            return super().page(number)
+
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return ApproximatePage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+
+class KeysetPage:
+    """One page of a keyset paginated list"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator(CountMixin):
+    """Stand-in for Django's Paginator of keyset lists, whose total is only counted when displayed"""
+
+    def __init__(self, queryset, per_page, scope='', params=(), models=None, exact=False):
+        self.object_list = queryset
+        self.per_page = per_page
+        self._setup_count(scope, params, models, exact)
@@ -0,0 +1,187 @@
+import contextvars
+import os
+import re
+import sys
+import time
+from collections import Counter, OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+from django.template.base import Node
+
+from .audit import query_shape
+
+
+# RequestProfile of the request being served, None outside profiled requests
+_current = contextvars.ContextVar('core_request_profile', default=None)
+
+
+class RequestProfile:
+    """Time spent by one request in SQL, template rendering and Python code.
+
+    The three parts do not overlap: SQL run while a template renders, by a
+    lazy queryset, counts as SQL and not as rendering, and the Python time
+    is what remains of the total (view code and middlewares).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db = 0.0
+        self.queries = 0
+        self.template = 0.0
+        self._template_depth = 0
+        self._template_db = 0.0
+
+    def stop(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def python(self):
+        return max(0.0, self.total - self.db - self.template)
+
+    def execute(self, execute, sql, params, many, context):
+        """Connection execute wrapper adding up the time of every query"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def rendering(self):
+        """Time a template render, nested renders being part of the outermost one"""
+        self._template_depth += 1
+        started, db = time.perf_counter(), self.db
+        try:
+            yield
+        finally:
+            self._template_depth -= 1
+            if not self._template_depth:
+                self.template += time.perf_counter() - started - (self.db - db)
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total * 1000, 2),
+            'db_ms': round(self.db * 1000, 2),
+            'queries': self.queries,
+            'template_ms': round(self.template * 1000, 2),
+            'python_ms': round(self.python * 1000, 2),
+        }
+
+    def server_timing(self):
+        """Value of the Server-Timing header"""
+        return ', '.join([
+            f'db;dur={self.db * 1000:.1f};desc="SQL ({self.queries})"',
+            f'tpl;dur={self.template * 1000:.1f};desc="Templates"',
+            f'app;dur={self.python * 1000:.1f};desc="Python"',
+            f'total;dur={self.total * 1000:.1f}',
+        ])
+
+
+@contextmanager
+def profile_request():
+    """Collect a RequestProfile of the code run inside, on every database connection"""
+    profile = RequestProfile()
+    token = _current.set(profile)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.execute))
+            yield profile
+    finally:
+        profile.stop()
+        _current.reset(token)
+
+
+_template_render = Template.render
+
+
+def _profiled_render(self, context=None, request=None):
+    profile = _current.get()
+    if profile is None:
+        return _template_render(self, context, request)
+    with profile.rendering():
+        return _template_render(self, context, request)
+
+
+def instrument_templates():
+    """Route the renders of the Django template backend through the current RequestProfile"""
+    Template.render = _profiled_render
+
+
+# IN lists of any length, so a prefetch of 3 or 30 rows has the same fingerprint
+_IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """SQL without its literals nor the length of its IN lists"""
+    return _IN_LIST.sub('IN (...)', query_shape(sql))
+
+
+class RepeatedQueriesError(Exception):
+    """Raised by RepeatedQueriesMiddleware when REPEATED_QUERIES_RAISE is set"""
+
+
+def _location(frame):
+    """(template location, code location) of the innermost template node and project frame issuing a query"""
+    base = str(settings.BASE_DIR) + os.sep
+    template = code = None
+    while frame is not None and (template is None or code is None):
+        filename = frame.f_code.co_filename
+        if code is None and filename.startswith(base) and 'site-packages' not in filename and filename != __file__:
+            code = f"{os.path.relpath(filename, base)}:{frame.f_lineno}"
+        node = frame.f_locals.get('self')
+        # type() and not isinstance(), which would evaluate lazy objects like request.user
+        if template is None and issubclass(type(node), Node) and node.token is not None and getattr(node, 'origin', None):
+            template = f"{node.origin.template_name or node.origin.name}:{node.token.lineno}"
+        frame = frame.f_back
+    return template, code
+
+
+class QueryLog:
+    """Queries of one request grouped by fingerprint, with where each group was issued"""
+
+    def __init__(self):
+        self.fingerprints = OrderedDict()
+
+    def execute(self, execute, sql, params, many, context):
+        """Connection execute wrapper recording every query"""
+        entry = self.fingerprints.get(fingerprint(sql))
+        if entry is None:
+            entry = self.fingerprints[fingerprint(sql)] = {'sql': sql, 'params': Counter(), 'locations': Counter()}
+        entry['params'][repr(params)] += 1
+        entry['locations'][_location(sys._getframe(1))] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """[(fingerprint, entry)] of the queries run at least threshold times"""
+        return [
+            (key, entry) for key, entry in self.fingerprints.items()
+            if sum(entry['params'].values()) >= threshold
+        ]
+
+    def report(self, threshold):
+        """Text describing the repeated queries, empty when there are none"""
+        lines = []
+        for key, entry in self.repeated(threshold):
+            total = sum(entry['params'].values())
+            identical = total - len(entry['params'])
+            lines.append(f"{total}× ({identical} identique(s)) {key[:300]}")
+            for (template, code), count in entry['locations'].most_common(3):
+                where = ' → '.join(location for location in (template, code) if location) or 'origine inconnue'
+                lines.append(f"    {count}× depuis {where}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries():
+    """Collect a QueryLog of the code run inside, on every database connection"""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log.execute))
+        yield log
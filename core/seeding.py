@@ -0,0 +1,310 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from activities.models import Activite, ActiviteAnimateur, ActiviteMateriel, Inscription
+from dashboard import chart_cache, rollup, search, stats
+from infrastructure.models import Infrastructure, Materiel
+from participants.models import Participant
+from staff.models import Animateur, Responsable, StaffSchedule
+from .pagination import invalidate_counts
+from .utils import digits, fold
+
+
+PRENOMS = [
+    'Léa', 'Emma', 'Chloé', 'Manon', 'Camille', 'Inès', 'Jade', 'Louise', 'Zoé', 'Lina', 'Alice', 'Juliette',
+    'Lucas', 'Hugo', 'Louis', 'Nathan', 'Gabriel', 'Jules', 'Arthur', 'Raphaël', 'Adam', 'Théo', 'Noé', 'Éthan',
+]
+NOMS = [
+    'Martin', 'Bernard', 'Thomas', 'Petit', 'Robert', 'Richard', 'Durand', 'Dubois', 'Moreau', 'Laurent',
+    'Simon', 'Michel', 'Lefèvre', 'Leroy', 'Roux', 'David', 'Bertrand', 'Morel', 'Fournier', 'Girard',
+    'Bonnet', 'Dupont', 'Lambert', 'Fontaine', 'Rousseau', 'Vincent', 'Muller', 'Lefebvre', 'Faure', 'André',
+]
+ACTIVITES = [
+    'Escalade', 'Canoë', 'Tir à l\'arc', 'Poterie', 'Théâtre', 'Natation', 'Football', 'Randonnée', 'Cuisine',
+    'Peinture', 'Danse', 'Astronomie', 'Orientation', 'VTT', 'Photographie', 'Jardinage', 'Musique', 'Judo',
+]
+INFRASTRUCTURES = [('Gymnase', 'salle'), ('Piscine', 'piscine'), ('Terrain', 'terrain'), ('Atelier', 'salle'), ('Clairière', 'extérieur')]
+MATERIELS = ['Ballons', 'Cordes', 'Baudriers', 'Pagaies', 'Gilets', 'Arcs', 'Peinture', 'Argile', 'Boussoles', 'Casques']
+
+# Weekday weights of the activities, the camp is quieter on Sundays
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 1.0, 0.8, 0.4]
+DURATIONS = [(30, 1), (45, 2), (60, 5), (90, 4), (120, 3), (180, 1)]
+
+BATCH_SIZE = 5000
+
+# Default volumes, multiplied by the scale of the command
+VOLUMES = {
+    'participants': 100000,
+    'activites': 5000,
+    'inscriptions': 1000000,
+    'responsables': 40,
+    'animateurs': 400,
+    'horaires': 50000,
+    'infrastructures': 60,
+    'materiels': 300,
+}
+
+
+@contextmanager
+def _stored_dates(model, *names):
+    """Let bulk_create store the given values of auto_now_add fields instead of the current time"""
+    fields = [model._meta.get_field(name) for name in names]
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+def _insert(model, rows):
+    """bulk_create rows in batches, returns the primary keys of the new rows in order.
+
+    bulk_create does not return primary keys on MySQL, they are read back
+    from the rows above the largest key before the insert.
+    """
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+    return list(model.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True))
+
+
+class CampGenerator:
+    """Deterministic synthetic camp of given volumes over a season.
+
+    The same seed, start date and volumes give the same rows, only the dates
+    later than the current time being moved back to it. Rows
+    are written with bulk_create, so the fields save() derives (search keys,
+    date_fin, inscription counters) are computed here, and the derived
+    tables (rollup, search documents, dashboard snapshot) rebuilt at the end.
+    """
+
+    def __init__(self, volumes, seed=0, debut=None, jours=365, log=None):
+        self.volumes = volumes
+        self.rng = random.Random(seed)
+        self.debut = debut or timezone.localdate() - timedelta(days=jours // 2)
+        self.jours = jours
+        self.now = timezone.now()
+        self._log = log or (lambda message: None)
+        self._started = None
+
+    def _step(self, message):
+        elapsed = time.monotonic() - self._started
+        self._log(f"[{elapsed:7.1f} s] {message}")
+
+    def _person(self, model, number, **extra):
+        prenom, nom = self.rng.choice(PRENOMS), self.rng.choice(NOMS)
+        telephone = f"06 {self.rng.randrange(10**8):08d}"
+        telephone = f"{telephone[:5]} {telephone[5:7]} {telephone[7:9]} {telephone[9:]}"
+        return model(
+            nom=nom, prenom=prenom, telephone=telephone,
+            email=f"{fold(prenom).replace(' ', '')}.{fold(nom).replace(' ', '')}{number}@example.org",
+            nom_normalise=fold(nom), prenom_normalise=fold(prenom), telephone_normalise=digits(telephone),
+            **extra,
+        )
+
+    def staff(self):
+        responsables = _insert(Responsable, (
+            self._person(Responsable, number, date_embauche=self.debut - timedelta(days=self.rng.randrange(2000)))
+            for number in range(self.volumes['responsables'])
+        ))
+        animateurs = _insert(Animateur, (
+            self._person(Animateur, number) for number in range(self.volumes['animateurs'])
+        ))
+        return responsables, animateurs
+
+    def participants(self):
+        today = timezone.localdate()
+
+        def rows():
+            for number in range(self.volumes['participants']):
+                participant = self._person(
+                    Participant, number,
+                    date_naissance=self.debut - timedelta(days=self.rng.randrange(6 * 365, 17 * 365)),
+                    # Most families register in the weeks before the season starts
+                    date_inscription=min(today, self.debut + timedelta(days=int(self.rng.triangular(-150, self.jours, -20)))),
+                    has_authorization=self.rng.random() < 0.9,
+                )
+                participant.emergency_contact_name = f"{self.rng.choice(PRENOMS)} {participant.nom}"
+                yield participant
+
+        with _stored_dates(Participant, 'date_inscription'):
+            return _insert(Participant, rows())
+
+    def venues(self):
+        infrastructures = _insert(Infrastructure, (
+            Infrastructure(nom=f"{nom} {number + 1}", type=kind, capacite=self.rng.choice([15, 20, 30, 40, 60]))
+            for number, (nom, kind) in ((number, self.rng.choice(INFRASTRUCTURES)) for number in range(self.volumes['infrastructures']))
+        ))
+        materiels = _insert(Materiel, (
+            Materiel(nom=f"{self.rng.choice(MATERIELS)} {number + 1}", quantite_disponible=self.rng.randrange(5, 80))
+            for number in range(self.volumes['materiels'])
+        ))
+        return infrastructures, materiels
+
+    def _inscription_counts(self, activites, participants):
+        """Number of inscriptions of each activity, a few popular ones taking most of them"""
+        weights = [self.rng.paretovariate(1.5) for _ in range(activites)]
+        total = sum(weights)
+        wanted = min(self.volumes['inscriptions'], activites * participants)
+        counts = [min(participants, int(wanted * weight / total)) for weight in weights]
+        # Spread what the rounding and the caps left over
+        missing = wanted - sum(counts)
+        position = 0
+        while missing > 0:
+            index = position % activites
+            if counts[index] < participants:
+                extra = min(missing, participants - counts[index], max(1, missing // activites))
+                counts[index] += extra
+                missing -= extra
+            position += 1
+        return counts
+
+    def _activity_start(self):
+        while True:
+            day = self.debut + timedelta(days=self.rng.randrange(self.jours))
+            if self.rng.random() < WEEKDAY_WEIGHTS[day.weekday()]:
+                break
+        slot = self.rng.randrange(8 * 2, 19 * 2)
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(minutes=30 * slot))
+
+    def activities(self, responsables, infrastructures, participant_count):
+        """Create the activities, returns [(pk, start, inscription plan)]"""
+        counts = self._inscription_counts(self.volumes['activites'], participant_count)
+        durations = [duration for duration, weight in DURATIONS for _ in range(weight)]
+        plans = []
+        rows = []
+        for count in counts:
+            start = self._activity_start()
+            duree = self.rng.choice(durations)
+            capacite = None if self.rng.random() < 0.1 else max(10, int(count * self.rng.uniform(0.8, 1.2)) // 5 * 5)
+
+            # Status of each inscription: a few cancelled, the rest waiting past the capacity
+            statuts = []
+            seated = 0
+            for _ in range(count):
+                if self.rng.random() < 0.05:
+                    statuts.append('annule')
+                elif capacite is None or seated < capacite:
+                    statuts.append('inscrit')
+                    seated += 1
+                else:
+                    statuts.append('en_attente')
+            plans.append((start, statuts))
+
+            nom = self.rng.choice(ACTIVITES)
+            rows.append(Activite(
+                nom=nom, nom_normalise=fold(nom), duree=duree, date_debut=start, date_fin=start + timedelta(minutes=duree),
+                capacite_max=capacite, annulee=self.rng.random() < 0.02,
+                responsable_id=self.rng.choice(responsables) if responsables else None,
+                infrastructure_id=self.rng.choice(infrastructures) if infrastructures and self.rng.random() < 0.8 else None,
+                nb_inscrits=statuts.count('inscrit'), nb_en_attente=statuts.count('en_attente'), nb_annules=statuts.count('annule'),
+            ))
+        pks = _insert(Activite, rows)
+        return [(pk, start, statuts) for pk, (start, statuts) in zip(pks, plans)]
+
+    def assignments(self, activities, animateurs, materiels):
+        def staffing():
+            for pk, _, _ in activities:
+                for animateur in self.rng.sample(animateurs, min(len(animateurs), self.rng.choice([1, 1, 2, 3]))):
+                    yield ActiviteAnimateur(activite_id=pk, animateur_id=animateur)
+
+        def equipment():
+            for pk, _, _ in activities:
+                for materiel in self.rng.sample(materiels, min(len(materiels), self.rng.choice([0, 1, 1, 2, 3]))):
+                    yield ActiviteMateriel(activite_id=pk, materiel_id=materiel, quantite_requise=self.rng.randrange(1, 10))
+
+        return len(_insert(ActiviteAnimateur, staffing())), len(_insert(ActiviteMateriel, equipment()))
+
+    def inscriptions(self, activities, participants):
+        def rows():
+            for pk, start, statuts in activities:
+                past = start < self.now
+                for participant, statut in zip(self.rng.sample(participants, len(statuts)), statuts):
+                    # Registrations come in the days before the activity
+                    registered = min(self.now, start - timedelta(minutes=int(self.rng.expovariate(1 / (10 * 24 * 60)))))
+                    attended = self.rng.random() < 0.9
+                    yield Inscription(
+                        participant_id=participant, activite_id=pk, statut=statut, date_inscription=registered,
+                        a_participe=past and statut == 'inscrit' and attended,
+                    )
+
+        with _stored_dates(Inscription, 'date_inscription'):
+            return len(_insert(Inscription, rows()))
+
+    def schedules(self, responsables, animateurs):
+        staff = [('responsable_id', pk) for pk in responsables] + [('animateur_id', pk) for pk in animateurs]
+        if not staff:
+            return 0
+
+        def rows():
+            for _ in range(self.volumes['horaires']):
+                field, pk = self.rng.choice(staff)
+                day = self.debut + timedelta(days=self.rng.randrange(self.jours))
+                start = self.rng.choice([7, 8, 9, 13, 14])
+                yield StaffSchedule(
+                    **{field: pk}, date=day,
+                    start_time=datetime.min.time().replace(hour=start),
+                    end_time=datetime.min.time().replace(hour=min(23, start + self.rng.choice([4, 6, 8]))),
+                )
+
+        return len(_insert(StaffSchedule, rows()))
+
+    def rebuild_derived(self):
+        """Rebuild what the model signals maintain, bulk_create having skipped them"""
+        rollup.backfill()
+        self._step("Comptages journaliers reconstruits")
+        search.rebuild()
+        self._step("Index de recherche reconstruit")
+        stats.refresh_snapshot()
+        for chart in ('participants', 'activities', 'inscriptions', 'materials'):
+            chart_cache.invalidate(chart)
+        for model in (Participant, Activite, Inscription, Responsable, Animateur, Infrastructure, Materiel, StaffSchedule):
+            invalidate_counts(model)
+        self._step("Statistiques et caches du tableau de bord rafraîchis")
+
+    def run(self):
+        """Generate the whole camp, returns {name: number of rows}"""
+        self._started = time.monotonic()
+        created = {}
+        with transaction.atomic():
+            responsables, animateurs = self.staff()
+            created.update(responsables=len(responsables), animateurs=len(animateurs))
+            self._step(f"{len(responsables)} responsables et {len(animateurs)} animateurs")
+
+            participants = self.participants()
+            created['participants'] = len(participants)
+            self._step(f"{len(participants)} participants")
+
+            infrastructures, materiels = self.venues()
+            created.update(infrastructures=len(infrastructures), materiels=len(materiels))
+            self._step(f"{len(infrastructures)} infrastructures et {len(materiels)} matériels")
+
+            activities = self.activities(responsables, infrastructures, len(participants))
+            created['activites'] = len(activities)
+            self._step(f"{len(activities)} activités")
+
+            created['animateurs_activites'], created['materiels_activites'] = self.assignments(activities, animateurs, materiels)
+            self._step(f"{created['animateurs_activites']} affectations d'animateurs et {created['materiels_activites']} de matériel")
+
+            created['inscriptions'] = self.inscriptions(activities, participants)
+            self._step(f"{created['inscriptions']} inscriptions")
+
+            created['horaires'] = self.schedules(responsables, animateurs)
+            self._step(f"{created['horaires']} horaires")
+
+        self.rebuild_derived()
+        return created
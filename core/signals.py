@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .pagination import invalidate_counts_on_commit
+
+
+# Apps whose lists have their counts cached
+COUNTED_APPS = {'activities', 'participants', 'staff', 'infrastructure'}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def list_rows_changed(sender, **kwargs):
+    if sender._meta.app_label in COUNTED_APPS:
+        invalidate_counts_on_commit(sender)
@@ -0,0 +1,301 @@
+import datetime
+import json
+from collections import namedtuple
+from importlib import import_module
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.template import TemplateDoesNotExist
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from activities.ics import feed_token
+from activities.models import Activite, ActiviteAnimateur, ActiviteMateriel, Inscription, SerieActivite
+from dashboard import autocomplete, search
+from infrastructure.models import Infrastructure, InfrastructureReservation, Materiel
+from participants.models import Participant, ParticipantFile
+from staff.models import Animateur, Responsable, StaffSchedule
+from .profiling import RepeatedQueriesError
+
+
+# Most queries a page may run, with the url kwargs, query parameters and JSON body built from a
+# CampData. Pages with a body are POSTed, the other ones fetched with a GET.
+Budget = namedtuple('Budget', 'max_queries kwargs query body', defaults=(None, None, None))
+
+
+class CampData:
+    """One object of each kind, with add_rows() hanging more rows on them"""
+
+    def __init__(self):
+        now = timezone.now()
+        week_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start -= datetime.timedelta(days=week_start.weekday())
+        self.window = {'start': week_start.isoformat(), 'end': (week_start + datetime.timedelta(days=7)).isoformat()}
+        self._day = 0
+
+        self.responsable = Responsable.objects.create(nom='Durand', prenom='Claire', email='claire.durand@example.org')
+        self.animateur = Animateur.objects.create(nom='Martin', prenom='Hugo', email='hugo.martin@example.org')
+        self.infrastructure = Infrastructure.objects.create(nom='Gymnase', type='salle', capacite=40)
+        self.materiel = Materiel.objects.create(nom='Ballons', quantite_disponible=20)
+        self.participant = Participant.objects.create(nom='Petit', prenom='Léa', date_naissance=datetime.date(2014, 5, 2))
+        self.participants = [self.participant]
+        self.serie = SerieActivite.objects.create(
+            nom='Escalade', date_debut=week_start.date(), date_fin=week_start.date() + datetime.timedelta(days=28), jours='0,2',
+        )
+        self.activite = Activite.objects.create(
+            nom='Escalade', duree=90, date_debut=now + datetime.timedelta(days=1), capacite_max=30,
+            responsable=self.responsable, infrastructure=self.infrastructure, serie=self.serie,
+        )
+        # Not part of a series, so it can be repeated as one
+        self.activite_seule = Activite.objects.create(
+            nom='Poterie', duree=60, date_debut=now + datetime.timedelta(days=2), capacite_max=30, responsable=self.responsable,
+        )
+        self.inscription = Inscription.objects.create(participant=self.participant, activite=self.activite)
+        self.activite_animateur = ActiviteAnimateur.objects.create(activite=self.activite, animateur=self.animateur)
+        self.activite_materiel = ActiviteMateriel.objects.create(activite=self.activite, materiel=self.materiel)
+        self.participant_file = ParticipantFile.objects.create(participant=self.participant, title='Fiche sanitaire', file='participant_files/fiche.pdf')
+        self.reservation = InfrastructureReservation.objects.create(
+            infrastructure=self.infrastructure, date_debut=now, date_fin=now + datetime.timedelta(hours=2),
+            motif='Réunion', responsable='Claire Durand',
+        )
+        self.schedule = StaffSchedule.objects.create(
+            animateur=self.animateur, date=timezone.localdate(), start_time=datetime.time(9), end_time=datetime.time(17),
+        )
+
+    def add_rows(self, count):
+        """Add count rows of every kind related to the objects of the dataset"""
+        now = timezone.now()
+        for _ in range(count):
+            self._day += 1
+            day = self._day
+            start = now + datetime.timedelta(days=day % 6 - 2, hours=day)
+
+            participant = Participant.objects.create(
+                nom=f'Moreau{day}', prenom='Jules', date_naissance=datetime.date(2012, 1, 1) + datetime.timedelta(days=day),
+            )
+            self.participants.append(participant)
+            activite = Activite.objects.create(
+                nom=f'Atelier {day}', duree=60, date_debut=start, capacite_max=20,
+                responsable=self.responsable, infrastructure=self.infrastructure if day % 2 else None, serie=self.serie,
+            )
+            animateur = Animateur.objects.create(nom=f'Bernard{day}', prenom='Nina', email=f'nina{day}@example.org')
+            materiel = Materiel.objects.create(nom=f'Matériel {day}', quantite_disponible=day % 4)
+            Responsable.objects.create(nom=f'Roux{day}', prenom='Paul', email=f'paul{day}@example.org')
+            Infrastructure.objects.create(nom=f'Salle {day}', type='salle', capacite=20)
+
+            Inscription.objects.create(participant=participant, activite=self.activite)
+            Inscription.objects.create(participant=self.participant, activite=activite)
+            Inscription.objects.create(participant=participant, activite=activite, statut='en_attente')
+            ActiviteAnimateur.objects.create(activite=activite, animateur=self.animateur)
+            ActiviteAnimateur.objects.create(activite=self.activite, animateur=animateur)
+            ActiviteMateriel.objects.create(activite=activite, materiel=self.materiel)
+            ActiviteMateriel.objects.create(activite=self.activite, materiel=materiel)
+            ParticipantFile.objects.create(participant=self.participant, title=f'Document {day}', file=f'participant_files/doc{day}.pdf')
+            InfrastructureReservation.objects.create(
+                infrastructure=self.infrastructure, date_debut=start, date_fin=start + datetime.timedelta(hours=1),
+                motif=f'Réservation {day}', responsable='Claire Durand',
+            )
+            StaffSchedule.objects.create(
+                animateur=self.animateur, date=start.date(), start_time=datetime.time(8), end_time=datetime.time(12),
+            )
+            StaffSchedule.objects.create(
+                responsable=self.responsable, date=start.date(), start_time=datetime.time(13), end_time=datetime.time(18),
+            )
+
+
+def _pk(name):
+    """Url kwargs of the page of one object of the CampData"""
+    return lambda data: {'pk': getattr(data, name).pk}
+
+
+# Budget of every page, by urls module
+BUDGETS = {
+    'activities.urls': {
+        'list': Budget(6),
+        'add': Budget(7),
+        'detail': Budget(10, _pk('activite')),
+        'update': Budget(8, _pk('activite')),
+        'delete': Budget(5, _pk('activite')),
+        'add_animateur': Budget(9, _pk('activite')),
+        'add_materiel': Budget(7, _pk('activite')),
+        'delete_animateur': Budget(5, _pk('activite_animateur')),
+        'delete_materiel': Budget(5, _pk('activite_materiel')),
+        'serie_add': Budget(4, _pk('activite_seule')),
+        'serie_update': Budget(9, _pk('serie')),
+        'serie_delete': Budget(5, _pk('serie')),
+        'inscription_list': Budget(5),
+        'inscription_add': Budget(4),
+        'inscription_update': Budget(6, _pk('inscription')),
+        'inscription_delete': Budget(5, _pk('inscription')),
+        'quick_inscription': Budget(4),
+        'quick_inscription_participant': Budget(7, lambda data: {'participant_id': data.participant.pk}),
+        'quick_inscription_activity': Budget(7, lambda data: {'activity_id': data.activite.pk}),
+        'bulk_inscription': Budget(5, _pk('activite')),
+        'participant_activities': Budget(5, _pk('participant')),
+        'check_capacity': Budget(1, _pk('activite')),
+        'bulk_inscription_api': Budget(16, _pk('activite_seule'), body=lambda data: {
+            'participant_ids': [participant.pk for participant in data.participants],
+        }),
+        'calendar_feed': Budget(2, lambda data: {
+            'kind': 'animateur', 'pk': data.animateur.pk, 'token': feed_token('animateur', data.animateur.pk),
+        }),
+    },
+    'participants.urls': {
+        'list': Budget(5),
+        'add': Budget(4),
+        'detail': Budget(7, _pk('participant')),
+        'update': Budget(5, _pk('participant')),
+        'delete': Budget(5, _pk('participant')),
+        'add_file': Budget(6, _pk('participant')),
+        'delete_file': Budget(5, _pk('participant_file')),
+        'activities_json': Budget(2, _pk('participant'), lambda data: data.window),
+    },
+    'staff.urls': {
+        'list': Budget(7),
+        'dashboard': Budget(8),
+        'responsable_detail': Budget(5, _pk('responsable')),
+        'responsable_add': Budget(4),
+        'responsable_update': Budget(5, _pk('responsable')),
+        'responsable_delete': Budget(5, _pk('responsable')),
+        'animateur_detail': Budget(5, _pk('animateur')),
+        'animateur_add': Budget(4),
+        'animateur_update': Budget(5, _pk('animateur')),
+        'animateur_delete': Budget(5, _pk('animateur')),
+        'add_schedule': Budget(6, lambda data: {'staff_type': 'animateur', 'pk': data.animateur.pk}),
+        'delete_schedule': Budget(5, _pk('schedule')),
+        'timetable': Budget(10, query=lambda data: {'apercu': '1'}),
+        'activities_json': Budget(3, lambda data: {'staff_type': 'animateur', 'pk': data.animateur.pk}, lambda data: data.window),
+        'available_animateurs': Budget(4, query=lambda data: data.window),
+    },
+    'infrastructure.urls': {
+        'list': Budget(5),
+        'add': Budget(4),
+        'detail': Budget(5, _pk('infrastructure')),
+        'update': Budget(5, _pk('infrastructure')),
+        'delete': Budget(5, _pk('infrastructure')),
+        'reserve': Budget(6, _pk('infrastructure')),
+        'delete_reservation': Budget(5, _pk('reservation')),
+        'materiel_list': Budget(7),
+        'materiel_add': Budget(4),
+        'materiel_detail': Budget(5, _pk('materiel')),
+        'materiel_update': Budget(5, _pk('materiel')),
+        'materiel_delete': Budget(5, _pk('materiel')),
+        'materiel_demand': Budget(4, _pk('materiel')),
+        'check_availability': Budget(4, query=lambda data: {'infrastructure': data.infrastructure.pk, **data.window}),
+        'events_json': Budget(5, _pk('infrastructure'), lambda data: data.window),
+    },
+    'dashboard.urls': {
+        'index': Budget(4),
+        'search': Budget(6, query=lambda data: {'q': 'mar'}),
+        'autocomplete': Budget(5, query=lambda data: {'q': 'mar'}),
+        'participants_chart': Budget(3),
+        'inscriptions_chart': Budget(3, query=lambda data: {'activite': data.activite.pk}),
+        'activities_chart': Budget(3),
+        'materials_chart': Budget(3),
+        'chart_cache_stats': Budget(2),
+    },
+}
+
+
+class QueryBudgetMixin:
+    """TestCase mixin rendering every URL of the urls modules of budgets within its Budget.
+
+    Each page is rendered on a small dataset, then again once more rows hang
+    on the same objects: it must stay within max_queries and run exactly as
+    many queries both times, so a query per row fails the test. Failures
+    list the SQL of the page. Pages whose template is missing are skipped.
+
+    Every page is also rendered with RepeatedQueriesMiddleware raising, so a
+    query repeated per row of a template loop fails with its template line.
+    """
+    budgets = BUDGETS
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('budget', 'budget@example.org', 'motdepasse')
+        cls.data = CampData()
+        cls.data.add_rows(2)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _pages(self):
+        """(namespaced url name, Budget) of every page"""
+        for urls_module, budgets in self.budgets.items():
+            namespace = import_module(urls_module).app_name
+            for name, budget in budgets.items():
+                yield f'{namespace}:{name}', budget
+
+    def _fetch(self, client, name, budget):
+        url = reverse(name, kwargs=budget.kwargs(self.data) if budget.kwargs else None)
+        if budget.body:
+            return client.post(url, json.dumps(budget.body(self.data)), content_type='application/json')
+        return client.get(url, budget.query(self.data) if budget.query else {})
+
+    def _queries(self, name, budget):
+        """SQL run by a request of the page with cold caches, None when its template is missing"""
+        cache.clear()
+        with transaction.atomic(), \
+                mock.patch.object(autocomplete, '_autocomplete', autocomplete.AutocompleteIndex()), \
+                mock.patch.dict(search._index, {'stamp': None, 'index': None}):
+            with CaptureQueriesContext(connection) as queries:
+                try:
+                    response = self._fetch(self.client, name, budget)
+                except TemplateDoesNotExist:
+                    return None
+            # Undo what a POST wrote, so every render starts from the same rows
+            if budget.body:
+                transaction.set_rollback(True)
+        # A redirect or an error would measure another page
+        self.assertEqual(response.status_code, 200, f"{name} : réponse {response.status_code}")
+        return [query['sql'] for query in queries.captured_queries]
+
+    def _listing(self, queries):
+        return '\n'.join(f'  {number}. {sql}' for number, sql in enumerate(queries, 1))
+
+    def test_every_url_has_a_budget(self):
+        for urls_module, budgets in self.budgets.items():
+            names = {pattern.name for pattern in import_module(urls_module).urlpatterns}
+            self.assertEqual(sorted(names - set(budgets)), [], f"URL sans budget de requêtes dans {urls_module}")
+
+    def test_pages_stay_within_budget(self):
+        pages = list(self._pages())
+        # A first render fills what pages store in the database, like the dashboard snapshot
+        for name, budget in pages:
+            self._queries(name, budget)
+
+        before = {name: self._queries(name, budget) for name, budget in pages}
+        self.data.add_rows(3)
+
+        for name, budget in pages:
+            with self.subTest(url=name):
+                queries = self._queries(name, budget)
+                if queries is None or before[name] is None:
+                    self.skipTest("Gabarit manquant")
+                self.assertLessEqual(
+                    len(queries), budget.max_queries,
+                    f"{name} : {len(queries)} requêtes pour un budget de {budget.max_queries}\n{self._listing(queries)}",
+                )
+                self.assertEqual(
+                    len(queries), len(before[name]),
+                    f"{name} : {len(before[name])} puis {len(queries)} requêtes avec plus de lignes\n{self._listing(queries)}",
+                )
+
+    def test_pages_do_not_repeat_queries(self):
+        with self.settings(DETECT_REPEATED_QUERIES=True, REPEATED_QUERIES_RAISE=True):
+            # Middlewares are loaded by the first request of a client
+            client = Client()
+            client.force_login(self.user)
+            for name, budget in self._pages():
+                with self.subTest(url=name):
+                    cache.clear()
+                    try:
+                        self._fetch(client, name, budget)
+                    except TemplateDoesNotExist:
+                        continue
+                    except RepeatedQueriesError as error:
+                        self.fail(str(error))
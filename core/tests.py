@@ -1,3 +1,503 @@
-from django.test import TestCase
+import datetime
+import re
+import tempfile
+from io import StringIO
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.template import Context, Template
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.views.generic import ListView
+
+from activities.models import Activite, ActiviteAnimateur, ActiviteMateriel, Inscription
+from activities.registration import register_group
+from activities.views import ActiviteListView
+from infrastructure.models import Infrastructure, Materiel
+from participants.models import Participant
+from staff.models import Animateur, Responsable, StaffSchedule
+
+from . import pagination
+from .audit import audited_urls, explain
+from .benchmark import compare, percentile
+from .checks import check_shared_cache
+from .mixins import CachedCountMixin
+from .models import UserProfile
+from .profiling import fingerprint, record_queries
+from .seeding import CampGenerator
+from .testing import QueryBudgetMixin
+from .utils import IntervalIndex, overlapping_pairs
+
+
+class UserAdminQueryTest(TestCase):
+    """The role column of the user changelist does not query once per user"""
+
+    def _add_users(self, count):
+        for number in range(User.objects.count(), User.objects.count() + count):
+            user = User.objects.create_user(f'user{number}', f'user{number}@example.org', 'motdepasse')
+            UserProfile.objects.create(user=user, role='staff')
+
+    def _changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:auth_user_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_users(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.org', 'motdepasse'))
+        self._add_users(2)
+        before = self._changelist_queries()
+        self._add_users(5)
+        self.assertEqual(self._changelist_queries(), before)
+
+
+class BenchmarkCompareTest(SimpleTestCase):
+    """Regressions flagged by the benchmark_views command against its baseline"""
+
+    def _results(self, **measures):
+        view = {'status': 200, 'queries': 5, 'p95_ms': 20.0, 'peak_kib': 300.0, **measures}
+        return {'runs': [{'scale': 0.1, 'views': {'activites': view}}]}
+
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3], 100), 3)
+        self.assertIsNone(percentile([], 95))
+
+    def test_same_measures_do_not_regress(self):
+        self.assertEqual(compare(self._results(), self._results()), [])
+
+    def test_noise_within_tolerance_is_ignored(self):
+        self.assertEqual(compare(self._results(p95_ms=23.0, peak_kib=350.0), self._results()), [])
+
+    def test_regressions_are_flagged(self):
+        regressions = compare(self._results(queries=6, p95_ms=30.0, peak_kib=400.0, status=500), self._results())
+        self.assertEqual(len(regressions), 4)
+        self.assertTrue(all(scale == 0.1 and label == 'activites' for scale, label, _ in regressions))
+
+    def test_sizes_missing_from_baseline_are_skipped(self):
+        baseline = {'runs': [{'scale': 0.5, 'views': self._results()['runs'][0]['views']}]}
+        self.assertEqual(compare(self._results(queries=50), baseline), [])
+
+
+@override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_SAMPLE_RATE=0.0)
+class ProfilingMiddlewareTest(TestCase):
+    """Server-Timing breakdown and cProfile samples of the profiling middleware"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.org', 'motdepasse'))
+
+    def _timings(self, response):
+        return {
+            name: (float(duration), description)
+            for name, duration, description in re.findall(r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', response['Server-Timing'])
+        }
+
+    def test_server_timing_breaks_down_the_request(self):
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('core.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('dashboard:index'))
+        timings = self._timings(response)
+        self.assertEqual(set(timings), {'db', 'tpl', 'app', 'total'})
+        self.assertEqual(timings['db'][1], f'SQL ({len(queries)})')
+        self.assertGreater(timings['tpl'][0], 0)
+        self.assertAlmostEqual(timings['db'][0] + timings['tpl'][0] + timings['app'][0], timings['total'][0], delta=0.5)
+        self.assertEqual(logs.records[0].profile['queries'], len(queries))
+        self.assertEqual(logs.records[0].profile['path'], reverse('dashboard:index'))
+
+    def test_sampled_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(REQUEST_PROFILING_SAMPLE_RATE=1.0, REQUEST_PROFILING_DIR=directory), \
+                self.assertLogs('core.profiling', 'INFO'):
+            self.client.get(reverse('dashboard:index'))
+            dumps = list(Path(directory).glob('*-GET-dashboard-*.prof'))
+        self.assertEqual(len(dumps), 1)
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('dashboard:index'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class RepeatedQueriesTest(TestCase):
+    """Fingerprints and origins of the queries reported by RepeatedQueriesMiddleware"""
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND nom = 'a' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND nom = 'b' LIMIT 1"),
+        )
+
+    def test_queries_in_a_template_loop_are_located(self):
+        users = [User.objects.create_user(f'user{number}') for number in range(3)]
+        template = Template("{% for user in users %}{{ user.profile }}{% endfor %}")
+        with record_queries() as log:
+            template.render(Context({'users': users}))
+
+        [(_, entry)] = log.repeated(3)
+        self.assertEqual(sum(entry['params'].values()), 3)
+        [(template_location, code_location)] = entry['locations']
+        self.assertTrue(template_location.endswith(':1'))
+
+    @override_settings(DETECT_REPEATED_QUERIES=True, REPEATED_QUERIES_THRESHOLD=3)
+    def test_middleware_logs_repeated_queries(self):
+        user = User.objects.create_superuser('admin', 'admin@example.org', 'motdepasse')
+        self.client.force_login(user)
+        with self.assertNoLogs('core.queries', 'WARNING'):
+            self.client.get(reverse('dashboard:index'))
+        with self.settings(REPEATED_QUERIES_THRESHOLD=1), self.assertLogs('core.queries', 'WARNING') as logs:
+            # Middlewares, with their settings, are loaded by the first request of a client
+            client = Client()
+            client.force_login(user)
+            client.get(reverse('dashboard:index'))
+        self.assertIn('depuis', logs.output[0])
+
+
+class ParticipantCountListView(CachedCountMixin, ListView):
+    model = Participant
+    paginate_by = 10
+
+
+class CachedCountTest(TestCase):
+    """Counts of paginated lists from count_rows and CachedCountPaginator"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self._add_participants(25)
+
+    def _add_participants(self, count):
+        start = Participant.objects.count()
+        for number in range(start, start + count):
+            Participant.objects.create(nom=f'Nom{number}', prenom='Léa', date_naissance=datetime.date(2014, 1, 1))
+
+    def _count(self, queryset=None, params=(), **options):
+        return pagination.count_rows(queryset if queryset is not None else Participant.objects.all(), 'test', params, **options)
+
+    def _paginator(self, query=''):
+        view = ParticipantCountListView()
+        view.setup(RequestFactory().get(f'/liste/?{query}'))
+        queryset = view.get_queryset()
+        return view.get_paginator(queryset, view.paginate_by)
+
+    def test_large_unfiltered_tables_use_the_estimate(self):
+        with mock.patch.object(pagination, 'estimate_rows', return_value=pagination.ESTIMATE_THRESHOLD) as estimate:
+            self.assertEqual(self._count(), (pagination.ESTIMATE_THRESHOLD, True))
+            self.assertEqual(self._count(exact=True), (25, False))
+            self.assertEqual(self._count(Participant.objects.filter(nom__startswith='Nom1'), [('q', 'nom1')]), (11, False))
+        estimate.assert_called_once()
+
+    def test_small_or_unknown_estimates_are_counted(self):
+        for estimate in (pagination.ESTIMATE_THRESHOLD - 1, None):
+            cache.clear()
+            with self.subTest(estimate=estimate), mock.patch.object(pagination, 'estimate_rows', return_value=estimate):
+                self.assertEqual(self._count(), (25, False))
+
+    def test_counts_are_cached_by_params(self):
+        queryset = Participant.objects.filter(nom__startswith='Nom1')
+        self.assertEqual(self._count(queryset, [('q', 'nom1')]), (11, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(self._count(queryset, [('q', 'nom1')]), (11, False))
+        with self.assertNumQueries(1):
+            self._count(queryset, [('q', 'nom2')])
+
+    def test_count_params_are_normalized(self):
+        view = ParticipantCountListView()
+        view.setup(RequestFactory().get('/liste/?sort=nom&q=lea&page=3&vide=&age=8&age=10'))
+        other = ParticipantCountListView()
+        other.setup(RequestFactory().get('/liste/?age=10&q=lea&age=8&cursor=abc'))
+
+        self.assertEqual(view.get_count_params(), [('age', '10'), ('age', '8'), ('q', 'lea')])
+        self.assertEqual(view.get_count_params(), other.get_count_params())
+
+    def test_saves_recount(self):
+        self.assertEqual(self._count(), (25, False))
+        with self.captureOnCommitCallbacks(execute=True):
+            self._add_participants(1)
+        self.assertEqual(self._count(), (26, False))
+
+    def test_bulk_registration_recounts(self):
+        activite = Activite.objects.create(nom='Canoë', duree=60, date_debut=timezone.now() + datetime.timedelta(days=1))
+        inscriptions = Inscription.objects.all()
+        self.assertEqual(self._count(inscriptions), (0, False))
+        with self.captureOnCommitCallbacks(execute=True):
+            register_group(activite, Participant.objects.values_list('pk', flat=True)[:3])
+        self.assertEqual(self._count(inscriptions), (3, False))
+
+    def test_approximate_pages_go_past_the_estimate(self):
+        with mock.patch.object(pagination, 'ESTIMATE_THRESHOLD', 5), mock.patch.object(pagination, 'estimate_rows', return_value=5):
+            paginator = self._paginator()
+            self.assertTrue(paginator.is_approximate)
+            self.assertEqual(paginator.num_pages, 1)
+
+            second = paginator.page(2)
+            self.assertTrue(second.has_next())
+            self.assertEqual((second.start_index(), second.end_index()), (11, 20))
+            last = paginator.page(3)
+            self.assertFalse(last.has_next())
+            self.assertEqual(len(last), 5)
+            with self.assertRaises(EmptyPage):
+                paginator.page(4)
+
+    def test_total_parameter_asks_for_an_exact_count(self):
+        with mock.patch.object(pagination, 'estimate_rows', return_value=pagination.ESTIMATE_THRESHOLD):
+            self.assertTrue(self._paginator().is_approximate)
+            paginator = self._paginator('total=1')
+            self.assertFalse(paginator.is_approximate)
+            self.assertEqual((paginator.count, paginator.num_pages), (25, 3))
+
+
+class KeysetPaginationTest(TestCase):
+    """Signed cursors of KeysetPaginationMixin, exercised through ActiviteListView"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.org', 'motdepasse')
+        start = timezone.now() + datetime.timedelta(days=1)
+        for number in range(23):
+            Activite.objects.create(
+                nom=f"{'Atelier' if number % 3 else 'Sortie'} {number}", duree=60,
+                # Few distinct dates and counters, so most sort keys are tied
+                date_debut=start + datetime.timedelta(hours=number % 4),
+            )
+        for activite in Activite.objects.all():
+            Activite.objects.filter(pk=activite.pk).update(nb_inscrits=activite.pk % 3)
+
+    def _page(self, **query):
+        request = RequestFactory().get('/activities/', {key: value for key, value in query.items() if value})
+        request.user = self.user
+        view = ActiviteListView()
+        view.setup(request)
+        view.object_list = view.get_queryset()
+        return view.get_context_data()['page_obj']
+
+    def _walk(self, **query):
+        """Pages from the first to the last, then back to the first, as lists of pks"""
+        forward = [self._page(**query)]
+        while forward[-1].has_next():
+            forward.append(self._page(**query, cursor=forward[-1].next_cursor))
+        backward = [forward[-1]]
+        while backward[-1].has_previous():
+            backward.append(self._page(**query, cursor=backward[-1].previous_cursor))
+        return [[row.pk for row in page] for page in forward], [[row.pk for row in page] for page in reversed(backward)]
+
+    def _expected(self, queryset, *ordering):
+        return list(queryset.order_by(*ordering).values_list('pk', flat=True))
+
+    def _keyset_ordering(self, **query):
+        request = RequestFactory().get('/activities/', query)
+        request.user = self.user
+        view = ActiviteListView()
+        view.setup(request)
+        return view.get_keyset_ordering(view.get_queryset())
+
+    def test_walk_forward_and_back(self):
+        forward, backward = self._walk()
+
+        self.assertEqual([len(page) for page in forward], [10, 10, 3])
+        self.assertEqual(sum(forward, []), self._expected(Activite.objects.all(), 'date_debut', 'pk'))
+        self.assertEqual(backward, forward)
+
+    def test_ties_are_resolved_by_pk(self):
+        forward, backward = self._walk(sort='participants')
+
+        self.assertEqual(sum(forward, []), self._expected(Activite.objects.all(), '-nb_inscrits', '-pk'))
+        self.assertEqual(backward, forward)
+
+    def test_tiebreak_follows_the_leading_direction(self):
+        # A single direction lets the database read the sort index instead of sorting
+        self.assertEqual(self._keyset_ordering(sort='participants'), ['-nb_inscrits', '-pk'])
+        self.assertEqual(self._keyset_ordering(sort='name'), ['nom', 'pk'])
+        self.assertEqual(self._keyset_ordering(), ['date_debut', 'pk'])
+
+    @skipUnless(connection.vendor == 'sqlite', "Plans lus avec EXPLAIN QUERY PLAN de SQLite.")
+    def test_pages_are_read_from_an_index(self):
+        for sort in ('date', 'name', 'participants'):
+            cursor = self._page(sort=sort).next_cursor
+            for query in ({'sort': sort}, {'sort': sort, 'cursor': cursor}):
+                with self.subTest(**query), CaptureQueriesContext(connection) as queries:
+                    self._page(**query)
+                sql = next(captured['sql'] for captured in queries.captured_queries if 'ORDER BY' in captured['sql'])
+                self.assertEqual(explain(sql)[1], [])
+
+    def test_cursor_with_filters_and_sort(self):
+        forward, backward = self._walk(q='Atelier', sort='name')
+
+        self.assertEqual(sum(forward, []), self._expected(Activite.objects.filter(nom__icontains='Atelier'), 'nom', 'pk'))
+        self.assertEqual(backward, forward)
+
+    def test_tampered_cursor_starts_over(self):
+        first = self._page()
+        cursor = first.next_cursor
+
+        for tampered in (cursor[:-3] + 'abc', 'nimportequoi', cursor.replace(':', '', 1)):
+            with self.subTest(cursor=tampered):
+                self.assertEqual(list(self._page(cursor=tampered)), list(first))
+
+    def test_cursor_of_another_sort_starts_over(self):
+        cursor = self._page().next_cursor
+
+        page = self._page(sort='name', cursor=cursor)
+
+        self.assertEqual([row.pk for row in page], self._expected(Activite.objects.all(), 'nom', 'pk')[:10])
+        self.assertFalse(page.has_previous())
+
+
+class IntervalTest(SimpleTestCase):
+    """Half-open [start, end) intervals of IntervalIndex and overlapping_pairs"""
+
+    items = [(1, 3, 'a'), (3, 5, 'b'), (0, 10, 'c'), (6, 7, 'd'), (6, 8, 'e')]
+
+    def _payloads(self, items):
+        return sorted(item[2] for item in items)
+
+    def _brute_force(self, start, end):
+        return sorted(payload for item_start, item_end, payload in self.items if item_start < end and start < item_end)
+
+    def test_overlapping(self):
+        index = IntervalIndex(self.items)
+
+        self.assertEqual(self._payloads(index.overlapping(3, 4)), ['b', 'c'])
+        self.assertEqual(self._payloads(index.overlapping(5, 6)), ['c'])
+        self.assertEqual(self._payloads(index.overlapping(10, 12)), [])
+        self.assertEqual(IntervalIndex().overlapping(0, 1), [])
+        for start in range(-1, 11):
+            for end in range(start + 1, 12):
+                with self.subTest(start=start, end=end):
+                    self.assertEqual(self._payloads(index.overlapping(start, end)), self._brute_force(start, end))
+
+    def test_covering(self):
+        index = IntervalIndex(self.items)
+
+        self.assertEqual(self._payloads(index.covering(1, 3)), ['a', 'c'])
+        self.assertEqual(self._payloads(index.covering(6, 7)), ['c', 'd', 'e'])
+        self.assertEqual(self._payloads(index.covering(2, 4)), ['c'])
+        self.assertEqual(self._payloads(index.covering(9, 11)), [])
+
+    def test_overlapping_pairs(self):
+        pairs = {tuple(sorted((first[2], second[2]))) for first, second in overlapping_pairs(self.items)}
+
+        # a and b only touch at 3, c contains every other item, d is nested in e
+        self.assertEqual(pairs, {('a', 'c'), ('b', 'c'), ('c', 'd'), ('c', 'e'), ('d', 'e')})
+        self.assertEqual(list(overlapping_pairs([])), [])
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    """Versioned invalidation needs a cache shared by every worker"""
+
+    def _ids(self, backend):
+        with override_settings(CACHES={'default': {'BACKEND': backend, 'LOCATION': 'redis://127.0.0.1:6379/1'}}):
+            return [message.id for message in check_shared_cache(None)]
+
+    def test_process_local_cache_is_reported(self):
+        self.assertEqual(self._ids('django.core.cache.backends.locmem.LocMemCache'), ['core.W001'])
+        self.assertEqual(self._ids('django.core.cache.backends.dummy.DummyCache'), ['core.W001'])
+
+    def test_shared_cache_passes(self):
+        self.assertEqual(self._ids('django.core.cache.backends.redis.RedisCache'), [])
+        self.assertEqual(self._ids('django.core.cache.backends.db.DatabaseCache'), [])
+
+
+class CampGeneratorTest(TestCase):
+    """A small camp generated twice, in a season entirely in the past so no date is moved back to now"""
+
+    volumes = {
+        'participants': 30, 'activites': 8, 'inscriptions': 120, 'responsables': 3, 'animateurs': 5,
+        'horaires': 20, 'infrastructures': 3, 'materiels': 4,
+    }
+    models = [
+        Responsable, Animateur, Participant, Infrastructure, Materiel,
+        Activite, ActiviteAnimateur, ActiviteMateriel, Inscription, StaffSchedule,
+    ]
+
+    def _generate(self, seed):
+        """Generate a camp, returns its rows with primary keys made relative to the first row of each table"""
+        last = {model: model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0 for model in self.models}
+        CampGenerator(self.volumes, seed=seed, debut=datetime.date(2020, 3, 1), jours=30).run()
+
+        first = {model: model.objects.filter(pk__gt=last[model]).order_by('pk').values_list('pk', flat=True).first() for model in self.models}
+        rows = {}
+        for model in self.models:
+            keys = {
+                field.attname: field.related_model for field in model._meta.concrete_fields
+                if field.many_to_one and field.related_model in first
+            }
+            rows[model.__name__] = [
+                {
+                    name: value - first[keys[name]] if name in keys and value is not None else value
+                    for name, value in row.items() if name not in ('created_at', 'updated_at')
+                } | {'id': row['id'] - first[model]}
+                for row in model.objects.filter(pk__gt=last[model]).order_by('pk').values()
+            ]
+        return rows
+
+    def test_same_seed_gives_same_rows(self):
+        rows = self._generate(seed=7)
+
+        self.assertEqual({name: len(table) for name, table in rows.items() if name in ('Participant', 'Activite', 'Inscription')},
+                         {'Participant': 30, 'Activite': 8, 'Inscription': 120})
+        self.assertEqual(self._generate(seed=7), rows)
+        self.assertNotEqual(self._generate(seed=8), rows)
+
+    def test_derived_fields_match_save(self):
+        self._generate(seed=3)
+
+        call_command('rebuild_inscription_counters', '--check', stdout=StringIO())
+        for activite in Activite.objects.all():
+            self.assertEqual(activite.date_fin, activite.date_debut + datetime.timedelta(minutes=activite.duree))
+        # Search keys, as NormalizedFieldsMixin.save() would compute them
+        for model in (Participant, Responsable, Animateur, Activite):
+            for row in model.objects.all():
+                stored = {field: getattr(row, field) for field in model.NORMALIZED_FIELDS}
+                row.refresh_normalized_fields()
+                self.assertEqual(stored, {field: getattr(row, field) for field in model.NORMALIZED_FIELDS}, row)
+
+    def test_impossible_start_date(self):
+        for value in ('2026-13-01', '2026-02-30', '01/03/2026'):
+            with self.subTest(value=value), self.assertRaisesMessage(CommandError, "Date invalide"):
+                call_command('seed_camp', f'--debut={value}', '--echelle=0.001')
+
+
+class AuditTest(TestCase):
+    """Problems reported by explain() and the URLs replayed by audit_queries"""
+
+    @skipUnless(connection.vendor == 'sqlite', "Plans de SQLite")
+    def test_explain_flags_full_scans_and_sorts(self):
+        # emergency_contact_name has no index
+        lines, problems = explain("SELECT id FROM participant WHERE emergency_contact_name = 'Marie'")
+        self.assertTrue(lines)
+        self.assertEqual(problems, ['parcours complet de participant'])
+
+        lines, problems = explain("SELECT id FROM participant WHERE nom_normalise = 'martin' ORDER BY emergency_contact_name")
+        self.assertEqual(problems, ['tri sans index (ORDER BY)'])
+
+        self.assertEqual(explain("SELECT id FROM participant WHERE nom_normalise = 'martin'")[1], [])
+        self.assertEqual(explain("SELECT id FROM participant ORDER BY nom, prenom, id LIMIT 10")[1], [])
+
+    def test_audited_urls(self):
+        labels = [label for label, url in audited_urls()]
+        # Detail views are skipped while their table is empty
+        self.assertIn('participants:list', labels)
+        self.assertFalse([label for label in labels if label.startswith('participants:detail')])
+
+        participant = Participant.objects.create(nom='Martin', prenom='Léa', date_naissance=datetime.date(2015, 5, 1))
+        urls = dict(audited_urls())
+        self.assertEqual(urls['participants:detail'], reverse('participants:detail', kwargs={'pk': participant.pk}))
+        for label, url in urls.items():
+            with self.subTest(label=label):
+                resolve(url.split('?')[0])
+
+        window = next(url for label, url in urls.items() if label.startswith('participants:activities_json'))
+        query = parse_qs(urlsplit(window).query)
+        start, end = (datetime.datetime.fromisoformat(query[key][0]) for key in ('start', 'end'))
+        self.assertEqual((start.weekday(), end - start), (0, datetime.timedelta(days=7)))
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Every page of the apps runs a bounded number of queries, see core.testing.BUDGETS"""
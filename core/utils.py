@@ -0,0 +1,112 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from functools import reduce
+from itertools import accumulate
+from operator import or_
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+class IntervalIndex:
+    """Static index over half-open [start, end) intervals.
+
+    Items are (start, end, payload) tuples. They are sorted by start once and a
+    running maximum of the ends is kept, so an overlap query is two bisections
+    plus a scan of the candidates only.
+    """
+
+    def __init__(self, items=()):
+        self._items = sorted(items, key=lambda item: item[0])
+        self._starts = [item[0] for item in self._items]
+        self._max_ends = list(accumulate((item[1] for item in self._items), max))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def overlapping(self, start, end):
+        """Return the items overlapping [start, end)"""
+        hi = bisect_left(self._starts, end)
+        lo = bisect_right(self._max_ends, start, 0, hi)
+        return [item for item in self._items[lo:hi] if item[1] > start]
+
+    def covering(self, start, end):
+        """Return the items fully containing [start, end)"""
+        hi = bisect_right(self._starts, start)
+        lo = bisect_left(self._max_ends, end, 0, hi)
+        return [item for item in self._items[lo:hi] if item[1] >= end]
+
+
+def overlapping_pairs(items):
+    """Yield every pair of overlapping (start, end, payload) items with one sweep.
+
+    Runs in O(n log n + k) for k overlapping pairs instead of comparing every pair.
+    """
+    active = []
+    for index, item in enumerate(sorted(items, key=lambda item: item[0])):
+        start, end = item[0], item[1]
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            yield other, item
+        heapq.heappush(active, (end, index, item))
+
+
+def parse_window(start, end):
+    """Aware (start, end) of two ISO datetime strings, None when missing, invalid or empty"""
+    try:
+        start = parse_datetime(str(start or ''))
+        end = parse_datetime(str(end or ''))
+    except ValueError:
+        # Well-formed but impossible dates, such as month 13
+        return None
+    if not start or not end:
+        return None
+
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if start >= end:
+        return None
+    return start, end
+
+
+def fold(text):
+    """Lowercase text without accents: 'Hélène' -> 'helene'"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower().strip()
+
+
+def digits(text):
+    """Only the digits of text: '06 12-34' -> '061234'"""
+    return re.sub(r'\D', '', str(text or ''))
+
+
+def prefix_filter(query, text_fields, phone_fields=(), prefix_fields=()):
+    """Q object for a search box over normalized search keys.
+
+    Every word of the query must start one of text_fields, or the digits of
+    a phone-like query start one of phone_fields, or the raw query starts one of
+    prefix_fields. Keys are stored in lowercase, and istartswith compiles to
+    LIKE 'x%' which MySQL serves from the column index.
+    """
+    condition = Q()
+    for word in fold(query).split():
+        condition &= reduce(or_, [Q(**{f'{field}__istartswith': word}) for field in text_fields])
+
+    # Phone keys are only tried for queries made of digits and separators
+    number = digits(query)
+    if len(number) >= 2 and re.fullmatch(r'[\d\s.+()-]+', query.strip()):
+        for field in phone_fields:
+            condition |= Q(**{f'{field}__istartswith': number})
+
+    for field in prefix_fields:
+        condition |= Q(**{f'{field}__istartswith': query.strip()})
+    return condition
@@ -0,0 +1,173 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db.models import Count, Max
+
+from activities.events import url_template
+from .models import SearchDocument
+from .search import tokenize
+
+
+# Kinds of SearchDocument offered as suggestions, with the detail page of each
+KINDS = {
+    'participant': 'participants:detail',
+    'responsable': 'staff:responsable_detail',
+    'animateur': 'staff:animateur_detail',
+    'activite': 'activities:detail',
+    'infrastructure': 'infrastructure:detail',
+}
+
+# Seconds between two checks of the version stamp of the document table
+REFRESH_INTERVAL = 2.0
+
+# Above this many changed documents a refresh reloads everything
+MAX_INCREMENTAL = 2000
+
+
+class PrefixIndex:
+    """Sorted (word, document pk) pairs over the names of SearchDocuments.
+
+    Every word of a name is a key, so "lef" finds "Hélène Lefèvre"; the words
+    starting with a prefix form a contiguous run found with a bisection.
+    Documents can be added and removed one by one to apply small changes.
+    """
+
+    def __init__(self, rows=()):
+        self._documents = {}
+        keys = []
+        for row in rows:
+            keys.extend(self._store(row))
+        keys.sort()
+        self._keys = keys
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _store(self, row):
+        pk, kind, object_id, titre = row
+        words = tuple(dict.fromkeys(tokenize(titre)))
+        self._documents[pk] = (kind, object_id, titre, words)
+        return [(word, pk) for word in words]
+
+    def remove(self, pk):
+        document = self._documents.pop(pk, None)
+        if document is None:
+            return
+        for word in document[3]:
+            position = bisect_left(self._keys, (word, pk))
+            if position < len(self._keys) and self._keys[position] == (word, pk):
+                del self._keys[position]
+
+    def add(self, row):
+        self.remove(row[0])
+        for key in self._store(row):
+            insort(self._keys, key)
+
+    def suggest(self, query, kinds=None, limit=10):
+        """Return [(kind, object_id, titre)] whose name has a word starting with each query word"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # The longest word narrows the scan the most, the others are checked on each match
+        first = max(terms, key=len)
+        others = list(terms)
+        others.remove(first)
+
+        def matches():
+            seen = set()
+            position = bisect_left(self._keys, (first,))
+            while position < len(self._keys):
+                word, pk = self._keys[position]
+                if not word.startswith(first):
+                    break
+                position += 1
+
+                kind, object_id, titre, words = self._documents[pk]
+                if pk in seen or (kinds and kind not in kinds):
+                    continue
+                if all(any(name_word.startswith(term) for name_word in words) for term in others):
+                    seen.add(pk)
+                    yield (not words[0].startswith(first), len(titre), titre, kind, object_id)
+
+        # Names starting with the query first, then the shortest ones. Every match is
+        # ranked, the run of keys being in word order and not in that of the ranking.
+        best = heapq.nsmallest(limit, matches(), key=lambda match: match[:3])
+        return [(kind, object_id, titre) for _, _, titre, kind, object_id in best]
+
+
+class AutocompleteIndex:
+    """Process-wide PrefixIndex loaded on first use and kept in sync with SearchDocument.
+
+    The version stamp is the row count and latest updated_at of the table,
+    checked at most every REFRESH_INTERVAL seconds. Documents updated since
+    the last stamp are applied in place; deletions, which leave no updated
+    row, are detected by the count and trigger a full reload.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._stamp = None
+        self._checked_at = 0.0
+
+    def _queryset(self):
+        return SearchDocument.objects.filter(kind__in=KINDS).order_by()
+
+    def _current_stamp(self):
+        stamp = self._queryset().aggregate(total=Count('id'), latest=Max('updated_at'))
+        return stamp['total'], stamp['latest']
+
+    def _rows(self, queryset):
+        return queryset.values_list('pk', 'kind', 'object_id', 'titre').iterator(chunk_size=5000)
+
+    def reload(self):
+        stamp = self._current_stamp()
+        self._index = PrefixIndex(self._rows(self._queryset()))
+        self._stamp = stamp
+        return self._index
+
+    def refresh(self):
+        """Bring the index up to date with the table, loading it when needed"""
+        stamp = self._current_stamp()
+        if self._index is None or stamp == self._stamp:
+            return self._index or self.reload()
+
+        total, latest = stamp
+        changed = self._queryset()
+        if self._stamp[1] is not None:
+            changed = changed.filter(updated_at__gte=self._stamp[1])
+        if changed.count() > MAX_INCREMENTAL:
+            return self.reload()
+
+        for row in self._rows(changed):
+            self._index.add(row)
+        if len(self._index) != total:
+            return self.reload()
+
+        self._stamp = stamp
+        return self._index
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._index is None or now - self._checked_at >= REFRESH_INTERVAL:
+                self.refresh()
+                self._checked_at = now
+            return self._index
+
+
+_autocomplete = AutocompleteIndex()
+
+
+def suggest(query, kinds=None, limit=10):
+    """Suggestions for a partial name as dicts ready for JSON"""
+    kinds = [kind for kind in kinds or KINDS if kind in KINDS]
+    if not kinds:
+        return []
+    urls = {kind: url_template(KINDS[kind]) for kind in kinds}
+    return [
+        {'id': object_id, 'type': kind, 'label': titre, 'url': urls[kind].format(pk=object_id)}
+        for kind, object_id, titre in _autocomplete.get().suggest(query, kinds, limit)
+    ]
@@ -0,0 +1,141 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+KEY_PREFIX = 'dashboard:chart'
+
+# Charts to invalidate when rows of a model change
+CHARTS_BY_MODEL = {
+    'participant': ['participants'],
+    'inscription': ['activities', 'inscriptions'],
+    'activite': ['activities'],
+    'materiel': ['materials'],
+}
+
+COUNTERS = ('hits', 'misses', 'stale')
+
+# Seconds a rebuild lock is held at most, should the rebuilding request die
+LOCK_TIMEOUT = 30
+
+# Seconds a cold request waits for the request holding the lock before building the chart itself
+COLD_WAIT = 5
+COLD_POLL = 0.05
+
+
+def fresh_for():
+    """Seconds an entry is served without recomputing when nothing changed"""
+    return getattr(settings, 'DASHBOARD_CHART_CACHE_TTL', 5 * 60)
+
+
+def _version_key(chart):
+    return f'{KEY_PREFIX}:version:{chart}'
+
+
+def _entry_key(chart, period):
+    return f'{KEY_PREFIX}:data:{chart}:{period}'
+
+
+def _lock_key(chart, period):
+    return f'{KEY_PREFIX}:lock:{chart}:{period}'
+
+
+def _count(name):
+    key = f'{KEY_PREFIX}:stats:{name}'
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_version(chart):
+    version = cache.get(_version_key(chart))
+    if version is None:
+        cache.add(_version_key(chart), 1, timeout=None)
+        version = cache.get(_version_key(chart), 1)
+    return version
+
+
+def invalidate(chart):
+    """Mark every cached period of a chart as outdated, in every worker sharing the cache (see core.checks)"""
+    key = _version_key(chart)
+    if not cache.add(key, 2, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, timeout=None)
+
+
+def invalidate_on_commit(model_name):
+    for chart in CHARTS_BY_MODEL.get(model_name, []):
+        transaction.on_commit(lambda chart=chart: invalidate(chart))
+
+
+def _wait_for_entry(chart, period):
+    """Entry stored by the request holding the rebuild lock, None if it takes longer than COLD_WAIT"""
+    deadline = time.monotonic() + COLD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(COLD_POLL)
+        entry = cache.get(_entry_key(chart, period))
+        if entry is not None:
+            return entry
+        if cache.get(_lock_key(chart, period)) is None:
+            break
+    return None
+
+
+def cached_chart(chart, period, build):
+    """Return the data of a chart, from the cache when possible.
+
+    An entry is current while its version matches the chart version and it is
+    younger than DASHBOARD_CHART_CACHE_TTL. Only the request that wins the
+    rebuild lock recomputes a chart: the others are served the outdated entry
+    or, when there is none yet, wait for the winner's result. A burst of
+    requests after a change or on a cold cache triggers a single computation.
+    """
+    version = get_version(chart)
+    entry = cache.get(_entry_key(chart, period))
+    now = timezone.now().timestamp()
+
+    if entry is not None and entry['version'] == version and now - entry['computed_at'] < fresh_for():
+        _count('hits')
+        return entry['data']
+
+    locked = cache.add(_lock_key(chart, period), 1, timeout=LOCK_TIMEOUT)
+    if not locked:
+        if entry is None:
+            entry = _wait_for_entry(chart, period)
+        if entry is not None:
+            _count('stale')
+            return entry['data']
+
+    _count('misses')
+    try:
+        data = build()
+        # Outdated entries are kept a while longer to be served during rebuilds
+        cache.set(
+            _entry_key(chart, period),
+            {'version': version, 'computed_at': now, 'data': data},
+            timeout=fresh_for() * 12,
+        )
+    finally:
+        # Never release a lock another request holds
+        if locked:
+            cache.delete(_lock_key(chart, period))
+    return data
+
+
+def cache_stats():
+    """Hit, miss and stale counters of the chart cache"""
+    stats = {name: cache.get(f'{KEY_PREFIX}:stats:{name}', 0) for name in COUNTERS}
+    served = sum(stats.values())
+    stats['hit_ratio'] = round((stats['hits'] + stats['stale']) / served, 3) if served else None
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([f'{KEY_PREFIX}:stats:{name}' for name in COUNTERS])
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from dashboard.rollup import backfill, find_rollup_mismatches
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les comptages journaliers des participants et des inscriptions à partir des tables brutes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--depuis', metavar='AAAA-MM-JJ',
+            help="Ne reconstruit que les jours à partir de cette date (par défaut tout l'historique)",
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Compare les comptages stockés aux tables brutes sans les corriger (code de sortie non nul en cas d'écart)",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['depuis']:
+            since = parse_date(options['depuis'])
+            if since is None:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ.")
+
+        if options['check']:
+            mismatches = find_rollup_mismatches(since)
+            for key, stored, expected in mismatches[:50]:
+                self.stdout.write(f"{key}: stocké {stored}, attendu {expected}")
+
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} comptage(s) incorrect(s).")
+
+            self.stdout.write(self.style.SUCCESS("Les comptages journaliers sont corrects."))
+            return
+
+        rows = backfill(since)
+        self.stdout.write(self.style.SUCCESS(f"{rows} ligne(s) de comptage écrite(s)."))
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from activities.models import Activite
+from infrastructure.models import Infrastructure, Materiel
+from participants.models import Participant
+from staff.models import Animateur, Responsable
+from dashboard.search import search
+
+
+def legacy_search(query):
+    """The icontains queries SearchView ran before the search index, kept for comparison"""
+    participants = Participant.objects.filter(
+        Q(nom__icontains=query) | Q(prenom__icontains=query) | Q(email__icontains=query)
+    )[:10]
+    activities = Activite.objects.filter(Q(nom__icontains=query) | Q(description__icontains=query))[:10]
+    responsables = Responsable.objects.filter(
+        Q(nom__icontains=query) | Q(prenom__icontains=query) | Q(email__icontains=query)
+    )[:5]
+    animateurs = Animateur.objects.filter(
+        Q(nom__icontains=query) | Q(prenom__icontains=query) | Q(email__icontains=query)
+    )[:5]
+    infrastructures = Infrastructure.objects.filter(Q(nom__icontains=query) | Q(type__icontains=query))[:5]
+    materials = Materiel.objects.filter(Q(nom__icontains=query) | Q(description__icontains=query))[:5]
+
+    querysets = [participants, activities, responsables, animateurs, infrastructures, materials]
+    # The view checked every queryset for has_results before the template evaluated them
+    any([queryset.exists() for queryset in querysets])
+    return sum(len(queryset) for queryset in querysets)
+
+
+class Command(BaseCommand):
+    help = "Compare la recherche indexée aux requêtes icontains de l'ancienne recherche globale"
+
+    def add_arguments(self, parser):
+        parser.add_argument('termes', nargs='*', help="Termes recherchés (par défaut des noms pris dans la base)")
+        parser.add_argument('--repetitions', type=int, default=20, help="Nombre d'exécutions par terme (défaut : 20)")
+
+    def _measure(self, function, query, repetitions):
+        with CaptureQueriesContext(connection) as queries:
+            count = function(query)
+        started = time.perf_counter()
+        for _ in range(repetitions):
+            function(query)
+        return (time.perf_counter() - started) / repetitions * 1000, len(queries), count
+
+    def handle(self, *args, **options):
+        terms = options['termes'] or [
+            name for name in Participant.objects.order_by('?').values_list('nom', flat=True)[:3]
+        ] + [name.split()[0] for name in Activite.objects.order_by('?').values_list('nom', flat=True)[:2]]
+        if not terms:
+            self.stdout.write("Aucun terme à rechercher, précisez-en ou remplissez la base.")
+            return
+
+        repetitions = max(1, options['repetitions'])
+        search(terms[0])  # Builds the in-memory index outside of the measures
+
+        self.stdout.write(f"{'Terme':<20} {'Ancienne (ms)':>14} {'Requêtes':>9} {'Indexée (ms)':>13} {'Requêtes':>9} {'Résultats':>10}")
+        for term in terms:
+            legacy_ms, legacy_queries, legacy_count = self._measure(legacy_search, term, repetitions)
+            indexed_ms, indexed_queries, indexed_count = self._measure(lambda query: len(search(query, limit=200)), term, repetitions)
+            self.stdout.write(
+                f"{term[:20]:<20} {legacy_ms:>14.2f} {legacy_queries:>9} {indexed_ms:>13.2f} {indexed_queries:>9} "
+                f"{legacy_count:>4} / {indexed_count:<4}"
+            )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.search import SOURCES, rebuild, reindex
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche globale à partir des tables sources"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', dest='kinds', action='append', metavar='TYPE',
+            help=f"Ne reconstruit que ce type de documents ({', '.join(SOURCES)}), option répétable",
+        )
+
+    def handle(self, *args, **options):
+        kinds = options['kinds']
+        if kinds:
+            unknown = set(kinds) - set(SOURCES)
+            if unknown:
+                raise CommandError(f"Type(s) inconnu(s) : {', '.join(sorted(unknown))}.")
+            counts = {kind: reindex(kind) for kind in kinds}
+        else:
+            counts = rebuild()
+
+        for kind, count in counts.items():
+            self.stdout.write(f"{kind}: {count} document(s)")
+        self.stdout.write(self.style.SUCCESS(f"{sum(counts.values())} document(s) indexé(s)."))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.models import DashboardSnapshot
+from dashboard.stats import SNAPSHOT_PK, find_mismatches, is_stale, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques du tableau de bord (à lancer périodiquement)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Compare les statistiques stockées aux agrégats réels sans les corriger (code de sortie non nul en cas d'écart)",
+        )
+        parser.add_argument(
+            '--if-stale', action='store_true',
+            help="Ne recalcule que si les statistiques sont absentes ou trop anciennes",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = find_mismatches()
+            for field, stored, expected in mismatches:
+                self.stdout.write(f"{field}: stocké {stored}, attendu {expected}")
+
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} statistique(s) incorrecte(s).")
+
+            self.stdout.write(self.style.SUCCESS("Les statistiques du tableau de bord sont correctes."))
+            return
+
+        snapshot = DashboardSnapshot.objects.filter(pk=SNAPSHOT_PK).first()
+        if options['if_stale'] and snapshot is not None and not is_stale(snapshot):
+            self.stdout.write("Statistiques à jour, rien à faire.")
+            return
+
+        snapshot = refresh_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Statistiques recalculées ({snapshot.computed_at:%d/%m/%Y %H:%M:%S})."))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('total_participants', models.IntegerField(default=0)),
+                ('new_participants_week', models.IntegerField(default=0)),
+                ('new_participants_prev_week', models.IntegerField(default=0)),
+                ('total_activities', models.IntegerField(default=0)),
+                ('activities_this_week', models.IntegerField(default=0)),
+                ('full_activities', models.IntegerField(default=0)),
+                ('total_staff', models.IntegerField(default=0)),
+                ('upcoming_activities', models.JSONField(default=list)),
+                ('recent_registrations', models.JSONField(default=list)),
+                ('low_stock_materials', models.JSONField(default=list)),
+                ('stats_date', models.DateField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
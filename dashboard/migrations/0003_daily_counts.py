@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_rollup(apps, schema_editor):
+    # The charts only read the rollup, fill it from the existing rows
+    Participant = apps.get_model('participants', 'Participant')
+    Inscription = apps.get_model('activities', 'Inscription')
+    ParticipantDailyCount = apps.get_model('dashboard', 'ParticipantDailyCount')
+    InscriptionDailyCount = apps.get_model('dashboard', 'InscriptionDailyCount')
+
+    participants = Participant.objects.exclude(date_inscription__isnull=True).order_by().values(
+        'date_inscription'
+    ).annotate(nouveaux=Count('id'))
+    ParticipantDailyCount.objects.bulk_create(
+        [ParticipantDailyCount(jour=row['date_inscription'], nouveaux=row['nouveaux']) for row in participants],
+        batch_size=BATCH_SIZE,
+    )
+
+    inscriptions = Inscription.objects.annotate(jour=TruncDate('date_inscription')).order_by().values(
+        'jour', 'activite_id', 'statut'
+    ).annotate(inscriptions=Count('id'), presences=Count('id', filter=Q(a_participe=True)))
+    InscriptionDailyCount.objects.bulk_create(
+        [
+            InscriptionDailyCount(
+                jour=row['jour'], activite_id=row['activite_id'], statut=row['statut'],
+                inscriptions=row['inscriptions'], presences=row['presences'],
+            )
+            for row in inscriptions
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0003_serie_activite'),
+        ('dashboard', '0002_dashboardsnapshot'),
+        ('participants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParticipantDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('jour', models.DateField(unique=True)),
+                ('nouveaux', models.IntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='InscriptionDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('jour', models.DateField()),
+                ('statut', models.CharField(max_length=20)),
+                ('inscriptions', models.IntegerField(default=0)),
+                ('presences', models.IntegerField(default=0)),
+                ('activite', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='activities.activite')),
+            ],
+            options={
+                'unique_together': {('jour', 'activite', 'statut')},
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:53
+
+import re
+
+from django.db import migrations, models
+
+
+def add_fulltext_index(apps, schema_editor):
+    # Django has no FULLTEXT index type, other backends use the Python index of dashboard.search
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE dashboard_searchdocument ADD FULLTEXT INDEX searchdocument_contenu_ft (contenu)'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE dashboard_searchdocument DROP INDEX searchdocument_contenu_ft')
+
+
+# kind: (app label, model, fields making the title, other searched fields, date field), as when
+# this migration was written
+SOURCES = {
+    'participant': ('participants', 'Participant', ('prenom', 'nom'), ('email',), None),
+    'activite': ('activities', 'Activite', ('nom',), ('description',), 'date_debut'),
+    'responsable': ('staff', 'Responsable', ('prenom', 'nom'), ('email',), None),
+    'animateur': ('staff', 'Animateur', ('prenom', 'nom'), ('email',), None),
+    'infrastructure': ('infrastructure', 'Infrastructure', ('nom',), ('type',), None),
+    'materiel': ('infrastructure', 'Materiel', ('nom',), ('description',), None),
+}
+
+BATCH_SIZE = 1000
+
+
+def build_documents(apps, schema_editor):
+    # Global search only reads the documents, build them for the existing rows
+    from core.utils import fold
+
+    def tokenize(text):
+        return re.findall(r'\w+', fold(text))
+
+    SearchDocument = apps.get_model('dashboard', 'SearchDocument')
+    for kind, (app_label, model_name, title_fields, text_fields, date_field) in SOURCES.items():
+        model = apps.get_model(app_label, model_name)
+        fields = ['pk', *title_fields, *text_fields] + ([date_field] if date_field else [])
+        documents = []
+        for values in model.objects.values(*fields).iterator(chunk_size=BATCH_SIZE):
+            titre = ' '.join(str(values[field]) for field in title_fields if values[field])
+            documents.append(SearchDocument(
+                kind=kind,
+                object_id=values['pk'],
+                titre=titre,
+                contenu=' '.join(tokenize(titre) + tokenize(' '.join(str(values[field] or '') for field in text_fields))),
+                date=values[date_field] if date_field else None,
+            ))
+        SearchDocument.objects.bulk_create(documents, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0004_normalized_search_keys'),
+        ('dashboard', '0003_daily_counts'),
+        ('infrastructure', '0001_initial'),
+        ('participants', '0002_normalized_search_keys'),
+        ('staff', '0002_normalized_search_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(choices=[('participant', 'Participant'), ('activite', 'Activité'), ('responsable', 'Responsable'), ('animateur', 'Animateur'), ('infrastructure', 'Infrastructure'), ('materiel', 'Matériel')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('titre', models.CharField(max_length=255)),
+                ('contenu', models.TextField()),
+                ('date', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
@@ -54,4 +54,75 @@ class Notification(TimestampMixin):
     is_read = models.BooleanField(default=False)
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class DashboardSnapshot(TimestampMixin):
+    """Precomputed dashboard statistics, a single row maintained by dashboard.stats"""
+    total_participants = models.IntegerField(default=0)
+    new_participants_week = models.IntegerField(default=0)
+    new_participants_prev_week = models.IntegerField(default=0)
+    total_activities = models.IntegerField(default=0)
+    activities_this_week = models.IntegerField(default=0)
+    full_activities = models.IntegerField(default=0)
+    total_staff = models.IntegerField(default=0)
+    
+    # Short lists rendered as is by the dashboard
+    upcoming_activities = models.JSONField(default=list)
+    recent_registrations = models.JSONField(default=list)
+    low_stock_materials = models.JSONField(default=list)
+    
+    # Day the weekly windows were computed for, and time of the last full refresh
+    stats_date = models.DateField(blank=True, null=True)
+    computed_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"Dashboard snapshot ({self.computed_at})"
+
+class ParticipantDailyCount(TimestampMixin):
+    """New participants per day, maintained by dashboard.rollup"""
+    jour = models.DateField(unique=True)
+    nouveaux = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.jour}: {self.nouveaux} participant(s)"
+
+class InscriptionDailyCount(TimestampMixin):
+    """Inscriptions per day, activity and status, maintained by dashboard.rollup"""
+    jour = models.DateField()
+    activite = models.ForeignKey('activities.Activite', on_delete=models.CASCADE, related_name='+')
+    statut = models.CharField(max_length=20)
+    inscriptions = models.IntegerField(default=0)
+    # Inscriptions of the row marked as attended (a_participe)
+    presences = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('jour', 'activite', 'statut')
+    
+    def __str__(self):
+        return f"{self.jour} - {self.activite_id} ({self.statut}): {self.inscriptions}"
+
+class SearchDocument(TimestampMixin):
+    """Searchable text of one participant, activity, staff member, infrastructure or material.
+
+    Maintained by dashboard.search; contenu is lowercased and unaccented and
+    carries a FULLTEXT index on MySQL.
+    """
+    KIND_CHOICES = (
+        ('participant', 'Participant'),
+        ('activite', 'Activité'),
+        ('responsable', 'Responsable'),
+        ('animateur', 'Animateur'),
+        ('infrastructure', 'Infrastructure'),
+        ('materiel', 'Matériel'),
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    titre = models.CharField(max_length=255)
+    contenu = models.TextField()
+    date = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        unique_together = ('kind', 'object_id')
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.titre}"
\ No newline at end of file
@@ -0,0 +1,178 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from activities.models import Inscription
+from participants.models import Participant
+from .models import InscriptionDailyCount, ParticipantDailyCount
+
+
+# (first day offset, bucket size) of the chart periods, None meaning since the first row
+PERIODS = {
+    'week': (7, 'day'),
+    'month': (30, 'day'),
+    'year': (365, 'month'),
+    'all': (None, 'month'),
+}
+
+
+def _bump(model, lookup, **deltas):
+    """Add deltas to the rollup row matching lookup, creating it when needed"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    values = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**lookup).update(updated_at=timezone.now(), **values):
+        return
+
+    # Nothing to decrement: the row went away with its activity or predates the backfill
+    if any(delta < 0 for delta in deltas.values()):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Created by a concurrent transaction in the meantime
+        model.objects.filter(**lookup).update(updated_at=timezone.now(), **values)
+
+
+def record_participant(day, sign):
+    _bump(ParticipantDailyCount, {'jour': day}, nouveaux=sign)
+
+
+def record_inscription(day, activite_id, statut, a_participe, sign, count=1):
+    """Move the counts of count inscriptions of the same day, activity and status"""
+    if activite_id is None:
+        return
+    _bump(
+        InscriptionDailyCount,
+        {'jour': day, 'activite_id': activite_id, 'statut': statut},
+        inscriptions=sign * count,
+        presences=sign * count if a_participe else 0,
+    )
+
+
+def inscription_day(inscription):
+    return timezone.localdate(inscription.date_inscription) if inscription.date_inscription else timezone.localdate()
+
+
+def compute_rollup(since=None):
+    """Rollup rows computed from the raw tables: (participant rows, inscription rows)"""
+    participants = Participant.objects.exclude(date_inscription__isnull=True)
+    inscriptions = Inscription.objects.annotate(jour=TruncDate('date_inscription'))
+    if since is not None:
+        participants = participants.filter(date_inscription__gte=since)
+        inscriptions = inscriptions.filter(jour__gte=since)
+
+    participant_rows = {
+        row['date_inscription']: row['nouveaux']
+        for row in participants.order_by().values('date_inscription').annotate(nouveaux=Count('id'))
+    }
+    inscription_rows = {
+        (row['jour'], row['activite_id'], row['statut']): (row['inscriptions'], row['presences'])
+        for row in inscriptions.order_by().values('jour', 'activite_id', 'statut').annotate(
+            inscriptions=Count('id'),
+            presences=Count('id', filter=Q(a_participe=True)),
+        )
+    }
+    return participant_rows, inscription_rows
+
+
+def backfill(since=None, batch_size=1000):
+    """Rebuild the rollup rows from the raw tables, returns the number of rows written"""
+    participant_rows, inscription_rows = compute_rollup(since)
+
+    with transaction.atomic():
+        participants = ParticipantDailyCount.objects.all()
+        inscriptions = InscriptionDailyCount.objects.all()
+        if since is not None:
+            participants = participants.filter(jour__gte=since)
+            inscriptions = inscriptions.filter(jour__gte=since)
+        participants.delete()
+        inscriptions.delete()
+
+        ParticipantDailyCount.objects.bulk_create(
+            [ParticipantDailyCount(jour=day, nouveaux=count) for day, count in participant_rows.items()],
+            batch_size=batch_size,
+        )
+        InscriptionDailyCount.objects.bulk_create(
+            [
+                InscriptionDailyCount(jour=day, activite_id=activite_id, statut=statut, inscriptions=count, presences=presences)
+                for (day, activite_id, statut), (count, presences) in inscription_rows.items()
+            ],
+            batch_size=batch_size,
+        )
+
+    return len(participant_rows) + len(inscription_rows)
+
+
+def find_rollup_mismatches(since=None):
+    """Compare the stored rollup to the raw tables, return [(key, stored, expected)]"""
+    participant_rows, inscription_rows = compute_rollup(since)
+
+    participants = ParticipantDailyCount.objects.exclude(nouveaux=0)
+    inscriptions = InscriptionDailyCount.objects.exclude(inscriptions=0, presences=0)
+    if since is not None:
+        participants = participants.filter(jour__gte=since)
+        inscriptions = inscriptions.filter(jour__gte=since)
+
+    stored_participants = dict(participants.values_list('jour', 'nouveaux'))
+    stored_inscriptions = {
+        (day, activite_id, statut): (count, presences)
+        for day, activite_id, statut, count, presences in inscriptions.values_list(
+            'jour', 'activite_id', 'statut', 'inscriptions', 'presences'
+        )
+    }
+
+    mismatches = []
+    for stored, expected in ((stored_participants, participant_rows), (stored_inscriptions, inscription_rows)):
+        for key in sorted(set(stored) | set(expected), key=str):
+            if stored.get(key) != expected.get(key):
+                mismatches.append((key, stored.get(key), expected.get(key)))
+    return mismatches
+
+
+def _buckets(start, end, size):
+    """Every bucket of a size between two days, both included"""
+    if size == 'month':
+        current = start.replace(day=1)
+        while current <= end:
+            yield current
+            current = (current + timedelta(days=32)).replace(day=1)
+    else:
+        current = start
+        while current <= end:
+            yield current
+            current += timedelta(days=1)
+
+
+def series(queryset, period, fields, today=None):
+    """Sum rollup fields per bucket of a chart period, with empty buckets filled.
+
+    The totals come from a single grouped query; returns (buckets, {field: values}).
+    """
+    today = today or timezone.localdate()
+    offset, size = PERIODS[period]
+    start = today - timedelta(days=offset) if offset is not None else None
+    if start is not None:
+        queryset = queryset.filter(jour__gte=start)
+
+    bucket = TruncMonth('jour') if size == 'month' else F('jour')
+    rows = queryset.order_by().annotate(bucket=bucket).values('bucket').annotate(
+        **{field: Sum(field) for field in fields}
+    )
+    totals = {row['bucket']: row for row in rows if row['bucket'] is not None}
+
+    if start is None:
+        start = min(totals, default=today)
+
+    buckets = list(_buckets(start, today, size))
+    return buckets, {
+        field: [totals[day][field] if day in totals else 0 for day in buckets]
+        for field in fields
+    }
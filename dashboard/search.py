@@ -0,0 +1,202 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.db.models.expressions import RawSQL
+
+from activities.models import Activite
+from core.utils import fold
+from infrastructure.models import Infrastructure, Materiel
+from participants.models import Participant
+from staff.models import Animateur, Responsable
+from .models import SearchDocument
+
+
+# kind: (model, fields making the title, other searched fields, date field shown with the results)
+SOURCES = {
+    'participant': (Participant, ('prenom', 'nom'), ('email',), None),
+    'activite': (Activite, ('nom',), ('description',), 'date_debut'),
+    'responsable': (Responsable, ('prenom', 'nom'), ('email',), None),
+    'animateur': (Animateur, ('prenom', 'nom'), ('email',), None),
+    'infrastructure': (Infrastructure, ('nom',), ('type',), None),
+    'materiel': (Materiel, ('nom',), ('description',), None),
+}
+
+KIND_BY_MODEL = {source[0]: kind for kind, source in SOURCES.items()}
+
+# Shortest word indexed by the InnoDB FULLTEXT parser (innodb_ft_min_token_size)
+MIN_TOKEN_SIZE = 3
+
+# Title words weigh more than the other fields in the Python index
+TITLE_WEIGHT = 3
+
+
+def tokenize(text):
+    """Accent-free lowercase words of text, as stored in SearchDocument.contenu"""
+    return re.findall(r'\w+', fold(text))
+
+
+def _document(kind, values):
+    _, title_fields, text_fields, date_field = SOURCES[kind]
+    titre = ' '.join(str(values[field]) for field in title_fields if values[field])
+    return SearchDocument(
+        kind=kind,
+        object_id=values['pk'],
+        titre=titre,
+        contenu=' '.join(tokenize(titre) + tokenize(' '.join(str(values[field] or '') for field in text_fields))),
+        date=values[date_field] if date_field else None,
+    )
+
+
+def index_instance(instance):
+    """Write the search document of a saved object"""
+    kind = KIND_BY_MODEL[type(instance)]
+    _, title_fields, text_fields, date_field = SOURCES[kind]
+    values = {field: getattr(instance, field) for field in title_fields + text_fields}
+    values['pk'] = instance.pk
+    if date_field:
+        values[date_field] = getattr(instance, date_field)
+
+    document = _document(kind, values)
+    SearchDocument.objects.update_or_create(
+        kind=kind,
+        object_id=instance.pk,
+        defaults={'titre': document.titre, 'contenu': document.contenu, 'date': document.date},
+    )
+
+
+def remove_instance(instance):
+    SearchDocument.objects.filter(kind=KIND_BY_MODEL[type(instance)], object_id=instance.pk).delete()
+
+
+def reindex(kind, pks=None, batch_size=1000):
+    """Rebuild the documents of a kind, or of some objects of it, returns the number indexed.
+
+    Meant for the code paths that skip the model signals (bulk_create, update).
+    """
+    model, title_fields, text_fields, date_field = SOURCES[kind]
+    queryset = model.objects.all()
+    documents = SearchDocument.objects.filter(kind=kind)
+    if pks is not None:
+        pks = list(pks)
+        queryset = queryset.filter(pk__in=pks)
+        documents = documents.filter(object_id__in=pks)
+
+    fields = ['pk', *title_fields, *text_fields] + ([date_field] if date_field else [])
+    rows = [_document(kind, values) for values in queryset.values(*fields).iterator(chunk_size=batch_size)]
+
+    with transaction.atomic():
+        documents.delete()
+        SearchDocument.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild():
+    """Reindex every kind, returns {kind: number of documents}"""
+    return {kind: reindex(kind) for kind in SOURCES}
+
+
+class InvertedIndex:
+    """In-memory word -> documents index used when the database has no FULLTEXT support.
+
+    Words are kept sorted so a query word matches every indexed word it is a
+    prefix of with a bisection, like the `word*` operator of MySQL boolean
+    mode. All query words must match; documents are ranked by summed weights.
+    """
+
+    def __init__(self, rows):
+        postings = defaultdict(lambda: defaultdict(int))
+        for pk, titre, contenu in rows:
+            for word in tokenize(titre):
+                postings[word][pk] += TITLE_WEIGHT
+            for word in contenu.split():
+                postings[word][pk] += 1
+
+        self._postings = postings
+        self._words = sorted(postings)
+
+    def _matches(self, term):
+        matches = {}
+        position = bisect_left(self._words, term)
+        while position < len(self._words) and self._words[position].startswith(term):
+            for pk, weight in self._postings[self._words[position]].items():
+                matches[pk] = max(matches.get(pk, 0), weight)
+            position += 1
+        return matches
+
+    def search(self, terms, limit=None):
+        """Return [(document pk, score)] best first"""
+        scores = None
+        for term in terms:
+            matches = self._matches(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {pk: score + matches[pk] for pk, score in scores.items() if pk in matches}
+            if not scores:
+                return []
+
+        ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+
+_index_lock = threading.Lock()
+_index = {'stamp': None, 'index': None}
+
+
+def _python_index():
+    """Process-wide InvertedIndex, rebuilt when the document table changed"""
+    stamp = SearchDocument.objects.aggregate(total=Count('id'), latest=Max('updated_at'))
+    stamp = (stamp['total'], stamp['latest'])
+
+    with _index_lock:
+        if _index['stamp'] != stamp:
+            rows = SearchDocument.objects.values_list('pk', 'titre', 'contenu').iterator(chunk_size=2000)
+            _index['index'] = InvertedIndex(rows)
+            _index['stamp'] = stamp
+        return _index['index']
+
+
+def search(query, limit=100):
+    """Ranked SearchDocuments matching every word of query, across all kinds"""
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    if connection.vendor != 'mysql':
+        ranked = _python_index().search(terms, limit)
+        documents = SearchDocument.objects.in_bulk([pk for pk, _ in ranked])
+        results = []
+        for pk, score in ranked:
+            if pk in documents:
+                documents[pk].score = score
+                results.append(documents[pk])
+        return results
+
+    queryset = SearchDocument.objects.all()
+    indexed = [term for term in terms if len(term) >= MIN_TOKEN_SIZE]
+    # Words too short for the FULLTEXT index are matched on the normalized text
+    for term in terms:
+        if len(term) < MIN_TOKEN_SIZE:
+            queryset = queryset.filter(contenu__contains=term)
+
+    if not indexed:
+        return list(queryset.order_by('titre')[:limit])
+
+    against = ' '.join(f'+{term}*' for term in indexed)
+    return list(
+        queryset.annotate(
+            score=RawSQL('MATCH (contenu) AGAINST (%s IN BOOLEAN MODE)', [against])
+        ).filter(score__gt=0).order_by('-score', 'titre')[:limit]
+    )
+
+
+def group_results(documents):
+    """{kind: [documents]} keeping the ranking inside each kind"""
+    groups = {kind: [] for kind in SOURCES}
+    for document in documents:
+        groups[document.kind].append(document)
+    return groups
@@ -0,0 +1,121 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from activities.models import Activite, Inscription
+from participants.models import Participant
+from staff.models import Responsable, Animateur
+from infrastructure.models import Infrastructure, Materiel
+from .chart_cache import invalidate_on_commit
+from .search import index_instance, remove_instance
+from .rollup import inscription_day, record_inscription, record_participant
+from .stats import apply_deltas, on_commit_refresh, participant_windows
+
+
+def _participant_deltas(date_inscription, sign):
+    week_ago, two_weeks_ago = participant_windows(timezone.localdate())
+    return {
+        'total_participants': sign,
+        'new_participants_week': sign if date_inscription and date_inscription >= week_ago else 0,
+        'new_participants_prev_week': sign if date_inscription and two_weeks_ago <= date_inscription < week_ago else 0,
+    }
+
+
+@receiver(post_save, sender=Participant)
+def participant_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        apply_deltas(**_participant_deltas(instance.date_inscription, 1))
+        record_participant(instance.date_inscription, 1)
+    if not raw:
+        invalidate_on_commit('participant')
+
+
+@receiver(post_delete, sender=Participant)
+def participant_deleted(sender, instance, **kwargs):
+    apply_deltas(**_participant_deltas(instance.date_inscription, -1))
+    record_participant(instance.date_inscription, -1)
+    invalidate_on_commit('participant')
+
+
+@receiver(post_save, sender=Responsable)
+@receiver(post_save, sender=Animateur)
+def staff_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        apply_deltas(total_staff=1)
+
+
+@receiver(post_delete, sender=Responsable)
+@receiver(post_delete, sender=Animateur)
+def staff_deleted(sender, instance, **kwargs):
+    apply_deltas(total_staff=-1)
+
+
+@receiver(post_save, sender=Activite)
+@receiver(post_delete, sender=Activite)
+def activite_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        on_commit_refresh('activities')
+        invalidate_on_commit('activite')
+
+
+@receiver(post_save, sender=Inscription)
+@receiver(post_delete, sender=Inscription)
+def inscription_changed(sender, instance, raw=False, **kwargs):
+    # Inscriptions move the activity counters behind full_activities
+    if not raw:
+        on_commit_refresh('registrations', 'activities')
+        invalidate_on_commit('inscription')
+
+
+@receiver(post_save, sender=Materiel)
+@receiver(post_delete, sender=Materiel)
+def materiel_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        on_commit_refresh('materials')
+        invalidate_on_commit('materiel')
+
+
+@receiver(post_save, sender=Inscription)
+def inscription_rollup_saved(sender, instance, created, raw=False, **kwargs):
+    """Move the daily rollup from the state stored by activities.signals before the save"""
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_state', None)
+    if previous:
+        previous = (*previous, getattr(instance, '_previous_a_participe', False))
+    current = (instance.activite_id, instance.statut, instance.a_participe)
+
+    if previous == current:
+        return
+
+    day = inscription_day(instance)
+    if previous:
+        record_inscription(day, *previous, -1)
+    record_inscription(day, *current, 1)
+
+
+@receiver(post_delete, sender=Inscription)
+def inscription_rollup_deleted(sender, instance, **kwargs):
+    record_inscription(inscription_day(instance), instance.activite_id, instance.statut, instance.a_participe, -1)
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_save, sender=Activite)
+@receiver(post_save, sender=Responsable)
+@receiver(post_save, sender=Animateur)
+@receiver(post_save, sender=Infrastructure)
+@receiver(post_save, sender=Materiel)
+def search_document_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_instance(instance)
+
+
+@receiver(post_delete, sender=Participant)
+@receiver(post_delete, sender=Activite)
+@receiver(post_delete, sender=Responsable)
+@receiver(post_delete, sender=Animateur)
+@receiver(post_delete, sender=Infrastructure)
+@receiver(post_delete, sender=Materiel)
+def search_document_deleted(sender, instance, **kwargs):
+    remove_instance(instance)
@@ -0,0 +1,252 @@
+import threading
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from activities.models import Activite, Inscription
+from participants.models import Participant
+from staff.models import Responsable, Animateur
+from infrastructure.models import Materiel
+from .models import DashboardSnapshot
+
+
+SNAPSHOT_PK = 1
+
+# Counters compared by the consistency checker
+COUNTER_FIELDS = [
+    'total_participants', 'new_participants_week', 'new_participants_prev_week',
+    'total_activities', 'activities_this_week', 'full_activities', 'total_staff',
+]
+
+
+def max_age():
+    """Seconds after which the snapshot is rebuilt even without any change signal"""
+    return getattr(settings, 'DASHBOARD_STATS_MAX_AGE', 15 * 60)
+
+
+def participant_windows(today):
+    """(this week, previous week) lower bounds of the new participants counters"""
+    week_ago = today - timedelta(days=7)
+    return week_ago, week_ago - timedelta(days=7)
+
+
+def compute_participants(today):
+    week_ago, two_weeks_ago = participant_windows(today)
+    return {
+        'total_participants': Participant.objects.count(),
+        'new_participants_week': Participant.objects.filter(date_inscription__gte=week_ago).count(),
+        'new_participants_prev_week': Participant.objects.filter(
+            date_inscription__gte=two_weeks_ago,
+            date_inscription__lt=week_ago
+        ).count(),
+    }
+
+
+def compute_activities(today):
+    today = timezone.make_aware(datetime.combine(today, time.min))
+    upcoming = Activite.objects.filter(
+        date_debut__gte=today,
+        annulee=False
+    ).select_related('responsable').order_by('date_debut')[:5]
+
+    return {
+        'total_activities': Activite.objects.count(),
+        'activities_this_week': Activite.objects.filter(
+            date_debut__gte=today,
+            date_debut__lte=today + timedelta(days=7),
+            annulee=False
+        ).count(),
+        'full_activities': Activite.objects.filter(
+            date_debut__gte=today,
+            annulee=False,
+            nb_inscrits__gte=F('capacite_max')
+        ).count(),
+        'upcoming_activities': [
+            {
+                'id': activity.pk,
+                'nom': activity.nom,
+                'date_debut': activity.date_debut.isoformat(),
+                'responsable': activity.responsable.get_full_name() if activity.responsable else '',
+            }
+            for activity in upcoming
+        ],
+    }
+
+
+def compute_registrations(today):
+    recent = Inscription.objects.select_related(
+        'participant', 'activite'
+    ).order_by('-date_inscription')[:5]
+
+    return {
+        'recent_registrations': [
+            {
+                'id': inscription.pk,
+                'participant': inscription.participant.get_full_name(),
+                'activite': inscription.activite.nom,
+                'date_inscription': inscription.date_inscription.isoformat(),
+            }
+            for inscription in recent
+        ],
+    }
+
+
+def compute_staff(today):
+    return {'total_staff': Responsable.objects.count() + Animateur.objects.count()}
+
+
+def compute_materials(today):
+    materials = Materiel.objects.filter(
+        quantite_disponible__lte=5
+    ).order_by('quantite_disponible')[:5]
+
+    return {
+        'low_stock_materials': [
+            {'id': material.pk, 'nom': material.nom, 'quantite_disponible': material.quantite_disponible}
+            for material in materials
+        ],
+    }
+
+
+SECTIONS = {
+    'participants': compute_participants,
+    'activities': compute_activities,
+    'registrations': compute_registrations,
+    'staff': compute_staff,
+    'materials': compute_materials,
+}
+
+
+def compute_all(today=None):
+    today = today or timezone.localdate()
+    values = {}
+    for compute in SECTIONS.values():
+        values.update(compute(today))
+    return values
+
+
+def refresh_snapshot():
+    """Recompute every statistic and store the snapshot"""
+    today = timezone.localdate()
+    values = compute_all(today)
+    snapshot, _ = DashboardSnapshot.objects.update_or_create(
+        pk=SNAPSHOT_PK,
+        defaults=dict(values, stats_date=today, computed_at=timezone.now()),
+    )
+    return snapshot
+
+
+def refresh_sections(*names):
+    """Recompute some sections of an existing snapshot in place"""
+    today = timezone.localdate()
+    values = {}
+    for name in names:
+        values.update(SECTIONS[name](today))
+    DashboardSnapshot.objects.filter(pk=SNAPSHOT_PK, stats_date=today).update(
+        updated_at=timezone.now(), **values
+    )
+
+
+def apply_deltas(**deltas):
+    """Move snapshot counters by the given amounts"""
+    deltas = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if deltas:
+        DashboardSnapshot.objects.filter(pk=SNAPSHOT_PK).update(updated_at=timezone.now(), **deltas)
+
+
+_pending = threading.local()
+
+
+def _flush_pending():
+    names = getattr(_pending, 'sections', set())
+    _pending.sections = set()
+    if names:
+        refresh_sections(*names)
+
+
+def on_commit_refresh(*names):
+    """Refresh sections once the transaction commits.
+
+    Sections requested by several saves of the same transaction are
+    refreshed once, by the first hook that runs.
+    """
+    if not hasattr(_pending, 'sections'):
+        _pending.sections = set()
+    _pending.sections.update(names)
+    transaction.on_commit(_flush_pending)
+
+
+def is_stale(snapshot, now=None):
+    now = now or timezone.now()
+    return (
+        snapshot.computed_at is None
+        or snapshot.stats_date != timezone.localdate(now)
+        or now - snapshot.computed_at > timedelta(seconds=max_age())
+    )
+
+
+def get_snapshot():
+    """Return the snapshot with one read, rebuilding it when missing or stale"""
+    snapshot = DashboardSnapshot.objects.filter(pk=SNAPSHOT_PK).first()
+    if snapshot is None or is_stale(snapshot):
+        snapshot = refresh_snapshot()
+    return snapshot
+
+
+def find_mismatches(snapshot=None):
+    """Compare the snapshot to the live aggregates, return [(field, stored, expected)]"""
+    snapshot = snapshot or DashboardSnapshot.objects.filter(pk=SNAPSHOT_PK).first()
+    if snapshot is None:
+        return [('snapshot', None, 'missing')]
+
+    expected = compute_all(snapshot.stats_date)
+    expected_lists = {
+        'upcoming_activities': [item['id'] for item in expected['upcoming_activities']],
+        'recent_registrations': [item['id'] for item in expected['recent_registrations']],
+        'low_stock_materials': [item['id'] for item in expected['low_stock_materials']],
+    }
+
+    mismatches = [
+        (field, getattr(snapshot, field), expected[field])
+        for field in COUNTER_FIELDS
+        if getattr(snapshot, field) != expected[field]
+    ]
+    for field, ids in expected_lists.items():
+        stored = [item['id'] for item in getattr(snapshot, field)]
+        if stored != ids:
+            mismatches.append((field, stored, ids))
+    return mismatches
+
+
+def snapshot_context(snapshot):
+    """Template context of the dashboard from a snapshot"""
+    new_week = snapshot.new_participants_week
+    prev_week = snapshot.new_participants_prev_week
+    if prev_week > 0:
+        growth_rate = ((new_week - prev_week) / prev_week) * 100
+    else:
+        growth_rate = 100 if new_week > 0 else 0
+
+    return {
+        'total_participants': snapshot.total_participants,
+        'new_participants_week': new_week,
+        'participant_growth_rate': growth_rate,
+        'total_activities': snapshot.total_activities,
+        'activities_this_week': snapshot.activities_this_week,
+        'full_activities': snapshot.full_activities,
+        'total_staff': snapshot.total_staff,
+        'upcoming_activities': [
+            dict(item, date_debut=parse_datetime(item['date_debut']))
+            for item in snapshot.upcoming_activities
+        ],
+        'recent_registrations': [
+            dict(item, date_inscription=parse_datetime(item['date_inscription']))
+            for item in snapshot.recent_registrations
+        ],
+        'low_stock_materials': snapshot.low_stock_materials,
+        'stats_computed_at': snapshot.computed_at,
+    }
@@ -1,3 +1,234 @@
-from django.test import TestCase
+import datetime
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from activities.models import Activite, SerieActivite
+from activities.registration import register_group
+from activities.series import update_series
+from participants.models import Participant
+from . import chart_cache, search
+from .autocomplete import AutocompleteIndex, PrefixIndex
+from .models import DashboardSnapshot
+from .search import TITLE_WEIGHT, InvertedIndex
+from .stats import SNAPSHOT_PK, refresh_snapshot
+
+
+class BulkSnapshotRefreshTest(TestCase):
+    """Bulk writes skipping the model signals still refresh the dashboard snapshot"""
+
+    def setUp(self):
+        self.activite = Activite.objects.create(
+            nom='Canoë', duree=60, capacite_max=2, date_debut=timezone.now() + datetime.timedelta(days=1),
+        )
+        self.participants = [
+            Participant.objects.create(nom=f'Nom{number}', prenom='Léa', date_naissance=datetime.date(2014, 1, 1))
+            for number in range(2)
+        ]
+        refresh_snapshot()
+
+    def _snapshot(self):
+        return DashboardSnapshot.objects.get(pk=SNAPSHOT_PK)
+
+    def test_group_registration(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            register_group(self.activite, [participant.pk for participant in self.participants])
+
+        snapshot = self._snapshot()
+        self.assertEqual(snapshot.full_activities, 1)
+        self.assertEqual(len(snapshot.recent_registrations), 2)
+
+    def test_series_update(self):
+        serie = SerieActivite.objects.create(
+            nom='Canoë', date_debut=timezone.localdate(), date_fin=timezone.localdate(), jours='0',
+        )
+        self.activite.serie = serie
+        self.activite.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_series(serie, {'nom': 'Kayak'})
+
+        self.assertEqual(self._snapshot().upcoming_activities[0]['nom'], 'Kayak')
+
+
+class ChartCacheLockTest(SimpleTestCase):
+    """Only the holder of the rebuild lock recomputes a chart"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.lock = chart_cache._lock_key('participants', 'month')
+        self.builds = []
+
+    def _build(self, data):
+        def build():
+            self.builds.append(data)
+            return data
+        return build
+
+    def test_lock_is_released_by_its_holder(self):
+        self.assertEqual(chart_cache.cached_chart('participants', 'month', self._build({'n': 1})), {'n': 1})
+        self.assertIsNone(cache.get(self.lock))
+        self.assertEqual(chart_cache.cached_chart('participants', 'month', self._build({'n': 2})), {'n': 1})
+        self.assertEqual(self.builds, [{'n': 1}])
+
+    def test_outdated_entry_is_served_during_a_rebuild(self):
+        chart_cache.cached_chart('participants', 'month', self._build({'n': 1}))
+        chart_cache.invalidate('participants')
+        cache.add(self.lock, 1)
+
+        self.assertEqual(chart_cache.cached_chart('participants', 'month', self._build({'n': 2})), {'n': 1})
+        self.assertEqual(self.builds, [{'n': 1}])
+
+    def test_cold_request_waits_for_the_lock_holder(self):
+        cache.add(self.lock, 1)
+        version = chart_cache.get_version('participants')
+        entry = {'version': version, 'computed_at': 0, 'data': {'n': 1}}
+        timer = threading.Timer(0.2, cache.set, [chart_cache._entry_key('participants', 'month'), entry])
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual(chart_cache.cached_chart('participants', 'month', self._build({'n': 2})), {'n': 1})
+        self.assertEqual(self.builds, [])
+
+    def test_cold_request_does_not_release_a_foreign_lock(self):
+        cache.add(self.lock, 1)
+
+        with mock.patch.object(chart_cache, 'COLD_WAIT', 0.1):
+            self.assertEqual(chart_cache.cached_chart('participants', 'month', self._build({'n': 2})), {'n': 2})
+        self.assertEqual(cache.get(self.lock), 1)
+
+
+class PrefixIndexTest(SimpleTestCase):
+    """Ranking of the suggestions of PrefixIndex"""
+
+    def _titles(self, index, query, **kwargs):
+        return [titre for _, _, titre in index.suggest(query, **kwargs)]
+
+    def test_ranking(self):
+        index = PrefixIndex([
+            (1, 'participant', 1, 'Léa Marchand'),
+            (2, 'participant', 2, 'Marc Petit'),
+            (3, 'participant', 3, 'Martine Dubois'),
+            (4, 'animateur', 4, 'Marc Roux'),
+            (5, 'activite', 5, 'Tir à l\'arc'),
+        ])
+
+        # Names starting with the query, shortest first, then the other ones
+        self.assertEqual(self._titles(index, 'mar'), ['Marc Roux', 'Marc Petit', 'Martine Dubois', 'Léa Marchand'])
+        self.assertEqual(self._titles(index, 'mar', kinds=['participant'], limit=2), ['Marc Petit', 'Martine Dubois'])
+        # Every word must start a word of the name
+        self.assertEqual(self._titles(index, 'pet marc'), ['Marc Petit'])
+        self.assertEqual(self._titles(index, 'arc'), ['Tir à l\'arc'])
+        self.assertEqual(self._titles(index, 'x'), [])
+
+    def test_best_matches_are_not_cut_by_word_order(self):
+        # The words of the weaker matches come first in the sorted keys
+        rows = [(number, 'participant', number, f'Zoé Maraa{number:02d}') for number in range(40)]
+        rows += [(100, 'participant', 100, 'Marie Durand'), (101, 'participant', 101, 'Léa Mars')]
+        index = PrefixIndex(rows)
+
+        self.assertEqual(self._titles(index, 'mar', limit=3), ['Marie Durand', 'Léa Mars', 'Zoé Maraa00'])
+
+    def test_add_and_remove(self):
+        index = PrefixIndex([(1, 'participant', 1, 'Léa Martin')])
+
+        index.add((1, 'participant', 1, 'Léa Durand'))
+        index.add((2, 'participant', 2, 'Hugo Martin'))
+        self.assertEqual(self._titles(index, 'mar'), ['Hugo Martin'])
+        index.remove(2)
+        index.remove(3)
+        self.assertEqual((len(index), self._titles(index, 'mar'), self._titles(index, 'dur')), (1, [], ['Léa Durand']))
+
+
+class AutocompleteIndexTest(TestCase):
+    """AutocompleteIndex follows the search documents through its version stamp"""
+
+    def setUp(self):
+        self.participant = Participant.objects.create(nom='Martin', prenom='Léa', date_naissance=datetime.date(2014, 1, 1))
+        self.index = AutocompleteIndex()
+        self.index.refresh()
+
+    def _titles(self, query):
+        return [titre for _, _, titre in self.index.refresh().suggest(query)]
+
+    def test_unchanged_table_is_not_read_again(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self._titles('mar'), ['Léa Martin'])
+
+    def test_changes_are_applied_in_place(self):
+        with mock.patch.object(self.index, 'reload', wraps=self.index.reload) as reload:
+            Participant.objects.create(nom='Marchand', prenom='Hugo', date_naissance=datetime.date(2013, 1, 1))
+            self.assertEqual(self._titles('mar'), ['Léa Martin', 'Hugo Marchand'])
+
+            self.participant.nom = 'Durand'
+            self.participant.save()
+            self.assertEqual((self._titles('mar'), self._titles('dur')), (['Hugo Marchand'], ['Léa Durand']))
+        reload.assert_not_called()
+
+    def test_deletion_reloads_the_index(self):
+        with mock.patch.object(self.index, 'reload', wraps=self.index.reload) as reload:
+            self.participant.delete()
+            self.assertEqual(self._titles('mar'), [])
+        reload.assert_called_once()
+
+
+class InvertedIndexTest(SimpleTestCase):
+    """Prefix matching and ranking of the in-memory search index"""
+
+    index = InvertedIndex([
+        (1, 'Léa Martin', 'lea martin example org'),
+        (2, 'Hugo Petit', 'hugo petit martine petit example org'),
+        (3, 'Canoë', 'canoe descente de la riviere'),
+    ])
+
+    def test_prefixes_match_every_longer_word(self):
+        self.assertEqual([pk for pk, _ in self.index.search(['mar'])], [1, 2])
+        self.assertEqual([pk for pk, _ in self.index.search(['riv'])], [3])
+        self.assertEqual(self.index.search(['martinez']), [])
+
+    def test_every_word_must_match(self):
+        self.assertEqual([pk for pk, _ in self.index.search(['petit', 'mar'])], [2])
+        self.assertEqual(self.index.search(['canoe', 'martin']), [])
+
+    def test_title_words_weigh_more(self):
+        # Title words are also in contenu, where the other fields count once
+        self.assertEqual(self.index.search(['martin']), [(1, TITLE_WEIGHT + 1), (2, 1)])
+        self.assertEqual(self.index.search(['lea', 'mar']), [(1, 2 * (TITLE_WEIGHT + 1))])
+        self.assertEqual(self.index.search(['mar'], limit=1), [(1, TITLE_WEIGHT + 1)])
+
+
+class SearchTest(TestCase):
+    """search() on a database without FULLTEXT, through the process-wide index"""
+
+    def setUp(self):
+        patcher = mock.patch.dict(search._index, {'stamp': None, 'index': None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.martin = Participant.objects.create(
+            nom='Martin', prenom='Léa', email='lea@example.org', date_naissance=datetime.date(2014, 1, 1),
+        )
+        self.petit = Participant.objects.create(
+            nom='Petit', prenom='Hugo', email='martin.petit@example.org', date_naissance=datetime.date(2013, 1, 1),
+        )
+
+    def test_ranked_documents(self):
+        results = search.search('Mar')
+
+        self.assertEqual([(document.titre, document.score) for document in results], [('Léa Martin', TITLE_WEIGHT + 1), ('Hugo Petit', 1)])
+        self.assertEqual([document.titre for document in search.search('martin hug')], ['Hugo Petit'])
+        self.assertEqual(search.search('  '), [])
+
+    def test_index_is_rebuilt_when_the_documents_change(self):
+        index = search._python_index()
+        self.assertIs(search._python_index(), index)
+
+        Participant.objects.create(nom='Marchand', prenom='Zoé', date_naissance=datetime.date(2015, 1, 1))
+        self.assertIsNot(search._python_index(), index)
+        self.assertEqual([document.titre for document in search.search('marc')], ['Zoé Marchand'])
+
+        self.petit.delete()
+        self.assertEqual([document.titre for document in search.search('mar')], ['Léa Martin', 'Zoé Marchand'])
@@ -6,7 +6,10 @@ app_name = 'dashboard'
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='index'),
     path('search/', views.SearchView.as_view(), name='search'),
+    path('autocomplete/', views.AutocompleteView.as_view(), name='autocomplete'),
     path('charts/participants/', views.ParticipantsChartView.as_view(), name='participants_chart'),
+    path('charts/inscriptions/', views.InscriptionsChartView.as_view(), name='inscriptions_chart'),
     path('charts/activities/', views.ActivitiesChartView.as_view(), name='activities_chart'),
     path('charts/materials/', views.MaterialsChartView.as_view(), name='materials_chart'),
+    path('charts/cache-stats/', views.ChartCacheStatsView.as_view(), name='chart_cache_stats'),
 ]
\ No newline at end of file
@@ -1,16 +1,18 @@
-from django.shortcuts import render, redirect
-from django.views.generic import TemplateView, ListView, View
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count, Sum, F, Q
+from django.shortcuts import render
+from django.views.generic import TemplateView, View
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.db.models import F, Case, When
+from django.core.exceptions import ImproperlyConfigured
 from django.http import JsonResponse
-from django.utils import timezone
-from datetime import timedelta
-from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
 
 from activities.models import Activite, Inscription
-from participants.models import Participant
-from staff.models import Responsable, Animateur
-from infrastructure.models import Infrastructure, Materiel
+from infrastructure.models import Materiel
+from .autocomplete import suggest
+from .chart_cache import cache_stats, cached_chart, reset_stats
+from .models import InscriptionDailyCount, ParticipantDailyCount
+from .rollup import PERIODS, series
+from .search import group_results, search
+from .stats import get_snapshot, snapshot_context
 
 
 class DashboardView(LoginRequiredMixin, TemplateView):
@@ -20,134 +22,125 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get current date and date range
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
-        
-        # Dashboard statistics
-        context['total_participants'] = Participant.objects.count()
-        context['total_activities'] = Activite.objects.count()
-        context['upcoming_activities'] = Activite.objects.filter(
-            date_debut__gte=today,
-            annulee=False
-        ).order_by('date_debut')[:5]
-        
-        context['recent_registrations'] = Inscription.objects.select_related(
-            'participant', 'activite'
-        ).order_by('-date_inscription')[:5]
-        
-        # Compare to previous period
-        new_participants_week = Participant.objects.filter(
-            date_inscription__gte=week_ago
-        ).count()
-        
-        new_participants_prev_week = Participant.objects.filter(
-            date_inscription__gte=week_ago - timedelta(days=7),
-            date_inscription__lt=week_ago
-        ).count()
-        
-        if new_participants_prev_week > 0:
-            growth_rate = ((new_participants_week - new_participants_prev_week) / new_participants_prev_week) * 100
-        else:
-            growth_rate = 100 if new_participants_week > 0 else 0
-            
-        context['new_participants_week'] = new_participants_week
-        context['participant_growth_rate'] = growth_rate
-        
-        # Activity statistics
-        context['activities_this_week'] = Activite.objects.filter(
-            date_debut__gte=today,
-            date_debut__lte=today + timedelta(days=7),
-            annulee=False
-        ).count()
-        
-        context['full_activities'] = Activite.objects.filter(
-            date_debut__gte=today,
-            annulee=False
-        ).annotate(
-            participants_count=Count('inscriptions')
-        ).filter(
-            participants_count__gte=F('capacite_max')
-        ).count()
-        
-        # Staff statistics
-        context['total_staff'] = Responsable.objects.count() + Animateur.objects.count()
-        
-        # Material statistics
-        context['low_stock_materials'] = Materiel.objects.filter(
-            quantite_disponible__lte=5
-        ).order_by('quantite_disponible')[:5]
+        # Dashboard statistics, precomputed by dashboard.stats
+        context.update(snapshot_context(get_snapshot()))
         
         return context
 
 
-class ParticipantsChartView(LoginRequiredMixin, View):
+class CachedChartMixin(LoginRequiredMixin):
+    """Serve the Chart.js data of a chart through dashboard.chart_cache.
+
+    Subclasses set chart_name, the chart_cache key invalidated by the model
+    signals, and implement build_data(period) returning the JSON data.
+    """
+    chart_name = None
+
+    def get_period(self):
+        return 'all'
+
+    def build_data(self, period):
+        raise NotImplementedError(f"{type(self).__name__} must implement build_data(period).")
+
+    def get(self, request, *args, **kwargs):
+        if self.chart_name is None:
+            raise ImproperlyConfigured(f"{type(self).__name__} is missing a chart_name.")
+        period = self.get_period()
+        data = cached_chart(self.chart_name, period, lambda: self.build_data(period))
+        return JsonResponse(data)
+
+
+class ParticipantsChartView(CachedChartMixin, View):
     """View to provide data for the participants chart"""
+    chart_name = 'participants'
     
-    def get(self, request, *args, **kwargs):
-        time_period = request.GET.get('period', 'week')
-        
-        today = timezone.now().date()
-        
-        if time_period == 'week':
-            # Last 7 days
-            start_date = today - timedelta(days=7)
-            query = Participant.objects.filter(date_inscription__gte=start_date)
-            query = query.annotate(date=TruncDay('date_inscription'))
-            date_format = '%d/%m'
-            
-        elif time_period == 'month':
-            # Last 30 days
-            start_date = today - timedelta(days=30)
-            query = Participant.objects.filter(date_inscription__gte=start_date)
-            query = query.annotate(date=TruncDay('date_inscription'))
-            date_format = '%d/%m'
-            
-        elif time_period == 'year':
-            # Last 12 months
-            start_date = today - timedelta(days=365)
-            query = Participant.objects.filter(date_inscription__gte=start_date)
-            query = query.annotate(date=TruncMonth('date_inscription'))
-            date_format = '%m/%Y'
-        else:
-            # All time (group by month)
-            query = Participant.objects.all()
-            query = query.annotate(date=TruncMonth('date_inscription'))
-            date_format = '%m/%Y'
-        
-        # Group by date and count
-        data = query.values('date').annotate(count=Count('id')).order_by('date')
-        
-        # Format for Chart.js
-        labels = [entry['date'].strftime(date_format) if entry['date'] else 'N/A' for entry in data]
-        counts = [entry['count'] for entry in data]
+    def get_period(self):
+        period = self.request.GET.get('period', 'week')
+        return period if period in ('week', 'month', 'year') else 'all'
+    
+    def build_data(self, time_period):
+        # Daily counts from the rollup table, by day up to a month and by month beyond
+        buckets, values = series(ParticipantDailyCount.objects.all(), time_period, ['nouveaux'])
+        date_format = '%d/%m' if PERIODS[time_period][1] == 'day' else '%m/%Y'
         
-        return JsonResponse({
-            'labels': labels,
+        return {
+            'labels': [day.strftime(date_format) for day in buckets],
             'datasets': [{
                 'label': 'Nouveaux participants',
                 'backgroundColor': 'rgba(99, 102, 241, 0.5)',
                 'borderColor': 'rgb(99, 102, 241)',
-                'data': counts,
+                'data': values['nouveaux'],
             }]
+        }
+
+
+class InscriptionsChartView(CachedChartMixin, View):
+    """View to provide data for the inscriptions trend chart, optionally for one activity"""
+    chart_name = 'inscriptions'
+    
+    STATUT_COLORS = {
+        'inscrit': 'rgb(99, 102, 241)',
+        'en_attente': 'rgb(245, 158, 11)',
+        'annule': 'rgb(239, 68, 68)',
+    }
+    
+    def get_period(self):
+        period = self.request.GET.get('period', 'month')
+        period = period if period in PERIODS else 'all'
+        activite = self.request.GET.get('activite', '')
+        return f"{period}:{activite}" if activite.isdigit() else period
+    
+    def build_data(self, period):
+        period, _, activite = period.partition(':')
+        queryset = InscriptionDailyCount.objects.all()
+        if activite:
+            queryset = queryset.filter(activite_id=activite)
+        
+        # One bucketed query per status would scan the rollup three times, pivot a single one instead
+        fields = []
+        annotations = {}
+        for statut, _ in Inscription.STATUT_CHOICES:
+            annotations[statut] = Case(When(statut=statut, then=F('inscriptions')), default=0)
+            fields.append(statut)
+        buckets, values = series(queryset.annotate(**annotations), period, fields + ['presences'])
+        date_format = '%d/%m' if PERIODS[period][1] == 'day' else '%m/%Y'
+        
+        datasets = [
+            {
+                'label': label,
+                'borderColor': self.STATUT_COLORS[statut],
+                'backgroundColor': self.STATUT_COLORS[statut],
+                'data': values[statut],
+            }
+            for statut, label in Inscription.STATUT_CHOICES
+        ]
+        datasets.append({
+            'label': 'Présences',
+            'borderColor': 'rgb(16, 185, 129)',
+            'backgroundColor': 'rgb(16, 185, 129)',
+            'borderDash': [5, 5],
+            'data': values['presences'],
         })
+        
+        return {
+            'labels': [day.strftime(date_format) for day in buckets],
+            'datasets': datasets,
+        }
 
 
-class ActivitiesChartView(LoginRequiredMixin, View):
+class ActivitiesChartView(CachedChartMixin, View):
     """View to provide data for the activities chart"""
+    chart_name = 'activities'
     
-    def get(self, request, *args, **kwargs):
+    def build_data(self, period):
         # Get top activities by participant count
-        top_activities = Activite.objects.annotate(
-            participants_count=Count('inscriptions')
-        ).order_by('-participants_count')[:10]
+        top_activities = Activite.objects.order_by('-nb_inscrits')[:10]
         
         labels = [activity.nom for activity in top_activities]
-        counts = [activity.participants_count for activity in top_activities]
+        counts = [activity.nb_inscrits for activity in top_activities]
         capacities = [activity.capacite_max or 0 for activity in top_activities]
         
-        return JsonResponse({
+        return {
             'labels': labels,
             'datasets': [
                 {
@@ -163,13 +156,14 @@ class ActivitiesChartView(LoginRequiredMixin, View):
                     'data': capacities,
                 }
             ]
-        })
+        }
 
 
-class MaterialsChartView(LoginRequiredMixin, View):
+class MaterialsChartView(CachedChartMixin, View):
     """View to provide data for the materials chart"""
+    chart_name = 'materials'
     
-    def get(self, request, *args, **kwargs):
+    def build_data(self, period):
         # Get materials with low stock
         materials = Materiel.objects.order_by('quantite_disponible')[:10]
         
@@ -180,7 +174,7 @@ class MaterialsChartView(LoginRequiredMixin, View):
         max_quantity = max(quantities) if quantities else 10
         thresholds = [max_quantity * 0.3] * len(labels)  # 30% of max as warning threshold
         
-        return JsonResponse({
+        return {
             'labels': labels,
             'datasets': [
                 {
@@ -197,71 +191,71 @@ class MaterialsChartView(LoginRequiredMixin, View):
                     'borderDash': [5, 5],
                 }
             ]
-        })
+        }
+
+
+class ChartCacheStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Hit and miss counters of the chart cache"""
+    
+    def test_func(self):
+        return self.request.user.is_staff
+    
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('reset'):
+            reset_stats()
+        return JsonResponse({'success': True, 'stats': cache_stats()})
 
 
 class SearchView(LoginRequiredMixin, View):
     """Global search view for the dashboard"""
     
+    # Results shown per kind of object
+    LIMITS = {
+        'participant': 10,
+        'activite': 10,
+        'responsable': 5,
+        'animateur': 5,
+        'infrastructure': 5,
+        'materiel': 5,
+    }
+    
     def get(self, request, *args, **kwargs):
         query = request.GET.get('q', '')
         
         if not query:
             return render(request, 'dashboard/search.html', {'query': query})
         
-        # Search participants
-        participants = Participant.objects.filter(
-            Q(nom__icontains=query) | 
-            Q(prenom__icontains=query) |
-            Q(email__icontains=query)
-        )[:10]
-        
-        # Search activities
-        activities = Activite.objects.filter(
-            Q(nom__icontains=query) | 
-            Q(description__icontains=query)
-        )[:10]
-        
-        # Search staff
-        responsables = Responsable.objects.filter(
-            Q(nom__icontains=query) | 
-            Q(prenom__icontains=query) |
-            Q(email__icontains=query)
-        )[:5]
-        
-        animateurs = Animateur.objects.filter(
-            Q(nom__icontains=query) | 
-            Q(prenom__icontains=query) |
-            Q(email__icontains=query)
-        )[:5]
-        
-        # Search infrastructure and materials
-        infrastructures = Infrastructure.objects.filter(
-            Q(nom__icontains=query) | 
-            Q(type__icontains=query)
-        )[:5]
-        
-        materials = Materiel.objects.filter(
-            Q(nom__icontains=query) | 
-            Q(description__icontains=query)
-        )[:5]
+        # Ranked documents of every kind from the search index, in one query
+        groups = group_results(search(query, limit=200))
+        results = {kind: documents[:self.LIMITS[kind]] for kind, documents in groups.items()}
         
         context = {
             'query': query,
-            'participants': participants,
-            'activities': activities,
-            'responsables': responsables,
-            'animateurs': animateurs,
-            'infrastructures': infrastructures,
-            'materials': materials,
-            'has_results': any([
-                participants.exists(),
-                activities.exists(),
-                responsables.exists(),
-                animateurs.exists(),
-                infrastructures.exists(),
-                materials.exists()
-            ])
+            'participants': results['participant'],
+            'activities': results['activite'],
+            'responsables': results['responsable'],
+            'animateurs': results['animateur'],
+            'infrastructures': results['infrastructure'],
+            'materials': results['materiel'],
+            'more': {kind: len(groups[kind]) > limit for kind, limit in self.LIMITS.items()},
+            'has_results': any(results.values()),
         }
         
-        return render(request, 'dashboard/search.html', context)
\ No newline at end of file
+        return render(request, 'dashboard/search.html', context)
+
+
+class AutocompleteView(LoginRequiredMixin, View):
+    """Name suggestions while typing, served from the in-memory prefix index"""
+    
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        kinds = [kind for kind in request.GET.get('types', '').split(',') if kind]
+        try:
+            limit = min(max(int(request.GET.get('limit', 10)), 1), 20)
+        except ValueError:
+            limit = 10
+        
+        if len(query) < 2:
+            return JsonResponse({'success': True, 'results': []})
+        
+        return JsonResponse({'success': True, 'results': suggest(query, kinds, limit)})
@@ -0,0 +1,152 @@
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.db.models import Q
+
+from core.utils import IntervalIndex, overlapping_pairs
+from .models import InfrastructureReservation
+
+
+Booking = namedtuple('Booking', ['kind', 'pk', 'infrastructure_id', 'start', 'end', 'label'])
+
+RESERVATION = 'reservation'
+ACTIVITE = 'activite'
+PROPOSAL = 'proposal'
+
+
+class BookingCalendar:
+    """Bookings of infrastructures, from both reservations and activities.
+
+    The calendar is loaded with one query per table for a whole time window,
+    then every overlap question is answered in memory from a per-infrastructure
+    IntervalIndex.
+    """
+
+    def __init__(self, bookings=()):
+        by_infrastructure = defaultdict(list)
+        for booking in bookings:
+            by_infrastructure[booking.infrastructure_id].append((booking.start, booking.end, booking))
+
+        self._indexes = {
+            infrastructure_id: IntervalIndex(items)
+            for infrastructure_id, items in by_infrastructure.items()
+        }
+
+    @classmethod
+    def load(cls, infrastructure_ids, start, end, exclude_reservations=(), exclude_activites=()):
+        """Load every booking of the given infrastructures overlapping [start, end)"""
+        from activities.models import Activite
+
+        infrastructure_ids = list(infrastructure_ids)
+        bookings = []
+
+        reservations = InfrastructureReservation.objects.filter(
+            infrastructure_id__in=infrastructure_ids,
+            date_fin__gt=start,
+            date_debut__lt=end,
+        ).exclude(
+            pk__in=exclude_reservations
+        ).values_list('pk', 'infrastructure_id', 'date_debut', 'date_fin', 'motif')
+
+        for pk, infrastructure_id, booking_start, booking_end, motif in reservations:
+            bookings.append(Booking(RESERVATION, pk, infrastructure_id, booking_start, booking_end, motif))
+
+        # Activities without date_fin are widened by their duration below
+        activities = Activite.objects.filter(
+            Q(date_fin__gt=start) | Q(date_fin__isnull=True),
+            infrastructure_id__in=infrastructure_ids,
+            date_debut__lt=end,
+            annulee=False,
+        ).exclude(
+            pk__in=exclude_activites
+        ).values_list('pk', 'infrastructure_id', 'date_debut', 'date_fin', 'duree', 'nom')
+
+        for pk, infrastructure_id, booking_start, booking_end, duree, nom in activities:
+            booking_end = booking_end or booking_start + timedelta(minutes=duree or 0)
+            if booking_end > start:
+                bookings.append(Booking(ACTIVITE, pk, infrastructure_id, booking_start, booking_end, nom))
+
+        return cls(bookings)
+
+    def overlapping(self, infrastructure_id, start, end):
+        """Return the bookings of an infrastructure overlapping [start, end), sorted by start"""
+        index = self._indexes.get(infrastructure_id)
+        if index is None:
+            return []
+        return [item[2] for item in index.overlapping(start, end)]
+
+    def check_batch(self, proposals):
+        """Find the conflicts of several proposed bookings in a single sweep per infrastructure.
+
+        proposals is a list of (infrastructure_id, start, end) tuples. Returns a
+        list with, for each proposal, the existing bookings and the other
+        proposals (as Booking with kind PROPOSAL and pk set to their position)
+        it overlaps.
+        """
+        conflicts = [[] for _ in proposals]
+
+        by_infrastructure = defaultdict(list)
+        for position, (infrastructure_id, start, end) in enumerate(proposals):
+            proposal = Booking(PROPOSAL, position, infrastructure_id, start, end, '')
+            by_infrastructure[infrastructure_id].append((start, end, proposal))
+
+        for infrastructure_id, items in by_infrastructure.items():
+            index = self._indexes.get(infrastructure_id)
+            if index is not None:
+                items = items + list(index)
+
+            for first, second in overlapping_pairs(items):
+                first, second = first[2], second[2]
+                if first.kind == PROPOSAL:
+                    conflicts[first.pk].append(second)
+                if second.kind == PROPOSAL:
+                    conflicts[second.pk].append(first)
+
+        return conflicts
+
+
+def find_conflicts(infrastructure, start, end, exclude_reservation=None, exclude_activite=None):
+    """Return the bookings overlapping [start, end) on one infrastructure"""
+    infrastructure_id = getattr(infrastructure, 'pk', infrastructure)
+    calendar = BookingCalendar.load(
+        [infrastructure_id], start, end,
+        exclude_reservations=[exclude_reservation] if exclude_reservation else (),
+        exclude_activites=[exclude_activite] if exclude_activite else (),
+    )
+    return calendar.overlapping(infrastructure_id, start, end)
+
+
+def check_bookings(proposals, exclude_activites=()):
+    """Check a batch of (infrastructure_id, start, end) proposals against the database and each other"""
+    if not proposals:
+        return []
+
+    window_start = min(proposal[1] for proposal in proposals)
+    window_end = max(proposal[2] for proposal in proposals)
+    infrastructure_ids = {proposal[0] for proposal in proposals}
+
+    calendar = BookingCalendar.load(
+        infrastructure_ids, window_start, window_end,
+        exclude_activites=exclude_activites,
+    )
+    return calendar.check_batch(proposals)
+
+
+def describe_conflicts(conflicts, limit=3):
+    """Human readable summary of a list of conflicting bookings"""
+    messages = []
+
+    if any(booking.kind == RESERVATION for booking in conflicts):
+        messages.append("Cette période chevauche une réservation existante.")
+
+    activities = [booking.label for booking in conflicts if booking.kind == ACTIVITE]
+    if activities:
+        activity_names = ", ".join(activities[:limit])
+        if len(activities) > limit:
+            activity_names += f" et {len(activities) - limit} autre(s)"
+        messages.append(f"Des activités sont programmées pendant cette période: {activity_names}")
+
+    if any(booking.kind == PROPOSAL for booking in conflicts):
+        messages.append("Cette période chevauche une autre réservation demandée.")
+
+    return messages
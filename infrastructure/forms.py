@@ -3,6 +3,7 @@ from django.utils import timezone
 from datetime import timedelta
 
 from .models import Infrastructure, Materiel, InfrastructureReservation
+from .conflicts import find_conflicts, describe_conflicts
 
 
 class InfrastructureForm(forms.ModelForm):
@@ -96,44 +97,15 @@ class InfrastructureReservationForm(forms.ModelForm):
                 self.add_error('date_debut', 
                               "La date de début ne peut pas être dans le passé.")
             
-            # Check if there are any overlapping reservations
-            if 'infrastructure' in self.initial and start and end:
-                infrastructure = self.initial['infrastructure']
-                
-                overlapping = InfrastructureReservation.objects.filter(
-                    infrastructure=infrastructure,
-                    date_fin__gt=start,
-                    date_debut__lt=end
-                )
-                
-                # Exclude current instance for updates
-                if self.instance.pk:
-                    overlapping = overlapping.exclude(pk=self.instance.pk)
-                
-                if overlapping.exists():
-                    self.add_error(None, 
-                                  "Cette période chevauche une réservation existante.")
-            
-            # Check if there are any activities scheduled during this time
-            if 'infrastructure' in self.initial and start and end:
-                from activities.models import Activite
-                
-                infrastructure = self.initial['infrastructure']
-                
-                activities = Activite.objects.filter(
-                    infrastructure=infrastructure,
-                    date_fin__gt=start,
-                    date_debut__lt=end,
-                    annulee=False
+            # Check reservations and activities already booked on this infrastructure
+            if 'infrastructure' in self.initial and start < end:
+                conflicts = find_conflicts(
+                    self.initial['infrastructure'], start, end,
+                    exclude_reservation=self.instance.pk
                 )
                 
-                if activities.exists():
-                    activity_names = ", ".join([a.nom for a in activities[:3]])
-                    if activities.count() > 3:
-                        activity_names += f" et {activities.count() - 3} autre(s)"
-                    
-                    self.add_error(None, 
-                                  f"Des activités sont programmées pendant cette période: {activity_names}")
+                for message in describe_conflicts(conflicts):
+                    self.add_error(None, message)
         
         return cleaned_data
     
\ No newline at end of file
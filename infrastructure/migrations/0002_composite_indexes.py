@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infrastructure', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='infrastructurereservation',
+            index=models.Index(fields=['infrastructure', 'date_debut', 'date_fin'], name='reservation_infra_periode_idx'),
+        ),
+    ]
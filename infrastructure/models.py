@@ -58,5 +58,10 @@ class InfrastructureReservation(TimestampMixin):
     responsable = models.CharField(max_length=100)
     notes = models.TextField(blank=True, null=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['infrastructure', 'date_debut', 'date_fin'], name='reservation_infra_periode_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.infrastructure} - {self.date_debut.date()}"
\ No newline at end of file
@@ -1,3 +1,93 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+
+from activities.models import Activite
+from .conflicts import ACTIVITE, PROPOSAL, RESERVATION, check_bookings, find_conflicts
+from .models import Infrastructure, InfrastructureReservation
+
+
+class ConflictTest(TestCase):
+    """Overlaps of reservations, activities and proposals on one infrastructure"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        cls.infrastructure = Infrastructure.objects.create(nom="Gymnase", type="Salle")
+        cls.other = Infrastructure.objects.create(nom="Terrain", type="Extérieur")
+        # 10:00-12:00 reserved, 14:00-15:00 taken by an activity
+        cls.reservation = InfrastructureReservation.objects.create(
+            infrastructure=cls.infrastructure, date_debut=cls.at(10), date_fin=cls.at(12),
+            motif="Tournoi", responsable="Direction",
+        )
+        cls.activite = Activite.objects.create(
+            nom="Basket", duree=60, date_debut=cls.at(14), date_fin=cls.at(15), infrastructure=cls.infrastructure,
+        )
+
+    @classmethod
+    def at(cls, hour, minute=0):
+        return cls.start + timedelta(hours=hour, minutes=minute)
+
+    def _kinds(self, conflicts):
+        return sorted((booking.kind, booking.pk) for booking in conflicts)
+
+    def test_back_to_back_bookings_do_not_conflict(self):
+        self.assertEqual(find_conflicts(self.infrastructure, self.at(12), self.at(14)), [])
+        self.assertEqual(find_conflicts(self.infrastructure, self.at(8), self.at(10)), [])
+        self.assertEqual(find_conflicts(self.infrastructure, self.at(15), self.at(16)), [])
+
+        conflicts = check_bookings([
+            (self.infrastructure.pk, self.at(12), self.at(13)),
+            (self.infrastructure.pk, self.at(13), self.at(14)),
+        ])
+        self.assertEqual(conflicts, [[], []])
+
+    def test_nested_and_overlapping_bookings_conflict(self):
+        cases = [
+            (self.at(10, 30), self.at(11, 30), [(RESERVATION, self.reservation.pk)]),
+            (self.at(9), self.at(13), [(RESERVATION, self.reservation.pk)]),
+            (self.at(11, 59), self.at(14, 1), [(ACTIVITE, self.activite.pk), (RESERVATION, self.reservation.pk)]),
+            (self.at(14, 30), self.at(16), [(ACTIVITE, self.activite.pk)]),
+        ]
+        for start, end, expected in cases:
+            with self.subTest(start=start.time(), end=end.time()):
+                self.assertEqual(self._kinds(find_conflicts(self.infrastructure, start, end)), expected)
+
+        self.assertEqual(find_conflicts(self.other, self.at(9), self.at(16)), [])
+
+    def test_proposals_conflict_with_each_other(self):
+        conflicts = check_bookings([
+            (self.infrastructure.pk, self.at(16), self.at(19)),
+            (self.infrastructure.pk, self.at(17), self.at(18)),
+            (self.infrastructure.pk, self.at(18), self.at(20)),
+            (self.other.pk, self.at(17), self.at(18)),
+        ])
+
+        self.assertEqual(self._kinds(conflicts[0]), [(PROPOSAL, 1), (PROPOSAL, 2)])
+        self.assertEqual(self._kinds(conflicts[1]), [(PROPOSAL, 0)])
+        self.assertEqual(self._kinds(conflicts[2]), [(PROPOSAL, 0)])
+        self.assertEqual(conflicts[3], [])
+
+    def test_cancelled_activities_are_ignored(self):
+        Activite.objects.filter(pk=self.activite.pk).update(annulee=True)
+
+        self.assertEqual(find_conflicts(self.infrastructure, self.at(14), self.at(15)), [])
+        self.assertEqual(check_bookings([(self.infrastructure.pk, self.at(14), self.at(15))]), [[]])
+
+    def test_activity_without_end_uses_its_duration(self):
+        Activite.objects.filter(pk=self.activite.pk).update(date_fin=None, duree=90)
+
+        self.assertEqual(self._kinds(find_conflicts(self.infrastructure, self.at(15), self.at(16))), [(ACTIVITE, self.activite.pk)])
+        self.assertEqual(find_conflicts(self.infrastructure, self.at(15, 30), self.at(16)), [])
+
+    def test_excluded_bookings_are_ignored(self):
+        self.assertEqual(find_conflicts(self.infrastructure, self.at(10), self.at(12), exclude_reservation=self.reservation.pk), [])
+        self.assertEqual(find_conflicts(self.infrastructure, self.at(14), self.at(15), exclude_activite=self.activite.pk), [])
+
+        # Excluding one booking keeps the others
+        conflicts = find_conflicts(self.infrastructure, self.at(11), self.at(15), exclude_activite=self.activite.pk)
+        self.assertEqual(self._kinds(conflicts), [(RESERVATION, self.reservation.pk)])
 
-# Create your tests here.
+        conflicts = check_bookings([(self.infrastructure.pk, self.at(11), self.at(15))], exclude_activites=[self.activite.pk])
+        self.assertEqual(self._kinds(conflicts[0]), [(RESERVATION, self.reservation.pk)])
@@ -21,4 +21,9 @@ urlpatterns = [
     path('materiel/<int:pk>/', views.MaterielDetailView.as_view(), name='materiel_detail'),
     path('materiel/<int:pk>/update/', views.MaterielUpdateView.as_view(), name='materiel_update'),
     path('materiel/<int:pk>/delete/', views.MaterielDeleteView.as_view(), name='materiel_delete'),
+    path('materiel/<int:pk>/demand/', views.MaterielDemandView.as_view(), name='materiel_demand'),
+    
+    # API
+    path('check-availability/', views.check_availability, name='check_availability'),
+    path('<int:pk>/events-json/', views.infrastructure_events_json, name='events_json'),
 ]
\ No newline at end of file
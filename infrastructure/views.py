@@ -1,17 +1,27 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
 from django.db.models import Q, Count
 from django.utils import timezone
+from datetime import timedelta
+from django.http import JsonResponse
+from django.contrib.auth.decorators import login_required
 
 from .models import Infrastructure, Materiel, InfrastructureReservation
 from .forms import InfrastructureForm, MaterielForm, InfrastructureReservationForm
+from .conflicts import check_bookings, describe_conflicts
 from activities.models import Activite
+from activities.events import EventBuilder, parse_range
+from activities.ics import feed_url
+from core.mixins import CachedCountMixin
+from core.utils import parse_window
 
 
-class InfrastructureListView(LoginRequiredMixin, ListView):
+class InfrastructureListView(LoginRequiredMixin, CachedCountMixin, ListView):
     """View for listing all infrastructures"""
     model = Infrastructure
     template_name = 'infrastructure/list.html'
@@ -83,7 +93,7 @@ class InfrastructureDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        infrastructure = self.get_object()
+        infrastructure = self.object
         
         # Get upcoming activities using this infrastructure
         now = timezone.now()
@@ -105,6 +115,9 @@ class InfrastructureDetailView(LoginRequiredMixin, DetailView):
             date_fin__gte=now
         ).order_by('date_debut')
         
+        # Calendar subscription link
+        context['calendar_feed_url'] = self.request.build_absolute_uri(feed_url('infrastructure', infrastructure.pk))
+        
         return context
 
 
@@ -162,7 +175,7 @@ class InfrastructureDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteVi
         return super().delete(request, *args, **kwargs)
 
 
-class MaterielListView(LoginRequiredMixin, ListView):
+class MaterielListView(LoginRequiredMixin, CachedCountMixin, ListView):
     """View for listing all materials"""
     model = Materiel
     template_name = 'infrastructure/materiel_list.html'
@@ -225,7 +238,7 @@ class MaterielDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        materiel = self.get_object()
+        materiel = self.object
         
         # Get activities using this material
         from activities.models import ActiviteMateriel
@@ -237,6 +250,53 @@ class MaterielDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
+class MaterielDemandView(LoginRequiredMixin, View):
+    """View to provide the booked quantity of a material over time for a chart"""
+    
+    BUCKETS = {
+        'hour': (timedelta(hours=1), '%d/%m %Hh'),
+        'day': (timedelta(days=1), '%d/%m'),
+    }
+    
+    def get(self, request, *args, **kwargs):
+        from activities.ledger import MaterielLedger
+        
+        materiel = get_object_or_404(Materiel, pk=self.kwargs['pk'])
+        
+        bucket, date_format = self.BUCKETS.get(request.GET.get('bucket'), self.BUCKETS['hour'])
+        try:
+            days = min(max(int(request.GET.get('days', 7)), 1), 90)
+        except ValueError:
+            days = 7
+        
+        start = timezone.localtime().replace(minute=0, second=0, microsecond=0)
+        if bucket == self.BUCKETS['day'][0]:
+            start = start.replace(hour=0)
+        end = start + timedelta(days=days)
+        
+        ledger = MaterielLedger.load([materiel.pk], start, end)
+        peaks = ledger.bucketed_peaks(materiel.pk, start, end, bucket=bucket)
+        
+        return JsonResponse({
+            'labels': [timezone.localtime(bucket_start).strftime(date_format) for bucket_start, _ in peaks],
+            'datasets': [
+                {
+                    'label': 'Quantité réservée',
+                    'backgroundColor': 'rgba(99, 102, 241, 0.5)',
+                    'borderColor': 'rgb(99, 102, 241)',
+                    'data': [peak for _, peak in peaks],
+                },
+                {
+                    'label': 'Quantité disponible',
+                    'backgroundColor': 'rgba(239, 68, 68, 0.3)',
+                    'borderColor': 'rgb(239, 68, 68)',
+                    'data': [materiel.quantite_disponible] * len(peaks),
+                    'borderDash': [5, 5],
+                }
+            ]
+        })
+
+
 class MaterielCreateView(LoginRequiredMixin, CreateView):
     """View for creating a new material"""
     model = Materiel
@@ -330,4 +390,81 @@ class InfrastructureReservationDeleteView(LoginRequiredMixin, DeleteView):
     
     def delete(self, request, *args, **kwargs):
         messages.success(request, 'Réservation supprimée avec succès.')
-        return super().delete(request, *args, **kwargs)
\ No newline at end of file
+        return super().delete(request, *args, **kwargs)
+
+
+def _parse_booking(data):
+    """Return (infrastructure_id, start, end) from request data, or None if invalid"""
+    try:
+        infrastructure_id = int(data.get('infrastructure'))
+    except (TypeError, ValueError):
+        return None
+    
+    window = parse_window(data.get('start'), data.get('end'))
+    if window is None:
+        return None
+    return (infrastructure_id, *window)
+
+
+@login_required
+def check_availability(request):
+    """AJAX view to validate one booking (GET) or a batch of bookings (POST JSON)"""
+    if request.method == 'POST':
+        try:
+            payload = json.loads(request.body or '{}')
+            proposals = [_parse_booking(booking) for booking in payload.get('bookings', [])]
+        except (ValueError, AttributeError):
+            proposals = [None]
+    else:
+        proposals = [_parse_booking(request.GET)]
+    
+    if not proposals or None in proposals:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid booking'
+        }, status=400)
+    
+    results = []
+    for (infrastructure_id, start, end), conflicts in zip(proposals, check_bookings(proposals)):
+        results.append({
+            'infrastructure': infrastructure_id,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'available': not conflicts,
+            'messages': describe_conflicts(conflicts),
+            'conflicts': [
+                {
+                    'type': booking.kind,
+                    'id': booking.pk,
+                    'label': booking.label,
+                    'start': booking.start.isoformat(),
+                    'end': booking.end.isoformat(),
+                }
+                for booking in conflicts
+            ],
+        })
+    
+    return JsonResponse({
+        'success': True,
+        'results': results
+    })
+
+
+@login_required
+def infrastructure_events_json(request, pk):
+    """AJAX view to get an infrastructure's activities and reservations as JSON for calendar"""
+    infrastructure = get_object_or_404(Infrastructure, pk=pk)
+    
+    try:
+        start, end = parse_range(request)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid time window'
+        }, status=400)
+    
+    builder = EventBuilder(start, end)
+    events = builder.activities(Activite.objects.filter(infrastructure=infrastructure))
+    events += builder.reservations(InfrastructureReservation.objects.filter(infrastructure=infrastructure))
+    
+    return JsonResponse(events, safe=False)
\ No newline at end of file
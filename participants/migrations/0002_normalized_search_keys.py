@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_search_keys(apps, schema_editor):
+    from core.utils import digits, fold
+
+    model = apps.get_model('participants', 'Participant')
+    batch = []
+    for row in model.objects.only('id', 'nom', 'prenom', 'telephone').iterator(chunk_size=BATCH_SIZE):
+        row.nom_normalise = fold(row.nom)
+        row.prenom_normalise = fold(row.prenom)
+        row.telephone_normalise = digits(row.telephone)
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_update(batch, ['nom_normalise', 'prenom_normalise', 'telephone_normalise'])
+            batch = []
+    model.objects.bulk_update(batch, ['nom_normalise', 'prenom_normalise', 'telephone_normalise'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('participants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='nom_normalise',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='prenom_normalise',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='telephone_normalise',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_search_keys, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
-from core.models import TimestampMixin
+from core.models import NormalizedFieldsMixin, TimestampMixin
 
-class Participant(TimestampMixin):
+class Participant(NormalizedFieldsMixin, TimestampMixin):
     """Model representing a camp participant"""
     nom = models.CharField(max_length=100)
     prenom = models.CharField(max_length=100)
@@ -18,9 +18,26 @@ class Participant(TimestampMixin):
     health_notes = models.TextField(blank=True, null=True)
     has_authorization = models.BooleanField(default=False, help_text="Parent's authorization to participate")
     
+    # Search keys maintained by NormalizedFieldsMixin, matched by prefix in the list views
+    nom_normalise = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    prenom_normalise = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    telephone_normalise = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
+    
+    NORMALIZED_FIELDS = {
+        'nom_normalise': ('nom', 'text'),
+        'prenom_normalise': ('prenom', 'text'),
+        'telephone_normalise': ('telephone', 'phone'),
+    }
+    
     class Meta:
         db_table = 'participant'
         ordering = ['nom', 'prenom']
+        indexes = [
+            # Sorts of the participant list, the primary key completes them
+            models.Index(fields=['nom', 'prenom'], name='participant_nom_prenom_idx'),
+            models.Index(fields=['date_naissance'], name='participant_naissance_idx'),
+            models.Index(fields=['date_inscription'], name='participant_inscription_idx'),
+        ]
         verbose_name = 'Participant'
         verbose_name_plural = 'Participants'
     
@@ -30,9 +47,9 @@ class Participant(TimestampMixin):
     def get_full_name(self):
         return f"{self.prenom} {self.nom}"
     
-    def get_age(self):
+    def get_age(self, on=None):
         from datetime import date
-        today = date.today()
+        today = on or date.today()
         born = self.date_naissance
         return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
 
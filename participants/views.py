@@ -3,16 +3,20 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Count
 from django.http import JsonResponse
 from django.utils import timezone
 
 from .models import Participant, ParticipantFile
 from .forms import ParticipantForm, ParticipantFileForm
 from activities.models import Inscription, Activite
+from activities.events import EventBuilder, parse_range
+from activities.ics import feed_url
+from core.mixins import KeysetPaginationMixin
+from core.utils import prefix_filter
 
 
-class ParticipantListView(LoginRequiredMixin, ListView):
+class ParticipantListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """View for listing participants with search and filters"""
     model = Participant
     template_name = 'participants/list.html'
@@ -25,12 +29,12 @@ class ParticipantListView(LoginRequiredMixin, ListView):
         # Search query
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(
-                Q(nom__icontains=query) |
-                Q(prenom__icontains=query) |
-                Q(email__icontains=query) |
-                Q(telephone__icontains=query)
-            )
+            queryset = queryset.filter(prefix_filter(
+                query,
+                ['nom_normalise', 'prenom_normalise'],
+                phone_fields=['telephone_normalise'],
+                prefix_fields=['email'],
+            ))
         
         # Age filter
         age_filter = self.request.GET.get('age')
@@ -65,14 +69,6 @@ class ParticipantListView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Add query parameters for pagination
-        query_params = {}
-        for key in ['q', 'age', 'sort']:
-            if self.request.GET.get(key):
-                query_params[key] = self.request.GET.get(key)
-        
-        context['query_params'] = query_params
-        
         # Add active filters for UI
         context['age_filter'] = self.request.GET.get('age', '')
         context['sort'] = self.request.GET.get('sort', 'nom')
@@ -88,7 +84,7 @@ class ParticipantDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        participant = self.get_object()
+        participant = self.object
         
         # Get participant's activities
         now = timezone.now()
@@ -96,12 +92,12 @@ class ParticipantDetailView(LoginRequiredMixin, DetailView):
         context['upcoming_activities'] = Inscription.objects.filter(
             participant=participant,
             activite__date_debut__gte=now
-        ).select_related('activite').order_by('activite__date_debut')
+        ).select_related('activite__responsable').order_by('activite__date_debut')
         
         context['past_activities'] = Inscription.objects.filter(
             participant=participant,
             activite__date_debut__lt=now
-        ).select_related('activite').order_by('-activite__date_debut')
+        ).select_related('activite__responsable').order_by('-activite__date_debut')
         
         # Get participant's files
         context['files'] = ParticipantFile.objects.filter(participant=participant)
@@ -109,6 +105,9 @@ class ParticipantDetailView(LoginRequiredMixin, DetailView):
         # Calculate age
         context['age'] = participant.get_age()
         
+        # Calendar subscription link
+        context['calendar_feed_url'] = self.request.build_absolute_uri(feed_url('participant', participant.pk))
+        
         return context
 
 
@@ -210,21 +209,17 @@ class ParticipantFileDeleteView(LoginRequiredMixin, DeleteView):
 def participant_activities_json(request, pk):
     """AJAX view to get participant's activities as JSON for calendar"""
     participant = get_object_or_404(Participant, pk=pk)
-    inscriptions = Inscription.objects.filter(
-        participant=participant
-    ).select_related('activite')
-    
-    events = []
-    for inscription in inscriptions:
-        activite = inscription.activite
-        events.append({
-            'id': activite.id,
-            'title': activite.nom,
-            'start': activite.date_debut.isoformat(),
-            'end': activite.date_fin.isoformat() if activite.date_fin else None,
-            'url': reverse('activities:detail', kwargs={'pk': activite.id}),
-            'backgroundColor': '#4F46E5',  # Indigo
-            'borderColor': '#4338CA',
-        })
+    
+    try:
+        start, end = parse_range(request)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid time window'
+        }, status=400)
+    
+    events = EventBuilder(start, end).activities(
+        Activite.objects.filter(inscriptions__participant=participant)
+    )
     
     return JsonResponse(events, safe=False)
\ No newline at end of file
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from core.utils import IntervalIndex
+from .models import Animateur, StaffSchedule
+
+
+def _merge(intervals):
+    """Merge overlapping or touching [start, end) intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class AnimateurAvailability:
+    """Assignments and shifts of every animateur over a time window.
+
+    Loaded with two queries whatever the number of animateurs, then kept as
+    per-person interval indexes: one for the activities they lead, one for
+    their StaffSchedule shifts (merged so back-to-back shifts cover a slot).
+    """
+
+    def __init__(self, assignments, shifts):
+        self._assignments = {
+            animateur_id: IntervalIndex(items) for animateur_id, items in assignments.items()
+        }
+        self._shifts = {
+            animateur_id: IntervalIndex((start, end, None) for start, end in _merge(items))
+            for animateur_id, items in shifts.items()
+        }
+
+    @classmethod
+    def load(cls, start, end, activite=None):
+        """Load assignments and shifts overlapping [start, end).
+
+        If activite is given, animateurs already assigned to it count as busy
+        even when it is cancelled.
+        """
+        from activities.models import ActiviteAnimateur
+
+        assignments = defaultdict(list)
+        overlapping = Q(
+            activite__annulee=False,
+            activite__date_debut__lt=end,
+            activite__date_fin__gt=start,
+        )
+        if activite is not None:
+            overlapping |= Q(activite=activite)
+
+        rows = ActiviteAnimateur.objects.filter(overlapping).values_list(
+            'animateur_id', 'activite_id', 'activite__date_debut', 'activite__date_fin'
+        )
+        for animateur_id, activite_id, activity_start, activity_end in rows:
+            if activite is not None and activite_id == activite.pk:
+                activity_start, activity_end = start, end
+            assignments[animateur_id].append((activity_start, activity_end or activity_start, activite_id))
+
+        shifts = defaultdict(list)
+        tz = timezone.get_current_timezone()
+        first_day = timezone.localtime(start, tz).date()
+        last_day = timezone.localtime(end, tz).date()
+
+        rows = StaffSchedule.objects.filter(
+            animateur__isnull=False,
+            date__gte=first_day - timedelta(days=1),
+            date__lte=last_day,
+        ).values_list('animateur_id', 'date', 'start_time', 'end_time')
+        for animateur_id, day, start_time, end_time in rows:
+            shift_start = timezone.make_aware(datetime.combine(day, start_time), tz)
+            shift_end = timezone.make_aware(datetime.combine(day, end_time), tz)
+            if shift_end <= shift_start:
+                # Night shift ending the next day
+                shift_end += timedelta(days=1)
+            shifts[animateur_id].append((shift_start, shift_end))
+
+        return cls(assignments, shifts)
+
+    def is_busy(self, animateur_id, start, end, exclude=()):
+        """Whether an animateur leads an activity overlapping [start, end), ignoring the activity ids in exclude"""
+        index = self._assignments.get(animateur_id)
+        if not index:
+            return False
+        return any(item[2] not in exclude for item in index.overlapping(start, end))
+
+    def is_on_shift(self, animateur_id, start, end):
+        index = self._shifts.get(animateur_id)
+        return bool(index and index.covering(start, end))
+
+    def is_available(self, animateur_id, start, end, require_shift=True):
+        if self.is_busy(animateur_id, start, end):
+            return False
+        return not require_shift or self.is_on_shift(animateur_id, start, end)
+
+    def busy_ids(self, start, end):
+        return {
+            animateur_id for animateur_id in self._assignments
+            if self.is_busy(animateur_id, start, end)
+        }
+
+    def on_shift_ids(self, start, end):
+        return {
+            animateur_id for animateur_id in self._shifts
+            if self.is_on_shift(animateur_id, start, end)
+        }
+
+
+def available_animateurs(start, end, activite=None, require_shift=True):
+    """Return a queryset of the active animateurs free during [start, end).
+
+    An animateur is free when no overlapping activity is assigned to them and,
+    if require_shift is set, a StaffSchedule shift covers the whole window.
+    """
+    availability = AnimateurAvailability.load(start, end, activite=activite)
+
+    queryset = Animateur.objects.filter(is_active=True)
+    if require_shift:
+        queryset = queryset.filter(pk__in=availability.on_shift_ids(start, end))
+
+    return queryset.exclude(pk__in=availability.busy_ids(start, end)).order_by('nom', 'prenom')
+
+
+def available_animateurs_for(activite, require_shift=True):
+    """Return the animateurs who can be added to an activity"""
+    end = activite.date_fin or activite.date_debut + timedelta(minutes=activite.duree or 0)
+    return available_animateurs(activite.date_debut, end, activite=activite, require_shift=require_shift)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0002_normalized_search_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='staffschedule',
+            index=models.Index(fields=['animateur', 'date'], name='schedule_animateur_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staffschedule',
+            index=models.Index(fields=['responsable', 'date'], name='schedule_resp_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staffschedule',
+            index=models.Index(fields=['date'], name='schedule_date_idx'),
+        ),
+    ]
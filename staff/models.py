@@ -1,8 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
-from core.models import TimestampMixin
+from core.models import NormalizedFieldsMixin, TimestampMixin
 
-class Responsable(TimestampMixin):
+class Responsable(NormalizedFieldsMixin, TimestampMixin):
     """Model representing camp supervisors/managers"""
     nom = models.CharField(max_length=100)
     prenom = models.CharField(max_length=100)
@@ -18,6 +18,17 @@ class Responsable(TimestampMixin):
     is_active = models.BooleanField(default=True)
     notes = models.TextField(blank=True, null=True)
     
+    # Search keys maintained by NormalizedFieldsMixin, matched by prefix in the list views
+    nom_normalise = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    prenom_normalise = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    telephone_normalise = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
+    
+    NORMALIZED_FIELDS = {
+        'nom_normalise': ('nom', 'text'),
+        'prenom_normalise': ('prenom', 'text'),
+        'telephone_normalise': ('telephone', 'phone'),
+    }
+    
     class Meta:
         db_table = 'responsable'
         verbose_name = 'Responsable'
@@ -30,7 +41,7 @@ class Responsable(TimestampMixin):
     def get_full_name(self):
         return f"{self.prenom} {self.nom}"
 
-class Animateur(TimestampMixin):
+class Animateur(NormalizedFieldsMixin, TimestampMixin):
     """Model representing camp animators/activity leaders"""
     nom = models.CharField(max_length=100)
     prenom = models.CharField(max_length=100)
@@ -46,6 +57,17 @@ class Animateur(TimestampMixin):
     is_active = models.BooleanField(default=True)
     notes = models.TextField(blank=True, null=True)
     
+    # Search keys maintained by NormalizedFieldsMixin, matched by prefix in the list views
+    nom_normalise = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    prenom_normalise = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    telephone_normalise = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
+    
+    NORMALIZED_FIELDS = {
+        'nom_normalise': ('nom', 'text'),
+        'prenom_normalise': ('prenom', 'text'),
+        'telephone_normalise': ('telephone', 'phone'),
+    }
+    
     class Meta:
         db_table = 'animateur'
         verbose_name = 'Animateur'
@@ -67,6 +89,13 @@ class StaffSchedule(TimestampMixin):
     end_time = models.TimeField()
     notes = models.TextField(blank=True, null=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['animateur', 'date'], name='schedule_animateur_date_idx'),
+            models.Index(fields=['responsable', 'date'], name='schedule_resp_date_idx'),
+            models.Index(fields=['date'], name='schedule_date_idx'),
+        ]
+    
     def __str__(self):
         staff = self.responsable if self.responsable else self.animateur
         return f"{staff} - {self.date} ({self.start_time} to {self.end_time})"
\ No newline at end of file
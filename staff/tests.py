@@ -1,3 +1,150 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from activities.models import Activite, ActiviteAnimateur
+from activities.timetable import TimetableSolver
+from infrastructure.models import Infrastructure, InfrastructureReservation
+from .models import Animateur, StaffSchedule
+
+
+class TimetableViewTest(TestCase):
+    """The timetable applies the plan that was previewed"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('admin', 'admin@example.org', 'motdepasse', is_staff=True))
+        today = timezone.localdate()
+        self.monday = today + datetime.timedelta(days=7 - today.weekday())
+        self.salle = Infrastructure.objects.create(nom='Salle', type='salle', capacite=20)
+        self.activites = [
+            Activite.objects.create(
+                nom=f'Atelier {number}', duree=60, capacite_max=10,
+                date_debut=timezone.make_aware(datetime.datetime.combine(self.monday, datetime.time(10))),
+            )
+            for number in range(3)
+        ]
+        self.url = reverse('staff:timetable')
+        self.query = {'semaine': self.monday.isoformat(), 'require_shift': '0'}
+
+    def _preview(self):
+        response = self.client.get(self.url, {**self.query, 'apercu': '1'})
+        return response.context['solution'], response.context['plan']
+
+    def _apply(self, plan):
+        return self.client.post(self.url, {'semaine': self.monday.isoformat(), 'plan': plan})
+
+    def test_solver_only_runs_for_a_preview(self):
+        with mock.patch.object(TimetableSolver, 'solve') as solve:
+            response = self.client.get(self.url, self.query)
+
+        solve.assert_not_called()
+        self.assertEqual((response.context['solution'], response.context['pending']), (None, 3))
+        self.assertTrue(self._preview()[0].complete)
+
+    def test_previewed_plan_is_applied(self):
+        solution, plan = self._preview()
+        self.assertTrue(solution.complete)
+
+        self._apply(plan)
+
+        for activite in self.activites:
+            activite.refresh_from_db()
+            self.assertEqual(
+                (activite.infrastructure_id, activite.date_debut, activite.date_fin),
+                solution.assignments[activite.pk],
+            )
+
+    def test_tampered_plan_is_rejected(self):
+        _, plan = self._preview()
+
+        response = self._apply(plan[:-2] + 'xx')
+
+        self.assertIn('Aperçu expiré', str(list(get_messages(response.wsgi_request))[0]))
+        self.assertFalse(Activite.objects.filter(infrastructure__isnull=False).exists())
+
+    def test_stale_plan_is_not_applied(self):
+        solution, plan = self._preview()
+        _, start, end = next(iter(solution.assignments.values()))
+        InfrastructureReservation.objects.create(
+            infrastructure=self.salle, date_debut=start, date_fin=end, motif='Réunion', responsable='Claire Durand',
+        )
+
+        response = self._apply(plan)
+
+        self.assertFalse(Activite.objects.filter(infrastructure__isnull=False).exists())
+        # Back to a new preview of the week
+        self.assertRedirects(response, f'{self.url}?semaine={self.monday.isoformat()}&apercu=1&require_shift=0', fetch_redirect_response=False)
+
+
+class AvailableAnimateursTest(TestCase):
+    """available_animateurs_json lists the active animateurs on shift and free over a window"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('admin', 'admin@example.org', 'motdepasse')
+        cls.day = timezone.localdate() + datetime.timedelta(days=3)
+
+        def animateur(nom, shift=None, **fields):
+            animateur = Animateur.objects.create(nom=nom, prenom='Test', telephone='0600000000', email=f'{nom}@example.org', **fields)
+            if shift:
+                StaffSchedule.objects.create(animateur=animateur, date=cls.day, start_time=datetime.time(shift[0]), end_time=datetime.time(*shift[1:]))
+            return animateur
+
+        cls.free = animateur('Libre', (9, 17))
+        cls.busy = animateur('Occupe', (9, 17))
+        cls.off_shift = animateur('Repos')
+        cls.leaving = animateur('Depart', (9, 10, 30))
+        cls.inactive = animateur('Inactif', (9, 17), is_active=False)
+        tennis = Activite.objects.create(nom='Tennis', duree=60, date_debut=cls.at(10, 30))
+        ActiviteAnimateur.objects.create(activite=tennis, animateur=cls.busy)
+
+    @classmethod
+    def at(cls, hour, minute=0):
+        return timezone.make_aware(datetime.datetime.combine(cls.day, datetime.time(hour, minute)))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _get(self, **query):
+        return self.client.get(reverse('staff:available_animateurs'), query)
+
+    def _ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {animateur['id'] for animateur in response.json()['animateurs']}
+
+    def test_shift_and_assignments_filter_the_animateurs(self):
+        window = {'start': self.at(10).isoformat(), 'end': self.at(11).isoformat()}
+
+        self.assertEqual(self._ids(self._get(**window)), {self.free.pk})
+        self.assertEqual(self._ids(self._get(**window, require_shift='0')), {self.free.pk, self.off_shift.pk, self.leaving.pk})
+        # Ends when the tennis starts and the shift of Depart ends
+        self.assertEqual(
+            self._ids(self._get(start=self.at(9, 30).isoformat(), end=self.at(10, 30).isoformat())),
+            {self.free.pk, self.busy.pk, self.leaving.pk},
+        )
+
+    def test_naive_and_aware_bounds_can_be_mixed(self):
+        naive_start = self.at(10).replace(tzinfo=None).isoformat()
+
+        self.assertEqual(self._ids(self._get(start=naive_start, end=self.at(11).isoformat())), {self.free.pk})
+        self.assertEqual(self._get(start=naive_start, end=self.at(9).isoformat()).status_code, 400)
 
-# Create your tests here.
+    def test_invalid_windows_are_rejected(self):
+        for query in (
+            {},
+            {'start': self.at(10).isoformat()},
+            {'start': 'demain', 'end': self.at(11).isoformat()},
+            {'start': '2026-13-01T10:00', 'end': '2026-13-01T11:00'},
+            {'start': '2026-02-30T10:00', 'end': '2026-03-01T11:00'},
+            {'start': self.at(11).isoformat(), 'end': self.at(10).isoformat()},
+            {'start': self.at(10).isoformat(), 'end': self.at(10).isoformat()},
+        ):
+            with self.subTest(**query):
+                response = self._get(**query)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
@@ -23,7 +23,9 @@ urlpatterns = [
     # Schedule management
     path('<str:staff_type>/<int:pk>/add-schedule/', views.StaffScheduleCreateView.as_view(), name='add_schedule'),
     path('schedule/<int:pk>/delete/', views.StaffScheduleDeleteView.as_view(), name='delete_schedule'),
+    path('timetable/', views.TimetableView.as_view(), name='timetable'),
     
     # API
     path('<str:staff_type>/<int:pk>/activities-json/', views.staff_activities_json, name='activities_json'),
+    path('available-animateurs/', views.available_animateurs_json, name='available_animateurs'),
 ]
\ No newline at end of file
@@ -6,10 +6,17 @@ from django.contrib import messages
 from django.db.models import Q, Count
 from django.utils import timezone
 from django.http import JsonResponse
+from django.contrib.auth.decorators import login_required
+from datetime import date, timedelta
 
 from .models import Responsable, Animateur, StaffSchedule
 from .forms import ResponsableForm, AnimateurForm, StaffScheduleForm
+from .availability import available_animateurs
 from activities.models import Activite, ActiviteAnimateur
+from activities.events import EventBuilder, parse_range
+from activities.ics import feed_url
+from activities.timetable import apply_solution, load_plan, load_week, sign_plan, week_activities, week_bounds
+from core.utils import parse_window, prefix_filter
 
 
 class StaffDashboardView(LoginRequiredMixin, TemplateView):
@@ -62,12 +69,12 @@ class StaffListView(LoginRequiredMixin, ListView):
         # Build responsables queryset
         responsables = Responsable.objects.all()
         if query:
-            responsables = responsables.filter(
-                Q(nom__icontains=query) |
-                Q(prenom__icontains=query) |
-                Q(email__icontains=query) |
-                Q(specialite__icontains=query)
-            )
+            responsables = responsables.filter(prefix_filter(
+                query,
+                ['nom_normalise', 'prenom_normalise'],
+                phone_fields=['telephone_normalise'],
+                prefix_fields=['email', 'specialite'],
+            ))
         
         if status != 'all':
             is_active = (status == 'active')
@@ -76,12 +83,12 @@ class StaffListView(LoginRequiredMixin, ListView):
         # Build animateurs queryset
         animateurs = Animateur.objects.all()
         if query:
-            animateurs = animateurs.filter(
-                Q(nom__icontains=query) |
-                Q(prenom__icontains=query) |
-                Q(email__icontains=query) |
-                Q(competence__icontains=query)
-            )
+            animateurs = animateurs.filter(prefix_filter(
+                query,
+                ['nom_normalise', 'prenom_normalise'],
+                phone_fields=['telephone_normalise'],
+                prefix_fields=['email', 'competence'],
+            ))
         
         if status != 'all':
             is_active = (status == 'active')
@@ -119,7 +126,7 @@ class ResponsableDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        responsable = self.get_object()
+        responsable = self.object
         
         # Get activities for this responsable
         now = timezone.now()
@@ -141,6 +148,9 @@ class ResponsableDetailView(LoginRequiredMixin, DetailView):
             date__gte=now.date()
         ).order_by('date', 'start_time')
         
+        # Calendar subscription link
+        context['calendar_feed_url'] = self.request.build_absolute_uri(feed_url('responsable', responsable.pk))
+        
         return context
 
 
@@ -152,7 +162,7 @@ class AnimateurDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        animateur = self.get_object()
+        animateur = self.object
         
         # Get activities for this animateur
         now = timezone.now()
@@ -174,6 +184,9 @@ class AnimateurDetailView(LoginRequiredMixin, DetailView):
             date__gte=now.date()
         ).order_by('date', 'start_time')
         
+        # Calendar subscription link
+        context['calendar_feed_url'] = self.request.build_absolute_uri(feed_url('animateur', animateur.pk))
+        
         return context
 
 
@@ -375,11 +388,11 @@ class StaffScheduleDeleteView(LoginRequiredMixin, DeleteView):
     context_object_name = 'schedule'
     
     def get_success_url(self):
-        schedule = self.get_object()
-        if schedule.responsable:
-            return reverse('staff:responsable_detail', kwargs={'pk': schedule.responsable.pk})
-        elif schedule.animateur:
-            return reverse('staff:animateur_detail', kwargs={'pk': schedule.animateur.pk})
+        schedule = self.object
+        if schedule.responsable_id:
+            return reverse('staff:responsable_detail', kwargs={'pk': schedule.responsable_id})
+        elif schedule.animateur_id:
+            return reverse('staff:animateur_detail', kwargs={'pk': schedule.animateur_id})
         
         return reverse('staff:list')
     
@@ -390,64 +403,135 @@ class StaffScheduleDeleteView(LoginRequiredMixin, DeleteView):
 
 def staff_activities_json(request, staff_type, pk):
     """AJAX view to get staff member's activities as JSON for calendar"""
-    now = timezone.now()
+    try:
+        start, end = parse_range(request)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid time window'
+        }, status=400)
+    
+    builder = EventBuilder(start, end)
     events = []
     
     if staff_type == 'responsable':
         staff_member = get_object_or_404(Responsable, pk=pk)
-        activities = Activite.objects.filter(responsable=staff_member)
-        
-        for activity in activities:
-            events.append({
-                'id': activity.id,
-                'title': activity.nom,
-                'start': activity.date_debut.isoformat(),
-                'end': activity.date_fin.isoformat() if activity.date_fin else None,
-                'url': reverse('activities:detail', kwargs={'pk': activity.id}),
-                'backgroundColor': '#4F46E5' if not activity.annulee else '#EF4444',
-                'borderColor': '#4338CA' if not activity.annulee else '#DC2626',
-            })
+        events += builder.activities(Activite.objects.filter(responsable=staff_member))
     
     elif staff_type == 'animateur':
         staff_member = get_object_or_404(Animateur, pk=pk)
-        activity_relations = ActiviteAnimateur.objects.filter(
-            animateur=staff_member
-        ).select_related('activite')
-        
-        for relation in activity_relations:
-            activity = relation.activite
-            events.append({
-                'id': activity.id,
-                'title': activity.nom,
-                'start': activity.date_debut.isoformat(),
-                'end': activity.date_fin.isoformat() if activity.date_fin else None,
-                'url': reverse('activities:detail', kwargs={'pk': activity.id}),
-                'backgroundColor': '#059669' if not activity.annulee else '#EF4444',
-                'borderColor': '#047857' if not activity.annulee else '#DC2626',
-            })
+        events += builder.activities(
+            Activite.objects.filter(animateurs_relation__animateur=staff_member),
+            colors=('#059669', '#047857'),
+        )
     
     # Add schedules
-    schedules = StaffSchedule.objects.filter(
+    events += builder.schedules(StaffSchedule.objects.filter(
         Q(responsable_id=pk, animateur__isnull=True) if staff_type == 'responsable' 
         else Q(animateur_id=pk, responsable__isnull=True)
-    )
-    
-    for schedule in schedules:
-        # Create a datetime combining date with time
-        start_datetime = timezone.make_aware(timezone.datetime.combine(
-            schedule.date, schedule.start_time
-        ))
-        end_datetime = timezone.make_aware(timezone.datetime.combine(
-            schedule.date, schedule.end_time
-        ))
-        
-        events.append({
-            'id': f'schedule_{schedule.id}',
-            'title': f'Horaire: {schedule.notes or "Travail"}',
-            'start': start_datetime.isoformat(),
-            'end': end_datetime.isoformat(),
-            'backgroundColor': '#F59E0B',
-            'borderColor': '#D97706',
-        })
-    
-    return JsonResponse(events, safe=False)
\ No newline at end of file
+    ))
+    
+    return JsonResponse(events, safe=False)
+
+
+class TimetableView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """View for placing the activities of a week that have no venue yet"""
+    template_name = 'staff/timetable.html'
+    
+    def test_func(self):
+        # Only admin users can plan the week
+        return self.request.user.is_staff
+    
+    def get_day(self):
+        value = self.request.GET.get('semaine') or self.request.POST.get('semaine')
+        try:
+            return date.fromisoformat(value) if value else timezone.localdate()
+        except ValueError:
+            return timezone.localdate()
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        day = self.get_day()
+        week_start, week_end = week_bounds(day)
+        require_shift = self.request.GET.get('require_shift', '1') != '0'
+        context['require_shift'] = require_shift
+        
+        # The solver only runs when a preview is asked for, the week alone shows what is left to place
+        if not self.request.GET.get('apercu'):
+            context['solution'] = None
+            context['pending'] = week_activities(day).count()
+        else:
+            solver = load_week(day, require_shift=require_shift, time_budget=5.0)
+            solution = solver.solve()
+            
+            tasks = {task.pk: task for task in solver.tasks}
+            venues = {venue.pk: venue for venue in solver.venues}
+            
+            context['assignments'] = sorted(
+                [
+                    (tasks[pk], venues[infrastructure_id], start, end)
+                    for pk, (infrastructure_id, start, end) in solution.assignments.items()
+                ],
+                key=lambda row: row[2]
+            )
+            context['unplaced'] = [tasks[pk] for pk in solution.unplaced]
+            context['solution'] = solution
+            # The search is time-boxed, so another run may place fewer activities: the POST applies this exact plan
+            context['plan'] = sign_plan(day, solution, require_shift)
+        context['week_start'] = week_start
+        context['week_end'] = week_end - timedelta(days=1)
+        context['previous_week'] = (week_start - timedelta(days=7)).date().isoformat()
+        context['next_week'] = week_end.date().isoformat()
+        context['semaine'] = week_start.date().isoformat()
+        return context
+    
+    def post(self, request, *args, **kwargs):
+        day = self.get_day()
+        url = f"{reverse('staff:timetable')}?semaine={day.isoformat()}"
+        plan = load_plan(request.POST.get('plan'), day)
+        if plan is None:
+            messages.error(request, 'Aperçu expiré ou invalide, vérifiez le planning avant de l\'appliquer.')
+            return redirect(f'{url}&apercu=1')
+        
+        solution, require_shift = plan
+        # Activities, bookings or shifts may have changed since the preview
+        invalid = load_week(day, require_shift=require_shift).invalid_assignments(solution.assignments)
+        if invalid:
+            messages.error(request, f'Le planning a changé depuis l\'aperçu ({len(invalid)} activité(s) concernée(s)), vérifiez le nouveau planning.')
+            return redirect(f"{url}&apercu=1&require_shift={int(require_shift)}")
+        
+        saved = apply_solution(solution)
+        
+        if saved:
+            messages.success(request, f'{saved} activité(s) planifiée(s) avec succès.')
+        if solution.unplaced:
+            messages.warning(request, f'{len(solution.unplaced)} activité(s) n\'ont pas pu être placées.')
+        
+        return redirect(url)
+
+
+@login_required
+def available_animateurs_json(request):
+    """AJAX view listing the animateurs free between the start and end parameters"""
+    window = parse_window(request.GET.get('start'), request.GET.get('end'))
+    if window is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid time window'
+        }, status=400)
+    
+    start, end = window
+    require_shift = request.GET.get('require_shift', '1') != '0'
+    animateurs = available_animateurs(start, end, require_shift=require_shift)
+    
+    return JsonResponse({
+        'success': True,
+        'animateurs': [
+            {
+                'id': animateur.id,
+                'name': animateur.get_full_name(),
+                'competence': animateur.competence,
+            }
+            for animateur in animateurs.only('id', 'nom', 'prenom', 'competence')
+        ]
+    })
\ No newline at end of file